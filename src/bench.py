@@ -0,0 +1,358 @@
+# -*- coding: utf-8 -*-
+__author__      = "Brian Fromme"
+__copyright__   = "Copyright 2020, Gnu Public License - Version 2.0"
+__credits__     = ["Brian Fromme, Bryan Gartner, Darren Soothill"]
+__maintainer__  = "Brian Fromme"
+__status__      = "Prototype"
+"""
+@newfield description: Description
+"""
+__description__ = "Sonar benchmarks - synthetic scenarios, timings and a regression check against saved baselines"
+
+import argparse
+import contextlib
+import gc
+import io
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+import yaml
+
+from cmdline import Options
+from sizingbatch import SizingBatch
+from sizingdata import SizingData
+from sizinginput import parseText
+from sizingfailure import FailureModel
+from sizingplacement import PlacementSimulator
+from sizingsolve import SizingSolver
+from sizingwatch import InputWatch
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+BENCH_INPUT = os.path.join(BENCH_DIR, 'sonar-input.yaml')
+BENCH_BASELINE = os.path.join(BENCH_DIR, 'bench-baseline.json')
+# a benchmark is a regression when it is this much slower than its baseline (0.5 = 50%);
+# end-to-end timings of separate runs on one box can differ by a third, so tighter catches noise
+BENCH_THRESHOLD = 0.5
+
+# Startup budgets, in seconds on top of a bare interpreter start ('python -c pass') - going over one fails the run.
+# The fast path is a JSON input (or an --input-cache hit): no yaml, no numpy, nothing a single scenario does not need
+BENCH_STARTUP_BUDGETS = {'startupVersion': 0.025, 'startupFastPath': 0.075}
+
+# The values the synthetic scenarios are drawn from
+BENCH_DRIVE_CAPACITIES = [4, 8, 12, 16, 18, 20]
+BENCH_DRIVES_PER_CHASSIS = [12, 24, 36, 60]
+BENCH_NVME_RATIOS = [4, 6, 12]
+BENCH_EC_PROFILES = [(4, 2), (6, 3), (8, 3), (10, 4)]
+
+
+def readBaseScenario():
+    """the sonar-input.yaml scenario every synthetic one is built around"""
+    with open(BENCH_INPUT, 'r') as f:
+        return yaml.safe_load(f)
+
+
+def generateScenarios(count, seed=0):
+    """count yaml input dicts: sonar-input.yaml with the sizing inputs varied (repeatably, for a given seed)"""
+    rng = random.Random(seed)
+    base = readBaseScenario()
+    scenarios = []
+    for _ in range(count):
+        scenario = dict(base)
+        drivesPerChassis = rng.choice(BENCH_DRIVES_PER_CHASSIS)
+        ecData, ecParity = rng.choice(BENCH_EC_PROFILES)
+        scenario.update({'colocation': rng.random() < 0.5,
+                         'storageCapacity': rng.randint(100, 20000),
+                         'driveCapacity': rng.choice(BENCH_DRIVE_CAPACITIES),
+                         'drivesPerChassis': drivesPerChassis,
+                         'populatedSlotsPerChassis': drivesPerChassis,
+                         'driveType': rng.choice(['HDD', 'SSD']),
+                         'maxFillCapacity': rng.randint(70, 90),
+                         'nvmeRatio': rng.choice(BENCH_NVME_RATIOS),
+                         'protectionType': rng.choice([1, 1, 2, 3]),
+                         'ecProfileData': ecData,
+                         'ecProfileParity': ecParity})
+        scenarios.append(scenario)
+    return scenarios
+
+
+def generateColumns(count, seed=0):
+    """the same kind of scenarios as generateScenarios, built directly as SizingBatch input columns"""
+    rng = np.random.default_rng(seed)
+    drivesPerChassis = rng.choice(BENCH_DRIVES_PER_CHASSIS, count)
+    ecProfiles = np.array(BENCH_EC_PROFILES)[rng.integers(0, len(BENCH_EC_PROFILES), count)]
+    return {'colocation': rng.random(count) < 0.5,
+            'storageCapacity': rng.integers(100, 20001, count),
+            'driveCapacity': rng.choice(BENCH_DRIVE_CAPACITIES, count),
+            'drivesPerChassis': drivesPerChassis,
+            'populatedSlotsPerChassis': drivesPerChassis,
+            'driveType': np.where(rng.random(count) < 0.5, 'HDD', 'SSD'),
+            'maxFillCapacity': rng.integers(70, 91, count),
+            'nvmeRatio': rng.choice(BENCH_NVME_RATIOS, count),
+            'protectionType': rng.choice([1, 1, 2, 3], count),
+            'ecProfileData': ecProfiles[:, 0],
+            'ecProfileParity': ecProfiles[:, 1]}
+
+
+@contextlib.contextmanager
+def quiet():
+    """keep what the sizing code prints (reports, error messages) out of the benchmark output"""
+    with contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(io.StringIO()):
+        yield
+
+
+def bestOf(repeat, func):
+    """the fastest of repeat runs of func, in seconds - the least disturbed by the rest of the machine.
+       Like timeit, garbage collection is kept out of the timed runs"""
+    best = float('inf')
+    gc.collect()
+    gcEnabled = gc.isenabled()
+    gc.disable()
+    try:
+        for _ in range(repeat):
+            started = time.perf_counter()
+            func()
+            best = min(best, time.perf_counter() - started)
+    finally:
+        if gcEnabled:
+            gc.enable()
+    return best
+
+
+def benchMainLatency(repeat):
+    """main.main end to end on sonar-input.yaml: options, read, validate, size and report"""
+    import main
+    with tempfile.TemporaryDirectory() as tmp:
+        argv = ['main.py', '-i', BENCH_INPUT, '-o', os.path.join(tmp, 'sonar-results.out')]
+
+        def run():
+            savedArgv = sys.argv
+            sys.argv = argv
+            try:
+                with quiet():
+                    main.main()
+            finally:
+                sys.argv = savedArgv
+        run()   # warm up: the first run also pays for the imports
+        return bestOf(repeat, run), 1
+
+
+def benchParseValidate(repeat, count=1000):
+    """yaml parse (as readYAMLInput does it) plus validateSizingData, per scenario"""
+    texts = [yaml.safe_dump(scenario) for scenario in generateScenarios(count, seed=1)]
+    sizingData = SizingData(Options())
+
+    def run():
+        for text in texts:
+            sizingData.loadSizingRecord(parseText(text))
+            sizingData.validateSizingData()
+    return bestOf(repeat, run), count
+
+
+def benchScalar(repeat, count=10000):
+    """SizingData.calculateResults, one scenario at a time"""
+    sizingData = SizingData(Options())
+    inputs = []
+    for scenario in generateScenarios(count, seed=2):
+        sizingData.loadSizingRecord(scenario)
+        sizingData.validateSizingData()
+        inputs.append(sizingData.getInputs())
+
+    def run():
+        # the errors calculateResults prints are part of its cost, but not of the benchmark output
+        with quiet():
+            for values in inputs:
+                for name, value in zip(SizingData.SDINPUTS, values):
+                    setattr(sizingData, name, value)
+                sizingData.calculateResults()
+    return bestOf(repeat, run), count
+
+
+def benchSolve(repeat, count=100):
+    """SizingSolver.solve: the most capacity within a 12 chassis budget, for every protection scheme at once"""
+    sizingData = SizingData(Options())
+    sizingData.loadSizingRecord(readBaseScenario())
+    sizingData.validateSizingData()
+    solver = SizingSolver(sizingData, maxChassis=12)
+
+    def run():
+        for _ in range(count):
+            solver.solve()
+    return bestOf(repeat, run), count
+
+
+def benchPlacement(count):
+    """PlacementSimulator: map the PGs of a 24 chassis, EC 8+3 cluster and place count objects on it"""
+    def bench(repeat):
+        def run():
+            PlacementSimulator([24] * 24, 16, 11, 1 / 8).simulate(count)
+        return bestOf(repeat, run), count
+    return bench
+
+
+def benchFailure(count):
+    """FailureModel.simulate: count one-year trials of a 24 chassis, EC 8+3 cluster"""
+    def bench(repeat):
+        model = FailureModel([24] * 24, 16, 80, 35, 3, 9, False)
+        return bestOf(repeat, lambda: model.simulate(count)), count
+    return bench
+
+
+def benchWatch(repeat, count=100):
+    """InputWatch.update: save sonar-input.yaml with a new storageCapacity, then re-parse, re-size and diff it"""
+    with open(BENCH_INPUT, 'r') as f:
+        text = f.read()
+    texts = [text.replace('storageCapacity:  2000', f'storageCapacity:  {2000 + step}') for step in range(2)]
+    with tempfile.TemporaryDirectory() as tmp:
+        options = Options()
+        options.argInput = os.path.join(tmp, 'sonar-input.yaml')
+
+        def save(step):
+            with open(options.argInput, 'w') as f:
+                f.write(texts[step % 2])
+        save(0)
+        watch = InputWatch(options)
+        with quiet():
+            watch.update()
+
+        def run():
+            for step in range(1, count + 1):
+                save(step)
+                watch.update()
+        return bestOf(repeat, run), count
+
+
+def benchStartup(arguments):
+    """a fresh 'python main.py ...' process, less a bare interpreter start: what each shell-script call costs us"""
+    def bench(repeat):
+        with tempfile.TemporaryDirectory() as tmp:
+            jsonInput = os.path.join(tmp, 'sonar-input.json')
+            with open(jsonInput, 'w') as f:
+                json.dump(readBaseScenario(), f)
+            command = [sys.executable, os.path.join(BENCH_DIR, 'main.py')] + [
+                argument.format(input=BENCH_INPUT, jsonInput=jsonInput, output=os.devnull) for argument in arguments]
+
+            def run(command):
+                subprocess.run(command, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, cwd=tmp, check=False)
+            bare = bestOf(repeat, lambda: run([sys.executable, '-c', 'pass']))
+            return max(bestOf(repeat, lambda: run(command)) - bare, 0.0), 1
+    return bench
+
+
+def benchBatch(count):
+    """SizingBatch.calculateResults over count scenarios at once"""
+    def bench(repeat):
+        batch = SizingBatch(generateColumns(count, seed=3))
+        return bestOf(repeat, batch.calculateResults), count
+    return bench
+
+
+# name: (what it measures, benchmark function, how many runs to take the best of)
+BENCHMARKS = {
+    'startupVersion': ('main.py --version, new process', benchStartup(['--version']), 20),
+    'startupFastPath': ('main.py on a JSON input, new process', benchStartup(['-i', '{jsonInput}', '-o', '{output}']), 20),
+    'startupYAML': ('main.py on sonar-input.yaml, new process', benchStartup(['-i', '{input}', '-o', '{output}']), 20),
+    'mainLatency': ('main.main end to end, one scenario', benchMainLatency, 50),
+    'parseValidate': ('yaml parse + validateSizingData', benchParseValidate, 5),
+    'scalarCalculate': ('scalar calculateResults', benchScalar, 5),
+    'solveQuery': ('inverse sizing, every protection scheme', benchSolve, 20),
+    'watchUpdate': ('watch mode, one save re-sized', benchWatch, 5),
+    'placement1M': ('placement simulation, 1M objects', benchPlacement(1000000), 5),
+    'failure10k': ('failure simulation, 10k one-year trials', benchFailure(10000), 5),
+    'batch1k': ('batch calculateResults, 1k scenarios', benchBatch(1000), 200),
+    'batch100k': ('batch calculateResults, 100k scenarios', benchBatch(100000), 10),
+    'batch1M': ('batch calculateResults, 1M scenarios', benchBatch(1000000), 3),
+}
+
+
+def runBenchmarks(names, verbose=False):
+    """run the named benchmarks; returns {name: seconds per scenario}"""
+    results = {}
+    for name in names:
+        description, bench, repeat = BENCHMARKS[name]
+        seconds, count = bench(repeat)
+        results[name] = seconds / count
+        if verbose:
+            print(f'{name:16} {results[name] * 1e6:12.3f} us/scenario {count / seconds:14,.0f} scenarios/s   ({description})', file=sys.stdout)
+    return results
+
+
+def readBaseline(path):
+    """the saved seconds-per-scenario results, or {} when there are none yet"""
+    if not os.path.isfile(path):
+        return {}
+    with open(path, 'r') as f:
+        return json.load(f)['results']
+
+
+def saveBaseline(path, results):
+    """keep these results (merged into any already saved) as the baseline for later runs"""
+    baseline = readBaseline(path)
+    baseline.update(results)
+    with open(path, 'w') as f:
+        json.dump({'machine': platform.machine(), 'python': platform.python_version(),
+                   'numpy': np.__version__, 'results': baseline}, f, indent=2, sort_keys=True)
+        f.write('\n')
+
+
+def checkRegressions(results, baseline, threshold):
+    """compare with the baseline; returns a list of (name, current, baseline, ratio) that got too slow"""
+    regressions = []
+    for name, seconds in results.items():
+        if name not in baseline:
+            continue
+        ratio = seconds / baseline[name]
+        if ratio > 1 + threshold:
+            regressions.append((name, seconds, baseline[name], ratio))
+    return regressions
+
+
+def checkBudgets(results):
+    """returns a list of (name, seconds, budget) for the startup benchmarks that went over budget"""
+    return [(name, results[name], budget) for name, budget in BENCH_STARTUP_BUDGETS.items()
+            if name in results and results[name] > budget]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='SST: Sonar Sizing Tool benchmarks.')
+    parser.add_argument('names', nargs='*', metavar='BENCHMARK', help=f'benchmarks to run (default: all of {", ".join(BENCHMARKS)})')
+    parser.add_argument('--baseline', default=BENCH_BASELINE, help='baseline results file (default: bench-baseline.json)')
+    parser.add_argument('--save', action='store_true', help='save these results as the new baseline instead of checking them')
+    parser.add_argument('--threshold', type=float, default=BENCH_THRESHOLD,
+                        help=f'fail when a benchmark is this fraction slower than its baseline (default: {BENCH_THRESHOLD})')
+    parser.add_argument('--quick', action='store_true', help='skip the 1M scenario batch')
+    parser.add_argument('-q', '--quiet', action='store_true', help='only report regressions')
+    args = parser.parse_args()
+    unknown = [name for name in args.names if name not in BENCHMARKS]
+    if unknown:
+        parser.error(f'unknown benchmark(s): {", ".join(unknown)}')
+    names = args.names or [name for name in BENCHMARKS if not (args.quick and name == 'batch1M')]
+
+    results = runBenchmarks(names, verbose=not args.quiet)
+    overBudget = checkBudgets(results)
+    for name, seconds, budget in overBudget:
+        print(f'Over budget: {name} {seconds * 1e3:.1f} ms vs budget {budget * 1e3:.1f} ms', file=sys.stderr)
+    if args.save:
+        saveBaseline(args.baseline, results)
+        print(f'Saved baseline: {args.baseline}', file=sys.stdout)
+        return (1 if overBudget else 0)
+    baseline = readBaseline(args.baseline)
+    if not baseline:
+        print(f'No baseline to compare with: {args.baseline} (run with --save to make one)', file=sys.stdout)
+        return (1 if overBudget else 0)
+    regressions = checkRegressions(results, baseline, args.threshold)
+    for name, seconds, baseSeconds, ratio in regressions:
+        print(f'Regression: {name} {seconds * 1e6:.3f} us/scenario vs baseline {baseSeconds * 1e6:.3f} ({ratio:.2f}x)', file=sys.stderr)
+    if not regressions and not args.quiet:
+        print(f'No regressions over {args.threshold:.0%} against {args.baseline}', file=sys.stdout)
+    return (1 if regressions or overBudget else 0)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
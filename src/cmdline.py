@@ -11,8 +11,8 @@ __version__     = "0.1"
 """
 __description__ = "Sonar command-line parsing"
 
+import os.path
 import sys
-import argparse
 
 
 class Options:
@@ -25,15 +25,35 @@ class Options:
       self.argVerbose = False
       self.argDebug = False
       self.argVersion = '%(prog)s 0.1'   # not ideal
-      'Setup the argparse object with our options'
-      self.parser = argparse.ArgumentParser(description='SST: Sonar Sizing Tool options.')
-      # options without parameters
-      self.parser.add_argument('--version', action='version', version=self.argVersion)
-      self.parser.add_argument('--debug', action='store_true', help="turn on debugging")
-      self.parser.add_argument('--verbose', action='store_true', help="increase output verbosity")
-      # options with parameters
-      self.parser.add_argument('-i', '--input', default=self.argInput, help='yaml input file (default: sonar-input.yaml)')
-      self.parser.add_argument('-o', '--output', default=self.argOutput, help='printed output file (default: sonar-results.out)')
+      self.argStream = False
+      self.argPools = False
+      self.argWatch = False
+      self.argInputFormat = 'auto'
+      self.argJobs = 1
+      self.argChunkSize = 256
+      self.argMaxPending = 0   # 0 = two chunks in flight per job
+      self.argExplore = None
+      self.argCacheSize = 4096
+      self.argCacheFile = None
+      self.argCommand = 'size'
+      self.argSocket = None
+      self.argPort = 0
+      self.argBatchWindow = 0.0
+      self.argSaveTable = None
+      self.argFormat = 'text'
+      self.argProfile = None
+      self.argProfileOutput = '-'
+      self.argCProfile = None
+      self.argInputCache = None
+      self.argCatalog = None
+      self.argSolve = None
+      self.argMaxChassis = None
+      self.argMaxDrives = None
+      self.argPlacement = None
+      self.argFailureTrials = None
+      self.argFailureYears = 1.0
+      self.argSimulationJobs = 1
+      self.parser = None
 
    def __del__(self):
       classless_name = self.__class__.__name__
@@ -45,14 +65,100 @@ class Options:
          print (f'Input File: {self.argInput}', file=sys.stdout)
          print (f'Output File: {self.argOutput}', file=sys.stdout)
 
+   def buildParser(self):
+      'Setup the argparse object with our options'
+      # argparse is imported here, not at the top: an Options used without a command line never needs it
+      import argparse
+      self.parser = argparse.ArgumentParser(description='SST: Sonar Sizing Tool options.')
+      # options without parameters
+      self.parser.add_argument('--version', action='version', version=self.argVersion)
+      self.parser.add_argument('--debug', action='store_true', help="turn on debugging")
+      self.parser.add_argument('--verbose', action='store_true', help="increase output verbosity")
+      self.parser.add_argument('--stream', action='store_true', help="size every scenario of a multi-document input, one at a time")
+      self.parser.add_argument('--pools', action='store_true', help="the input is a multi-pool cluster: size every pool and pack them onto shared chassis")
+      self.parser.add_argument('--watch', action='store_true', help="keep running: re-size the input each time it is saved and print the results that changed")
+      # commands: size the input here (default), or run as a sizing daemon
+      self.parser.add_argument('command', nargs='?', default=self.argCommand, choices=['size', 'serve'], help="'size' the input (default) or 'serve' sizing requests")
+      # options with parameters
+      self.parser.add_argument('-i', '--input', default=self.argInput, help='yaml input file, or - for stdin (default: sonar-input.yaml)')
+      self.parser.add_argument('-o', '--output', default=self.argOutput, help='printed output file, or - for stdout (default: sonar-results.out)')
+      self.parser.add_argument('-f', '--format', default=self.argFormat, choices=['text', 'json', 'csv', 'markdown'], help='report format (default: text)')
+      self.parser.add_argument('-j', '--jobs', type=int, default=self.argJobs, help='size a multi-scenario input on N worker processes (default: 1)')
+      self.parser.add_argument('--chunk-size', type=int, default=self.argChunkSize, help='scenarios sent to a worker at a time (default: 256)')
+      self.parser.add_argument('--max-pending', type=int, default=self.argMaxPending, help='chunks in flight before reading more input waits on output (default: 2 per job)')
+      self.parser.add_argument('--explore', metavar='SPEC', help='yaml file of input ranges: report the Pareto-optimal configurations around --input')
+      self.parser.add_argument('--solve', choices=['capacity', 'performance'], help='size backwards: the most capacity, or client write GB/s (after replication or EC), every protection scheme delivers within the budget')
+      self.parser.add_argument('--max-chassis', type=int, help='--solve budget: at most this many chassis')
+      self.parser.add_argument('--max-drives', type=int, help='--solve budget: at most this many drives')
+      self.parser.add_argument('--placement', type=int, metavar='OBJECTS', help='after sizing, place this many synthetic objects on the cluster and report the OSD fill imbalance')
+      self.parser.add_argument('--failure-trials', type=int, metavar='TRIALS', help='after sizing, simulate drive and chassis failures over this many trials and report rebuild times')
+      self.parser.add_argument('--failure-years', type=float, default=self.argFailureYears, help='time each --failure-trials trial covers, in years (default: 1)')
+      self.parser.add_argument('--simulation-jobs', type=int, default=self.argSimulationJobs, help='run the --placement and --failure-trials simulations on N processes (default: 1)')
+      self.parser.add_argument('--cache-size', type=int, default=self.argCacheSize, help='sizing results kept in the in-memory LRU cache, 0 to disable (default: 4096)')
+      self.parser.add_argument('--cache-file', help='sqlite file of sizing results shared across runs')
+      self.parser.add_argument('--socket', help='unix socket for serve and the client (default: sonar-UID.sock in the temp directory)')
+      self.parser.add_argument('--port', type=int, default=self.argPort, help='serve on this localhost TCP port instead of a unix socket')
+      self.parser.add_argument('--batch-window', type=float, default=self.argBatchWindow, help='milliseconds serve waits to coalesce concurrent requests (default: 0)')
+      self.parser.add_argument('--save-table', metavar='FILE', help='also save the results of a multi-scenario run as a memory-mappable result table')
+      self.parser.add_argument('--profile', choices=['json', 'prometheus'], help='time each stage and write a summary in this format')
+      self.parser.add_argument('--profile-output', default=self.argProfileOutput, help='where --profile writes, or - for stderr (default: -)')
+      self.parser.add_argument('--cprofile', metavar='FILE', help='run under cProfile and save the pstats data to FILE')
+      self.parser.add_argument('--input-cache', metavar='DIR', help='cache parsed input files in DIR, reused while their path, mtime and size are unchanged')
+      self.parser.add_argument('--catalog', metavar='FILE', help='hardware catalog (JSON or yaml) to choose CPU, drive, NVMe and chassis models from (default: sonar-catalog.json)')
+      self.parser.add_argument('--input-format', default=self.argInputFormat, choices=['auto', 'yaml', 'jsonl'], help='stream input format; auto picks jsonl for .jsonl/.ndjson files (default: auto)')
+
    def parseCommandLine(self):
       """Run the argparse parsing method"""
+      if sys.argv[1:] == ['--version']:
+         # the shell scripts that only ask for the version should not pay for argparse
+         print (self.argVersion % {'prog': os.path.basename(sys.argv[0])}, file=sys.stdout)
+         sys.exit(0)
+      self.buildParser()
       args = self.parser.parse_args()
       if args.debug:
          self.argDebug = True
       if args.verbose:
          self.argVerbose = True
+      if args.stream:
+         self.argStream = True
+      if args.pools:
+         self.argPools = True
+      if args.watch:
+         self.argWatch = True
       # While these might seem redundant, need to set the parsed input and output values back to our instance
       self.argInput = args.input
       self.argOutput = args.output
+      self.argInputFormat = args.input_format
+      self.argExplore = args.explore
+      self.argCacheSize = args.cache_size
+      self.argCacheFile = args.cache_file
+      self.argCommand = args.command
+      self.argSocket = args.socket
+      self.argPort = args.port
+      self.argBatchWindow = args.batch_window
+      self.argSaveTable = args.save_table
+      self.argFormat = args.format
+      self.argProfile = args.profile
+      self.argProfileOutput = args.profile_output
+      self.argCProfile = args.cprofile
+      self.argInputCache = args.input_cache
+      self.argCatalog = args.catalog
+      if (args.max_chassis is not None and args.max_chassis < 1) or (args.max_drives is not None and args.max_drives < 1):
+         self.parser.error('--max-chassis and --max-drives must be at least 1')
+      if any(value is not None and value < 1 for value in (args.placement, args.failure_trials, args.simulation_jobs)):
+         self.parser.error('--placement, --failure-trials and --simulation-jobs must be at least 1')
+      if not args.failure_years > 0:
+         self.parser.error('--failure-years must be more than 0')
+      self.argPlacement = args.placement
+      self.argFailureTrials = args.failure_trials
+      self.argFailureYears = args.failure_years
+      self.argSimulationJobs = args.simulation_jobs
+      self.argSolve = args.solve
+      self.argMaxChassis = args.max_chassis
+      self.argMaxDrives = args.max_drives
+      if args.jobs < 1 or args.chunk_size < 1 or args.max_pending < 0:
+         self.parser.error('--jobs and --chunk-size must be at least 1, --max-pending at least 0')
+      self.argJobs = args.jobs
+      self.argChunkSize = args.chunk_size
+      self.argMaxPending = (args.max_pending if args.max_pending else 2 * args.jobs)
 
@@ -9,29 +9,127 @@ __status__      = "Prototype"
 """
 __description__ = "Sonar main module"
 
-import os
-# our classes
+import sys
+import time
+# our classes - the sizing modules are imported in runSizing, so --version and --help stay cheap
 from cmdline import Options
-from sizingdata import SizingData
+from sizingstats import STATS
 
 
 def main():
     opts = Options()
     # read the command-line options and print the file names
+    started = time.perf_counter()
+    startedCPU = time.process_time()
     opts.parseCommandLine()
+    if opts.argProfile:
+        STATS.enable()
+        STATS.observe('parseCommandLine', time.perf_counter() - started, time.process_time() - startedCPU)
     opts.displayFiles()
 
+    if opts.argCProfile:
+        import cProfile
+        profiler = cProfile.Profile()
+        profiler.runcall(runSizing, opts)
+        profiler.dump_stats(opts.argCProfile)
+    else:
+        runSizing(opts)
+    if opts.argProfile:
+        STATS.report(opts)
+    opts.exiting = True
+
+
+def runSizing(opts):
+    """size the input the way the options ask for"""
+    from sizingcache import SizingCache
+    from sizingcatalog import loadCatalog
+    from sizingdata import SizingData
+    from sizingreport import openReportWriter
+
+    # a bad catalog is reported once, up front, rather than by every scenario
+    try:
+        loadCatalog(opts.argCatalog)
+    except (OSError, ValueError) as e:
+        print (f'Error: Cannot read hardware catalog: {opts.argCatalog or "sonar-catalog.json"}: {e}', file=sys.stderr)
+        return
+
+    if opts.argCommand == 'serve':
+        # long-running daemon: requests arrive over a socket
+        from sizingserver import serve
+        serve(opts)
+        return
+    if opts.argWatch:
+        # long-running: every save of the input is re-sized incrementally
+        from sizingwatch import watchInput
+        watchInput(opts)
+        return
+    if opts.argPools:
+        # many pools sharing one set of chassis
+        from sizingpools import sizePools
+        sizePools(opts)
+        return
+    if opts.argSolve:
+        # the most capacity or performance a budget delivers, for every protection scheme
+        from sizingsolve import solveSizing
+        solveSizing(opts)
+        return
+    if opts.argExplore:
+        # search the design space around the input scenario
+        from sizingexplore import exploreDesignSpace
+        exploreDesignSpace(opts)
+        return
+    if opts.argJobs > 1:
+        # many scenarios from one input, sized in parallel and reported in input order
+        from sizingparallel import sizePool
+        sizePool(opts)
+        return
+    if opts.argStream:
+        # many scenarios from one input, sized as they are read
+        from sizingstream import sizeStream
+        sizeStream(opts)
+        return
+
     sizingData = SizingData(opts)
     # read the yaml input and validate the input
-    if sizingData.readYAMLInput():
-        sizingData.validateSizingData()
+    with STATS.stage('readYAMLInput'):
+        haveInput = sizingData.readYAMLInput()
+    if haveInput:
+        with STATS.stage('validateSizingData'):
+            validated = sizingData.validateSizingData()
+        if not validated:
+            # the errors have been reported; there is nothing sound to size
+            return
         if (opts.argDebug):
             # print it back out
             sizingData.printSizingData()
-        sizingData.calculateResults()
-        sizingData.reportSizingResults()
-
-    opts.exiting = True
+        cache = SizingCache.fromOptions(opts)
+        with STATS.stage('calculateResults'):
+            if cache is not None:
+                cache.calculateResults(sizingData)
+            else:
+                sizingData.calculateResults()
+        if cache is not None:
+            cache.close()
+            STATS.setCacheStats(cache.getStats())
+        # the report is written around the simulations: one pass through reportSizingResults, timed in two parts
+        wall, cpu = time.perf_counter(), time.process_time()
+        writer = openReportWriter(opts)
+        writer.writeScenario(sizingData)
+        wall, cpu = time.perf_counter() - wall, time.process_time() - cpu
+        if opts.argPlacement:
+            # how evenly the sized cluster really fills
+            from sizingplacement import simulatePlacement
+            with STATS.stage('simulatePlacement'):
+                simulatePlacement(sizingData, opts, writer)
+        if opts.argFailureTrials:
+            # how long rebuilds take, and how likely failures outrun the protection
+            from sizingfailure import simulateFailures
+            with STATS.stage('simulateFailures'):
+                simulateFailures(sizingData, opts, writer)
+        closeWall, closeCPU = time.perf_counter(), time.process_time()
+        writer.close()
+        if STATS.enabled:
+            STATS.observe('reportSizingResults', wall + time.perf_counter() - closeWall, cpu + time.process_time() - closeCPU)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,188 @@
+# -*- coding: utf-8 -*-
+__author__      = "Brian Fromme"
+__copyright__   = "Copyright 2020, Gnu Public License - Version 2.0"
+__credits__     = ["Brian Fromme, Bryan Gartner, Darren Soothill"]
+__maintainer__  = "Brian Fromme"
+__status__      = "Prototype"
+"""
+@newfield description: Description
+"""
+__description__ = "Sonar batch sizing - many scenarios per call, one array per input"
+
+import numpy as np
+
+from sizingcatalog import CATALOG_RESULTS, loadCatalog
+from sizingdata import SizingData
+from sizingresults import RESULT_CONSTANTS, RESULT_FIELDS, RESULT_INPUT_FIELDS, SizingResultTable
+from sizingschema import REQUIRED_INPUTS, inputError, validateColumns
+
+
+# Input columns, keyed by the yaml input name: (lowercase name, numpy dtype, default value)
+## NOTE: the defaults mirror the (fictitious) defaults in SizingData.__init__
+BATCH_COLUMNS = {
+    'colocation':               ('colocation', np.bool_, True),
+    'useCase':                  ('usecase', np.str_, 'archive'),
+    'storageCapacity':          ('storagecapacity', np.float64, 2000),
+    'metaDataCapacity':         ('metadatacapacity', np.float64, 0),
+    'driveCapacity':            ('drivecapacity', np.float64, 16),
+    'drivesPerChassis':         ('drivesperchassis', np.int64, 24),
+    'populatedSlotsPerChassis': ('populatedslotsperchassis', np.int64, 24),
+    'nvmeSlotsPerChassis':      ('nvmeslotsperchassis', np.int64, 6),
+    'driveType':                ('drivetype', np.str_, 'HDD'),
+    'maxFillCapacity':          ('maxfillcapacity', np.float64, 80),
+    'nvmeRatio':                ('nvmeratio', np.int64, 12),
+    'protectionType':           ('protectiontype', np.int64, 1),
+    'ecProfileData':            ('ecprofiledata', np.int64, 8),
+    'ecProfileParity':          ('ecprofileparity', np.int64, 3),
+}
+
+# Result columns, in the same order as SizingData.reportSizingResults
+BATCH_RESULTS = ['sdr_RawCapacity', 'sdr_TotalCapacity', 'sdr_DrivesNeeded', 'sdr_ChassisNeeded',
+                 'sdr_ColoMemoryNeeded', 'sdr_MinimumMemoryNeeded', 'sdr_ColoCPUNeeded', 'sdr_ColoThreadsNeeded',
+                 'sdr_SuggestedCPU', 'sdr_NVMeNeeded', 'sdr_MinimumNVMeSize', 'sdr_ExpectedPerfGBs',
+                 'sdr_BOM_NumberOfChassis', 'sdr_BOM_ChassisModel', 'sdr_BOM_DrivesPerChassis', 'sdr_BOM_DriveSize',
+                 'sdr_BOM_DriveModel', 'sdr_BOM_MemoryPerChassis', 'sdr_BOM_CPUPerChassis', 'sdr_BOM_NVMe', 'sdr_BOM_NVMeSize',
+                 'sdr_BOM_NVMeModel']
+# The results holding catalog part codes -> the catalog categories that name them
+BATCH_CODES = dict({name: name for name in CATALOG_RESULTS}, sdr_BOM_CPUPerChassis='sdr_SuggestedCPU')
+
+
+class SizingBatch:
+    """batch sizing engine: the SizingData.calculateResults formulas, applied to whole input columns at once"""
+
+    def __init__(self, columns, missingInputs=None, catalog=None):
+        'columns is a dict of yaml input name -> sequence; missing inputs take the SizingData defaults'
+        ## catalog is the HardwareCatalog parts are chosen from (default: sonar-catalog.json)
+        ## missingInputs is {row: [required yaml names]} for rows that came without them (see fromRecords)
+        unknown = [name for name in columns if name not in BATCH_COLUMNS]
+        if unknown:
+            raise KeyError(f'Unknown batch input column(s): {", ".join(unknown)}')
+        lengths = {len(values) for values in columns.values()}
+        if len(lengths) > 1:
+            raise ValueError(f'Batch input columns differ in length: {sorted(lengths)}')
+        self.size = lengths.pop() if lengths else 0
+        # check the columns as given, before they are converted to their column types
+        self.sdc_Valid, self.sdc_ValidationErrors = validateColumns(columns, self.size)
+        for row, names in (missingInputs or {}).items():
+            self.sdc_Valid[row] = False
+            self.sdc_ValidationErrors.setdefault(row, []).extend(inputError('missing', name) for name in names)
+        self.columns = {}
+        for name, (lowerName, dtype, default) in BATCH_COLUMNS.items():
+            if name in columns:
+                ## NOTE: integer-valued inputs stay integers, so that the float results match the scalar path
+                values = np.asarray(columns[name])
+                if not (dtype is np.float64 and values.dtype.kind in 'iuf'):
+                    values = values.astype(dtype)
+            else:
+                values = np.full(self.size, default, dtype=dtype)
+            self.columns[name] = values
+        self.sdc_ComputationalErrors = None
+        self.catalog = (catalog if catalog is not None else loadCatalog())
+
+    @classmethod
+    def fromRecords(cls, records, catalog=None):
+        """build a batch from a list of yaml input dicts (names are matched case-insensitively)"""
+        lowerToName = {lowerName: name for name, (lowerName, dtype, default) in BATCH_COLUMNS.items()}
+        columns = {name: [default] * len(records) for name, (lowerName, dtype, default) in BATCH_COLUMNS.items()}
+        required = set(REQUIRED_INPUTS)
+        missingInputs = {}
+        for index, record in enumerate(records):
+            given = set()
+            for key, value in record.items():
+                name = lowerToName.get(key.lower())
+                if name is None:
+                    raise KeyError(f'Input option not found in record {index}: {key}: {value}')
+                columns[name][index] = value
+                given.add(name)
+            if not required <= given:
+                missingInputs[index] = [name for name in REQUIRED_INPUTS if name not in given]
+        return cls(columns, missingInputs, catalog)
+
+    def __len__(self):
+        return self.size
+
+    def calculateResults(self):
+        """compute every sdr_ result as an array; returns a bool array, True where no error occurred.
+           Rows that failed validation (see sdc_ValidationErrors) are computed too, but count as errors"""
+        col = self.columns
+        colo = col['colocation']
+        # a batch has only a few distinct drive type spellings: lower each once, not once per row
+        driveTypes, driveTypeRows = np.unique(col['driveType'], return_inverse=True)
+        ssd = np.array([driveType.lower() == 'ssd' for driveType in driveTypes.tolist()], dtype=np.bool_)[driveTypeRows]
+        ecData = col['ecProfileData']
+        ecParity = col['ecProfileParity']
+        ec = col['protectionType'] == 1
+        drivesPerChassis = col['drivesPerChassis']
+
+        ### Calculations -> Results
+        self.sdc_ECProfile = ecData + ecParity
+        with np.errstate(divide='ignore', invalid='ignore'):
+            self.sdr_RawCapacity = col['storageCapacity'] / (col['maxFillCapacity']*100)
+            self.sdr_TotalCapacity = np.where(ec, (self.sdr_RawCapacity / ecData) * self.sdc_ECProfile,
+                                              self.sdr_RawCapacity * col['protectionType'])
+            drives = np.ceil(self.sdr_TotalCapacity / col['driveCapacity'])
+            # a row that could not be computed (eg: zero EC data chunks) is an error, not garbage
+            self.sdc_InvalidInput = ~np.isfinite(drives) | ~self.sdc_Valid
+            self.sdr_DrivesNeeded = np.where(self.sdc_InvalidInput, 0, drives).astype(np.int64)
+            self.sdc_ChassisEstimate = np.ceil(self.sdr_DrivesNeeded / col['populatedSlotsPerChassis']).astype(np.int64)
+        # error: Number of nodes too low for EC profile
+        self.sdc_ECError = ec & ~(self.sdc_ECProfile < self.sdc_ChassisEstimate)
+        self.sdr_ChassisNeeded = np.where(self.sdc_ECError, 0, self.sdc_ChassisEstimate)
+        self.sdr_ColoMemoryNeeded = np.where(colo, SizingData.SDCONST_COLOMEMORY, 0)
+        self.sdr_MinimumMemoryNeeded = drivesPerChassis * SizingData.SDCONST_MEM2DRIVES + SizingData.SDCONST_MEMEXTRA + self.sdr_ColoMemoryNeeded
+        self.sdr_ColoCPUNeeded = np.where(colo, SizingData.SDCONST_COLOCPUS, 0)
+        self.sdr_ColoThreadsNeeded = np.where(ssd, drivesPerChassis * SizingData.SDCONST_SSD2THREAD, drivesPerChassis)
+        # part models are catalog codes here: one binary search per row, see toTable and getResults for the names
+        self.sdr_SuggestedCPU = self.catalog.pickCPUArray(self.sdr_ColoCPUNeeded + self.sdr_ColoThreadsNeeded)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            # an invalid nvmeRatio or drivesPerChassis must not stop the rest of the batch
+            self.sdr_NVMeNeeded = np.ceil(drivesPerChassis / col['nvmeRatio']).astype(np.int64)
+            self.sdr_MinimumNVMeSize = np.ceil((drivesPerChassis * SizingData.SDCONST_NVMEFACTOR) / self.sdr_NVMeNeeded).astype(np.int64)
+        self.sdc_DriveCode = self.catalog.pickDriveArray(ssd, col['driveCapacity'])
+        throughput = self.catalog.driveThroughputArray(self.sdc_DriveCode)
+        throughput = np.where(self.sdc_DriveCode == 0, np.where(ssd, SizingData.SDCONST_SSDFACTOR, SizingData.SDCONST_HDDFACTOR), throughput)
+        self.sdr_ExpectedPerfGBs = (self.sdr_DrivesNeeded * throughput) / SizingData.SDCONST_GBS
+
+        ### Calculations -> BOM
+        # Error - too many chassis for co-location
+        self.sdc_ColoError = colo & (self.sdr_ChassisNeeded > SizingData.SDCONST_COLOMAXNODES)
+        self.sdr_BOM_NumberOfChassis = np.where(self.sdc_ColoError, 0, self.sdr_ChassisNeeded)
+        self.sdr_BOM_ChassisModel = self.catalog.pickChassisArray(drivesPerChassis, self.sdr_NVMeNeeded)
+        self.sdr_BOM_DrivesPerChassis = drivesPerChassis
+        self.sdr_BOM_DriveSize = col['driveCapacity']
+        self.sdr_BOM_DriveModel = self.sdc_DriveCode
+        self.sdr_BOM_MemoryPerChassis = self.sdr_MinimumMemoryNeeded
+        self.sdr_BOM_CPUPerChassis = self.sdr_SuggestedCPU
+        self.sdr_BOM_NVMe = self.sdr_NVMeNeeded
+        self.sdr_BOM_NVMeSize = self.sdr_MinimumNVMeSize
+        self.sdr_BOM_NVMeModel = self.catalog.pickNVMeArray(self.sdr_MinimumNVMeSize)
+
+        self.sdc_ComputationalErrors = self.sdc_InvalidInput | self.sdc_ECError | self.sdc_ColoError
+        return ~self.sdc_ComputationalErrors
+
+    def toTable(self):
+        """the results as a SizingResultTable; columns that already have the right type are shared, not copied"""
+        # the part codes are the table's category codes already
+        columns = {name: getattr(self, name).astype(dtype, copy=False) for name, dtype in RESULT_FIELDS.items()}
+        # an input column that came as ints stays int typed: say so, as it is stored as a float
+        integers = [name for name in RESULT_INPUT_FIELDS if getattr(self, name).dtype.kind in 'iu']
+        return SizingResultTable(columns, categories=self.catalog.categories, integers=integers)
+
+    def getErrorMessages(self, index):
+        """the error messages calculateResults would have printed for one scenario"""
+        messages = []
+        if self.sdc_ECError[index]:
+            messages.append("Number of nodes too low for EC profile")
+        if self.sdc_ColoError[index]:
+            messages.append(f'Number of nodes ({self.sdr_ChassisNeeded[index]}) is too high for co-location')
+        return messages
+
+    def getResults(self, index):
+        """return the results of one scenario in the SizingData.getResults format (python values)"""
+        results = {name: getattr(self, name)[index].item() for name in BATCH_RESULTS}
+        for name, category in BATCH_CODES.items():
+            results[name] = self.catalog.model(category, results[name])
+        results.update(RESULT_CONSTANTS)
+        results['sdc_ComputationalErrors'] = bool(self.sdc_ComputationalErrors[index])
+        results['sdc_ErrorMessages'] = self.getErrorMessages(index)
+        return results
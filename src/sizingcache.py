@@ -0,0 +1,162 @@
+# -*- coding: utf-8 -*-
+__author__      = "Brian Fromme"
+__copyright__   = "Copyright 2020, Gnu Public License - Version 2.0"
+__credits__     = ["Brian Fromme, Bryan Gartner, Darren Soothill"]
+__maintainer__  = "Brian Fromme"
+__status__      = "Prototype"
+"""
+@newfield description: Description
+"""
+__description__ = "Sonar result cache - in-memory LRU plus an optional sqlite file"
+
+import collections
+import json
+import sys
+
+import cmdline
+from sizingcatalog import loadCatalog
+from sizingdata import SizingData
+
+
+def cacheFingerprint(catalogFingerprint=''):
+    """identify the sizing rules: every SDCONST_ constant, the hardware catalog and the program version"""
+    import hashlib
+    constants = sorted((name, value) for name, value in vars(SizingData).items() if name.startswith('SDCONST_'))
+    return hashlib.sha256(json.dumps([cmdline.__version__, constants, catalogFingerprint]).encode()).hexdigest()
+
+
+def canonicalKey(sizingData):
+    """turn the validated sdi_ inputs into a hashable key, or None if they cannot be cached.
+       JSON keeps 16 and 16.0 apart, as they are reported differently"""
+    try:
+        return json.dumps(sizingData.getInputs())
+    except (TypeError, ValueError):
+        return None
+
+
+class SizingCache:
+    """memoize calculateResults: a bounded LRU in memory, backed by an optional persistent sqlite file"""
+
+    def __init__(self, maxSize=4096, fileName=None, catalogFingerprint=''):
+        self.maxSize = maxSize
+        self.catalogFingerprint = catalogFingerprint
+        self.lru = collections.OrderedDict()
+        # only the sqlite file needs the fingerprint (and hashlib and sqlite3) - see openFile
+        self.fingerprint = None
+        self.hits = 0
+        self.misses = 0
+        self.diskHits = 0
+        self.evictions = 0
+        self.uncacheable = 0
+        self.pendingWrites = 0
+        self.db = None
+        if fileName:
+            self.openFile(fileName)
+
+    @classmethod
+    def fromOptions(cls, options):
+        """build the cache the command line asked for, or None when caching is off"""
+        if options.argCacheSize <= 0 and not options.argCacheFile:
+            return None
+        return cls(options.argCacheSize, options.argCacheFile, loadCatalog(options.argCatalog).fingerprint)
+
+    def openFile(self, fileName):
+        """open (or create) the sqlite cache; results from other rules or versions are thrown away"""
+        import sqlite3
+        self.fingerprint = cacheFingerprint(self.catalogFingerprint)
+        # a generous timeout, as --jobs workers share the one file
+        self.db = sqlite3.connect(fileName, timeout=30)
+        self.db.execute('PRAGMA journal_mode=WAL')
+        self.db.execute('CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value TEXT)')
+        self.db.execute('CREATE TABLE IF NOT EXISTS results (key TEXT PRIMARY KEY, results TEXT)')
+        row = self.db.execute("SELECT value FROM meta WHERE name = 'fingerprint'").fetchone()
+        if row is None or row[0] != self.fingerprint:
+            self.db.execute('DELETE FROM results')
+            self.db.execute("INSERT OR REPLACE INTO meta VALUES ('fingerprint', ?)", (self.fingerprint,))
+        self.db.commit()
+
+    def get(self, key):
+        """return the cached results for key, or None"""
+        results = self.lru.get(key)
+        if results is not None:
+            self.lru.move_to_end(key)
+            return results
+        if self.db is not None:
+            row = self.db.execute('SELECT results FROM results WHERE key = ?', (key,)).fetchone()
+            if row is not None:
+                self.diskHits += 1
+                results = json.loads(row[0])
+                self.remember(key, results)
+                return results
+        return None
+
+    def remember(self, key, results):
+        """store in the LRU only, evicting the least recently used entry when full"""
+        if self.maxSize <= 0:
+            return
+        self.lru[key] = results
+        if len(self.lru) > self.maxSize:
+            self.lru.popitem(last=False)
+            self.evictions += 1
+
+    def put(self, key, results):
+        """store in the LRU and the sqlite file"""
+        self.remember(key, results)
+        if self.db is not None:
+            self.db.execute('INSERT OR REPLACE INTO results VALUES (?, ?)', (key, json.dumps(results)))
+            self.pendingWrites += 1
+            if self.pendingWrites >= 256:
+                self.flush()
+
+    def flush(self):
+        """commit pending writes to the sqlite file"""
+        if self.db is not None and self.pendingWrites:
+            self.db.commit()
+            self.pendingWrites = 0
+
+    def close(self):
+        self.flush()
+        if self.db is not None:
+            self.db.close()
+            self.db = None
+
+    def calculateResults(self, sizingData):
+        """calculateResults through the cache; returns True, unless an error occurred"""
+        key = canonicalKey(sizingData)
+        if key is None:
+            self.uncacheable += 1
+            return sizingData.calculateResults()
+        results = self.get(key)
+        if results is None:
+            self.misses += 1
+            retval = sizingData.calculateResults()
+            self.put(key, sizingData.getResults())
+            return retval
+        self.hits += 1
+        # a cached result reports its errors just as a fresh calculation would
+        for message in results['sdc_ErrorMessages']:
+            print(message, file=sys.stderr)
+        return sizingData.setResults(results)
+
+    def lookup(self, sizingData):
+        """(key, cached results) for a validated SizingData, counted as a hit or a miss; the results are None on a miss,
+           and the key None when the inputs cannot be cached. Whoever then calculates the results puts them"""
+        key = canonicalKey(sizingData)
+        if key is None:
+            self.uncacheable += 1
+            return None, None
+        results = self.get(key)
+        if results is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return key, results
+
+    def getStats(self):
+        """the hit/miss counters, as a dict"""
+        return {'hits': self.hits, 'misses': self.misses, 'diskHits': self.diskHits,
+                'evictions': self.evictions, 'uncacheable': self.uncacheable, 'entries': len(self.lru)}
+
+    def reportStats(self):
+        stats = self.getStats()
+        print(f'Cache: ' + ', '.join(f'{name} = {value}' for name, value in stats.items()), file=sys.stdout)
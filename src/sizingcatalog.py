@@ -0,0 +1,237 @@
+# -*- coding: utf-8 -*-
+__author__      = "Brian Fromme"
+__copyright__   = "Copyright 2020, Gnu Public License - Version 2.0"
+__credits__     = ["Brian Fromme, Bryan Gartner, Darren Soothill"]
+__maintainer__  = "Brian Fromme"
+__status__      = "Prototype"
+"""
+@newfield description: Description
+"""
+__description__ = "Sonar hardware catalog - CPU, drive, NVMe and chassis models with sorted indexes for part selection"
+
+import bisect
+import json
+import os.path
+import zlib
+
+CATALOG_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'sonar-catalog.json')
+
+# What a result holds when no part in the catalog is big enough
+NOT_AVAILABLE = 'Not Available'
+
+# The sections of a catalog file and the fields every part in them must have (cost is optional)
+CATALOG_SECTIONS = {
+    'cpus': ['model', 'threads'],
+    'drives': ['model', 'type', 'capacity', 'throughput'],
+    'nvmes': ['model', 'capacity'],
+    'chassis': ['model', 'slots', 'nvmeSlots'],
+}
+
+# How many distinct part selections selectParts remembers before it starts over: scenarios share few of them
+CATALOG_SELECTIONS = 4096
+# The chassis search arrays put each NVMe slot count's slot keys in a span of their own (see chassisSearchArrays)
+CATALOG_CHASSIS_SPAN = 2.0 ** 32
+
+# The results that name a part: result -> catalog section
+CATALOG_RESULTS = {
+    'sdr_SuggestedCPU': 'cpus',
+    'sdr_BOM_DriveModel': 'drives',
+    'sdr_BOM_NVMeModel': 'nvmes',
+    'sdr_BOM_ChassisModel': 'chassis',
+}
+
+
+class PartIndex:
+    """some parts of one kind, sorted by one key (then by cost): each lookup is a binary search.
+       Parts are identified by their code: 1 + their position in the catalog section (0 is NOT_AVAILABLE)"""
+
+    def __init__(self, parts, positions, key):
+        order = sorted(positions, key=lambda position: (parts[position][key], parts[position].get('cost', 0)))
+        self.keys = [parts[position][key] for position in order]
+        # a trailing 0 code for 'past the end': a search result indexes the codes without a bounds check
+        self.codes = [position + 1 for position in order] + [0]
+        self.arrays = None
+
+    def __len__(self):
+        return len(self.keys)
+
+    def atLeast(self, value):
+        """the code of the smallest (then cheapest) part with key >= value, or 0"""
+        return self.codes[bisect.bisect_left(self.keys, value)]
+
+    def moreThan(self, value):
+        """the code of the smallest (then cheapest) part with key > value, or 0"""
+        return self.codes[bisect.bisect_right(self.keys, value)]
+
+    def largest(self):
+        return self.codes[-2] if self.keys else 0
+
+    def searchArrays(self):
+        """the index as numpy arrays (built on first use)"""
+        if self.arrays is None:
+            import numpy as np
+            self.arrays = (np.array(self.keys, dtype=np.float64), np.array(self.codes, dtype=np.int32))
+        return self.arrays
+
+    def atLeastArray(self, values):
+        """atLeast for a whole array of values"""
+        import numpy as np
+        keys, codes = self.searchArrays()
+        return codes[np.searchsorted(keys, values, side='left')]
+
+    def moreThanArray(self, values):
+        """moreThan for a whole array of values"""
+        import numpy as np
+        keys, codes = self.searchArrays()
+        return codes[np.searchsorted(keys, values, side='right')]
+
+
+class HardwareCatalog:
+    """the parts sonar can put in a BOM, indexed for 'the smallest part with at least N threads / X GB / Y slots'"""
+
+    def __init__(self, catalog, fingerprint=''):
+        'catalog is the parsed catalog file: section -> list of parts'
+        if not isinstance(catalog, dict):
+            raise ValueError('A hardware catalog is a set of sections: ' + ', '.join(CATALOG_SECTIONS))
+        self.fingerprint = fingerprint
+        self.parts = {}
+        for section, fields in CATALOG_SECTIONS.items():
+            parts = catalog.get(section, [])
+            for index, part in enumerate(parts):
+                missing = [field for field in fields if not (isinstance(part, dict) and field in part)]
+                if missing:
+                    raise ValueError(f'Catalog {section} entry {index} has no {", ".join(missing)}')
+            self.parts[section] = parts
+        if not self.parts['cpus']:
+            raise ValueError('A hardware catalog needs at least one CPU')
+        # every part-naming result is reported through these, by code
+        self.categories = {result: [NOT_AVAILABLE] + [part['model'] for part in self.parts[section]]
+                           for result, section in CATALOG_RESULTS.items()}
+
+        cpus = self.parts['cpus']
+        self.cpuIndex = PartIndex(cpus, range(len(cpus)), 'threads')
+        drives = self.parts['drives']
+        self.driveIndex = {driveType: PartIndex(drives, [position for position, drive in enumerate(drives)
+                                                         if str(drive['type']).upper() == driveType], 'capacity')
+                           for driveType in ('HDD', 'SSD')}
+        self.hddIndex, self.ssdIndex = self.driveIndex['HDD'], self.driveIndex['SSD']
+        # drive throughput by code (MB/s), for the expected performance; code 0 has none
+        self.driveThroughput = [None] + [drive['throughput'] for drive in drives]
+        nvmes = self.parts['nvmes']
+        self.nvmeIndex = PartIndex(nvmes, range(len(nvmes)), 'capacity')
+        # one slot-sorted index per NVMe slot count: chassisIndex[n] holds the chassis with at least n NVMe slots
+        chassis = self.parts['chassis']
+        mostNVMeSlots = max([box['nvmeSlots'] for box in chassis], default=0)
+        self.chassisIndex = [PartIndex(chassis, [position for position, box in enumerate(chassis) if box['nvmeSlots'] >= n], 'slots')
+                             for n in range(mostNVMeSlots + 2)]
+        self.chassisArrays = None
+        self.throughputArray = None
+        # selectParts results by their inputs
+        self.selections = {}
+
+    @classmethod
+    def load(cls, path=None):
+        """read a catalog file (JSON, or yaml); the default is sonar-catalog.json next to this module"""
+        path = path or CATALOG_FILE
+        with open(path, 'r') as f:
+            text = f.read()
+        if path.endswith('.json'):
+            catalog = json.loads(text)
+        else:
+            from sizinginput import parseText
+            catalog = parseText(text)
+        # cached results are only good for the catalog they were chosen from
+        return cls(catalog, f'{zlib.crc32(text.encode()):08x}')
+
+    def model(self, result, code):
+        """the model name for a code returned by the pick methods"""
+        return self.categories[result][code]
+
+    ## These run once per scenario: each is a single bisect, without going through PartIndex methods
+
+    def pickCPU(self, threads):
+        """the smallest CPU with more threads than needed - some headroom - or else the largest there is"""
+        index = self.cpuIndex
+        return (index.codes[bisect.bisect_right(index.keys, threads)] or index.codes[-2])
+
+    def pickDrive(self, ssd, capacity):
+        """the smallest drive of the type holding at least capacity TB, or 0"""
+        index = (self.ssdIndex if ssd else self.hddIndex)
+        return index.codes[bisect.bisect_left(index.keys, capacity)]
+
+    def pickNVMe(self, capacity):
+        """the smallest NVMe device of at least capacity GB, or 0"""
+        index = self.nvmeIndex
+        return index.codes[bisect.bisect_left(index.keys, capacity)]
+
+    def pickChassis(self, slots, nvmeSlots):
+        """the smallest chassis with at least slots drive slots and nvmeSlots NVMe slots, or 0"""
+        index = self.chassisIndex[nvmeSlots if nvmeSlots < len(self.chassisIndex) else -1]
+        return index.codes[bisect.bisect_left(index.keys, slots)]
+
+    def selectParts(self, key):
+        """every part one scenario needs, for key = (CPU threads, ssd, drive TB, NVMe GB, drive slots, NVMe slots):
+           (CPU model, drive code, drive MB/s or None, drive model, NVMe model, chassis model).
+           calculateResults looks in self.selections first, and only calls this for a selection it has not seen"""
+        threads, ssd, driveCapacity, nvmeSize, slots, nvmeSlots = key
+        driveCode = self.pickDrive(ssd, driveCapacity)
+        parts = (self.model('sdr_SuggestedCPU', self.pickCPU(threads)), driveCode, self.driveThroughput[driveCode],
+                 self.model('sdr_BOM_DriveModel', driveCode), self.model('sdr_BOM_NVMeModel', self.pickNVMe(nvmeSize)),
+                 self.model('sdr_BOM_ChassisModel', self.pickChassis(slots, nvmeSlots)))
+        if len(self.selections) >= CATALOG_SELECTIONS:
+            self.selections.clear()
+        self.selections[key] = parts
+        return parts
+
+    ## The same picks for whole numpy arrays (batch sizing): each returns an array of codes
+
+    def pickCPUArray(self, threads):
+        import numpy as np
+        codes = self.cpuIndex.moreThanArray(threads)
+        return np.where(codes == 0, self.cpuIndex.largest(), codes)
+
+    def pickDriveArray(self, ssd, capacity):
+        import numpy as np
+        return np.where(ssd, self.ssdIndex.atLeastArray(capacity), self.hddIndex.atLeastArray(capacity))
+
+    def pickNVMeArray(self, capacity):
+        return self.nvmeIndex.atLeastArray(capacity)
+
+    def chassisSearchArrays(self):
+        """every chassisIndex as one pair of search arrays (built on first use): index n's slot keys are offset by
+           n * CATALOG_CHASSIS_SPAN and end in a key at the top of its span, for its trailing 0 code"""
+        if self.chassisArrays is None:
+            import numpy as np
+            keys, codes = [], []
+            for n, index in enumerate(self.chassisIndex):
+                keys.extend([n * CATALOG_CHASSIS_SPAN + key for key in index.keys] + [(n + 1) * CATALOG_CHASSIS_SPAN - 1])
+                codes.extend(index.codes)
+            self.chassisArrays = (np.array(keys, dtype=np.float64), np.array(codes, dtype=np.int32))
+        return self.chassisArrays
+
+    def pickChassisArray(self, slots, nvmeSlots):
+        import numpy as np
+        keys, codes = self.chassisSearchArrays()
+        # one search for the whole batch, whatever mix of NVMe slot counts it has
+        nvmeSlots = np.clip(nvmeSlots, 0, len(self.chassisIndex) - 1)
+        slots = np.clip(slots, 0, CATALOG_CHASSIS_SPAN - 2)
+        return codes[np.searchsorted(keys, nvmeSlots * CATALOG_CHASSIS_SPAN + slots, side='left')]
+
+    def driveThroughputArray(self, codes):
+        """MB/s per drive for an array of drive codes; NaN where there is no drive"""
+        import numpy as np
+        if self.throughputArray is None:
+            self.throughputArray = np.array([np.nan] + self.driveThroughput[1:], dtype=np.float64)
+        return self.throughputArray[codes]
+
+
+# Catalogs already loaded, by file name (None is the default catalog)
+loadedCatalogs = {}
+
+
+def loadCatalog(path=None):
+    """the catalog in a file, read only once per process"""
+    catalog = loadedCatalogs.get(path)
+    if catalog is None:
+        catalog = loadedCatalogs[path] = HardwareCatalog.load(path)
+    return catalog
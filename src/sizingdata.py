@@ -12,9 +12,11 @@ __description__ = "Sonar sizing data - obtained from user input"
 import math
 import os.path
 import sys
-import yaml
 
 from cmdline import Options
+from sizingcatalog import loadCatalog
+from sizinginput import readInputFile
+from sizingschema import formatError, validateRecord
 
 
 class SizingData:
@@ -27,19 +29,75 @@ class SizingData:
     SDCONST_COLOCPUS = 8
     SDCONST_COLOMAXNODES = 15
     SDCONST_SSD2THREAD = 2
-    SDCONST_MINTHREADS = 32
-    SDCONST_4215R = 'Xeon 4215r'
-    SDCONST_6248R = 'Xeon 6248r'
+    ## NOTE: CPU, drive, NVMe and chassis models are chosen from the hardware catalog (see sizingcatalog)
     SDCONST_NVMEFACTOR = 68
     SDCONST_HDDFACTOR = 35
     SDCONST_GBS = 1000
     SDCONST_SSDFACTOR = 120
     SDCONST_NVMEFACTOR = 300
 
+    # The sdi_ input attributes set by validateSizingData
+    SDINPUTS = ['sdi_Colo', 'sdi_ArchiveUseCase', 'sdi_StorageCapacity', 'sdi_MetaDataCapacity', 'sdi_DriveCapacity',
+                'sdi_DrivesPerChassis', 'sdi_PopulatedSlotsPerChassis', 'sdi_NVMeSlotsPerChassis', 'sdi_DriveTypeSSD',
+                'sdi_MaxFillCapacityPercent', 'sdi_NVMeRatio', 'sdi_ProtectionType', 'sdi_ECData', 'sdi_ECParity']
+
+    # The report: (section, [(label, sdr_ result attribute)])
+    SDREPORT = [
+        ('Sizing First-Opinion', [
+            ('Raw Capacity', 'sdr_RawCapacity'),
+            # Total capacity (TB)
+            ('Total Capacity', 'sdr_TotalCapacity'),
+            ('Number of Drives', 'sdr_DrivesNeeded'),
+            ('Number of Chassis', 'sdr_ChassisNeeded'),
+            ('Colocated Memory Needed', 'sdr_ColoMemoryNeeded'),
+            ('Minimum Memory Needed', 'sdr_MinimumMemoryNeeded'),
+            ('Colocated CPU Needed', 'sdr_ColoCPUNeeded'),
+            ('Number of 2Ghz CPU Threads Needed', 'sdr_ColoThreadsNeeded'),
+            ('Suggested CPU Model', 'sdr_SuggestedCPU'),
+            ('Number of NVMe Devices Needed for RocksDB/WAL', 'sdr_NVMeNeeded'),
+            # Minimum size of NVMe devices (GB)
+            ('Minimum Size of NVMe Devices', 'sdr_MinimumNVMeSize'),
+            ('Expected Performance (GB/s)', 'sdr_ExpectedPerfGBs'),
+            # Network cards:  TBD
+            ('Network Cards', 'sdr_NetworkCards')]),
+        ('BOM First-Opinion', [
+            # Number of chassis - Zero represents an error condition
+            ('Number of Chassis', 'sdr_BOM_NumberOfChassis'),
+            ('Chassis Model', 'sdr_BOM_ChassisModel'),
+            # Number of drives per chassis and their capacity (just what we were told from input) (in TB)
+            ('Number of Drives Per Chassis', 'sdr_BOM_DrivesPerChassis'),
+            ('Drive Size', 'sdr_BOM_DriveSize'),
+            ('Drive Model', 'sdr_BOM_DriveModel'),
+            # Memory per chassis (in GB)
+            ('Memory Per Chassis', 'sdr_BOM_MemoryPerChassis'),
+            # CPU per chassis (2 of)
+            ('CPU Per Chassis', 'sdr_BOM_CPUPerChassis'),
+            ('RocksDB/WAL Number of NVMe Drives', 'sdr_BOM_NVMe'),
+            ('RocksDB/WAL NVMe Capacity', 'sdr_BOM_NVMeSize'),
+            ('RocksDB/WAL NVMe Model', 'sdr_BOM_NVMeModel'),
+            ('OS Disk Capacity', 'sdr_BOM_OSDisk'),
+            ('NVMe Metadata Capacity', 'sdr_BOM_MetaDataNVMes'),
+            ## NOTE: there is no BOM network card result yet; this has always reported the OS disk value
+            ('Network Cards', 'sdr_BOM_OSDisk')]),
+    ]
+
+    # The sdr_ result attributes set by calculateResults, in report order
+    SDRESULTS = ['sdr_RawCapacity', 'sdr_TotalCapacity', 'sdr_DrivesNeeded', 'sdr_ChassisNeeded',
+                 'sdr_ColoMemoryNeeded', 'sdr_MinimumMemoryNeeded', 'sdr_ColoCPUNeeded', 'sdr_ColoThreadsNeeded',
+                 'sdr_SuggestedCPU', 'sdr_NVMeNeeded', 'sdr_MinimumNVMeSize', 'sdr_ExpectedPerfGBs', 'sdr_NetworkCards',
+                 'sdr_BOM_NumberOfChassis', 'sdr_BOM_ChassisModel', 'sdr_BOM_DrivesPerChassis', 'sdr_BOM_DriveSize',
+                 'sdr_BOM_DriveModel', 'sdr_BOM_MemoryPerChassis', 'sdr_BOM_CPUPerChassis', 'sdr_BOM_NVMe', 'sdr_BOM_NVMeSize',
+                 'sdr_BOM_NVMeModel', 'sdr_BOM_OSDisk', 'sdr_BOM_MetaDataNVMes']
+
     def __init__(self, optionsInstance):
         'The caller must pass us the Options instance - for command line options'
         self.options = optionsInstance
         self.sizingData = None
+        self.catalog = None
+        self.resetInputs()
+
+    def resetInputs(self):
+        """set every input back to its default, so one instance can size many scenarios"""
         ### Input Values
         # Co-Location of Gateway/MDS/MON's        Yes
         # Use Case                                Archive|Mixed
@@ -74,9 +132,14 @@ class SizingData:
         self.sdc_ECProfile = self.sdi_ECData + self.sdi_ECParity
         # This tells us whether there were computational errors
         self.sdc_ComputationalErrors = False
+        self.sdc_ErrorMessages = []
 
     def calculateResults(self):
         ### Calculations -> Results
+        self.sdc_ComputationalErrors = False
+        self.sdc_ErrorMessages = []
+        # The EC profile width must follow the validated input, not the resetInputs defaults
+        self.sdc_ECProfile = self.sdi_ECData + self.sdi_ECParity
         # Raw capacity required (TB): sdStorageCapacity / (sdMaxFillCapacityPercent*100)
         #     NOTE: compute this value first, as the Total capacity depends upon this result
         self.sdr_RawCapacity = self.sdi_StorageCapacity / (self.sdi_MaxFillCapacityPercent*100)
@@ -96,8 +159,7 @@ class SizingData:
             else:
                 # error: Number of nodes too low for EC profile
                 self.sdr_ChassisNeeded = 0
-                print("Number of nodes too low for EC profile", file=sys.stderr)
-                self.sdc_ComputationalErrors = True
+                self.computationalError("Number of nodes too low for EC profile")
         else:
             self.sdr_ChassisNeeded = self.sdc_ChassisEstimate
         # Colo memory needed: 
@@ -108,14 +170,21 @@ class SizingData:
         self.sdr_ColoCPUNeeded = (self.SDCONST_COLOCPUS if self.sdi_Colo else 0)
         # Number of 2Ghz CPU threads per chassis needed: 
         self.sdr_ColoThreadsNeeded = (self.sdi_DrivesPerChassis * self.SDCONST_SSD2THREAD if self.sdi_DriveTypeSSD else self.sdi_DrivesPerChassis)
-        # Suggested CPU model: 
-        self.sdr_SuggestedCPU = (self.SDCONST_4215R if (self.sdr_ColoCPUNeeded+self.sdr_ColoThreadsNeeded)<self.SDCONST_MINTHREADS else self.SDCONST_6248R)
         # Number of NVMe devices needed for RocksDB/WAL: 
         self.sdr_NVMeNeeded = math.ceil(self.sdi_DrivesPerChassis / self.sdi_NVMeRatio)
         # Minimum size of NVMe devices (GB): 
         self.sdr_MinimumNVMeSize = math.ceil((self.sdi_DrivesPerChassis*self.SDCONST_NVMEFACTOR) / self.sdr_NVMeNeeded)
-        # Expected performance (GB/s): 
-        self.sdr_ExpectedPerfGBs = ((self.sdr_DrivesNeeded*self.SDCONST_SSDFACTOR)/self.SDCONST_GBS if self.sdi_DriveTypeSSD else (self.sdr_DrivesNeeded*self.SDCONST_HDDFACTOR)/self.SDCONST_GBS)
+        # The catalog parts: the smallest CPU with more threads than needed, the smallest drive of the input type and
+        # at least the input capacity, the smallest NVMe device and chassis big enough - looked up once per selection
+        catalog = (self.catalog or self.getCatalog())
+        key = (self.sdr_ColoCPUNeeded+self.sdr_ColoThreadsNeeded, self.sdi_DriveTypeSSD, self.sdi_DriveCapacity,
+               self.sdr_MinimumNVMeSize, self.sdi_DrivesPerChassis, self.sdr_NVMeNeeded)
+        parts = (catalog.selections.get(key) or catalog.selectParts(key))
+        self.sdr_SuggestedCPU = parts[0]
+        self.sdc_DriveCode = parts[1]
+        # Expected performance (GB/s): from the catalog drive's throughput, or the rule of thumb without one
+        throughput = (parts[2] if self.sdc_DriveCode else (self.SDCONST_SSDFACTOR if self.sdi_DriveTypeSSD else self.SDCONST_HDDFACTOR))
+        self.sdr_ExpectedPerfGBs = (self.sdr_DrivesNeeded*throughput)/self.SDCONST_GBS
         # Network cards:  TBD
         self.sdr_NetworkCards = 'Not Implemented'
 
@@ -124,13 +193,15 @@ class SizingData:
         self.sdr_BOM_NumberOfChassis = 0
         if self.sdi_Colo and self.sdr_ChassisNeeded > self.SDCONST_COLOMAXNODES:
             # Error - too many chassis
-            print(f'Number of nodes ({self.sdr_ChassisNeeded}) is too high for co-location', file=sys.stderr)
-            self.sdc_ComputationalErrors = True
+            self.computationalError(f'Number of nodes ({self.sdr_ChassisNeeded}) is too high for co-location')
         else:
             self.sdr_BOM_NumberOfChassis = self.sdr_ChassisNeeded
+        # Chassis model: the smallest catalog chassis with the drive slots and the NVMe slots needed
+        self.sdr_BOM_ChassisModel = parts[5]
         # Number of drives per chassis and their capacity (just what we were told from input) (in TB)
         self.sdr_BOM_DrivesPerChassis = self.sdi_DrivesPerChassis
         self.sdr_BOM_DriveSize = self.sdi_DriveCapacity
+        self.sdr_BOM_DriveModel = parts[3]
         # Memory per chassis (in GB)
         self.sdr_BOM_MemoryPerChassis = self.sdr_MinimumMemoryNeeded
         # CPU per chassis (2 of)
@@ -138,6 +209,7 @@ class SizingData:
         # RocksDB/WAL (NMVe)
         self.sdr_BOM_NVMe = self.sdr_NVMeNeeded
         self.sdr_BOM_NVMeSize = self.sdr_MinimumNVMeSize
+        self.sdr_BOM_NVMeModel = parts[4]
         # OS Disk
         self.sdr_BOM_OSDisk = 'Not Implemented'
         # Metadata NVMEs
@@ -150,62 +222,48 @@ class SizingData:
         # return True, unless an error occurred
         return not self.sdc_ComputationalErrors
 
-    def reportSizingResults(self):
-        """Report the sizing results we computed from the user input"""
+    def getCatalog(self):
+        """the hardware catalog parts are chosen from: --catalog, or the default one"""
+        if self.catalog is None:
+            self.catalog = loadCatalog(self.options.argCatalog)
+        return self.catalog
+
+    def computationalError(self, message):
+        """report an error found while calculating, and keep it with the results"""
+        print(message, file=sys.stderr)
+        self.sdc_ErrorMessages.append(message)
+        self.sdc_ComputationalErrors = True
+
+    def getInputs(self):
+        """return the sdi_ input values as a tuple, in SDINPUTS order"""
+        return tuple(getattr(self, name) for name in self.SDINPUTS)
+
+    def getResults(self):
+        """return the computed results as a plain dict, eg: to hand them to another process"""
+        results = {name: getattr(self, name) for name in self.SDRESULTS}
+        results['sdc_ComputationalErrors'] = self.sdc_ComputationalErrors
+        results['sdc_ErrorMessages'] = list(self.sdc_ErrorMessages)
+        return results
+
+    def setResults(self, results):
+        """restore results from getResults, so they can be reported without recomputing"""
+        for name, value in results.items():
+            setattr(self, name, value)
+        return not self.sdc_ComputationalErrors
+
+    def reportSizingResults(self, f=None):
+        """Report the sizing results we computed from the user input (to stdout, unless given a file)"""
         if self.sizingData is None:
             print (f'Error: No yaml input: {self.options.argInput}', file=sys.stderr)
             return False
         else:
-            print()
-            print(f'Sizing First-Opinion:')
-            print(f'Raw Capacity = {self.sdr_RawCapacity}')
-            # Total capacity (TB): 
-            print(f'Total Capacity = {self.sdr_TotalCapacity}')
-            # Number of drives needed: 
-            print(f'Number of Drives = {self.sdr_DrivesNeeded}')
-            # Number of chassis needed: 
-            print(f'Number of Chassis = {self.sdr_ChassisNeeded}')
-            # Colo memory needed: 
-            print(f'Colocated Memory Needed = {self.sdr_ColoMemoryNeeded}')
-            # Minimum memory needed: 
-            print(f'Minimum Memory Needed = {self.sdr_MinimumMemoryNeeded}')
-            # Colo CPU needed: 
-            print(f'Colocated CPU Needed = {self.sdr_ColoCPUNeeded}')
-            # Number of 2Ghz CPU threads per chassis needed: 
-            print(f'Number of 2Ghz CPU Threads Needed = {self.sdr_ColoThreadsNeeded}')
-            # Suggested CPU model: 
-            print(f'Suggested CPU Model = {self.sdr_SuggestedCPU}')
-            # Number of NVMe devices needed for RocksDB/WAL: 
-            print(f'Number of NVMe Devices Needed for RocksDB/WAL = {self.sdr_NVMeNeeded}')
-            # Minimum size of NVMe devices (GB): 
-            print(f'Minimum Size of NVMe Devices = {self.sdr_MinimumNVMeSize}')
-            # Expected performance (GB/s): 
-            print(f'Expected Performance (GB/s) = {self.sdr_ExpectedPerfGBs}')
-            # Network cards:  TBD
-            print(f'Network Cards = {self.sdr_NetworkCards}')
-
-            ### Calculations -> BOM
-            print()
-            print(f'BOM First-Opinion:')
-            # Number of chassis - Zero represents an error condition
-            print(f'Number of Chassis = {self.sdr_BOM_NumberOfChassis}')
-            # Number of drives per chassis and their capacity (just what we were told from input) (in TB)
-            print(f'Number of Drives Per Chassis = {self.sdr_BOM_DrivesPerChassis}')
-            print(f'Drive Size = {self.sdr_BOM_DriveSize}')
-            # Memory per chassis (in GB)
-            print(f'Memory Per Chassis = {self.sdr_BOM_MemoryPerChassis}')
-            # CPU per chassis (2 of)
-            print(f'CPU Per Chassis = {self.sdr_BOM_CPUPerChassis}')
-            # RocksDB/WAL (NMVe)
-            print(f'RocksDB/WAL Number of NVMe Drives = {self.sdr_BOM_NVMe}')
-            print(f'RocksDB/WAL NVMe Capacity = {self.sdr_BOM_NVMeSize}')
-            # OS Disk
-            print(f'OS Disk Capacity = {self.sdr_BOM_OSDisk}')
-            # Metadata NVMEs
-            print(f'NVMe Metadata Capacity = {self.sdr_BOM_MetaDataNVMes}')
-            # Network Cards
-            print(f'Network Cards = {self.sdr_BOM_OSDisk}')
-            ## End of Calculation and BOM variables
+            f = (f if f is not None else sys.stdout)
+            for section, lines in self.SDREPORT:
+                print(file=f)
+                print(f'{section}:', file=f)
+                for label, name in lines:
+                    print(f'{label} = {getattr(self, name)}', file=f)
+            return True
 
     def __del__(self):
         classless_name = self.__class__.__name__
@@ -218,13 +276,22 @@ class SizingData:
             return False
         if self.options.argVerbose:
            print (f'Attempting to open input file: {self.options.argInput}', file=sys.stdout)
-        with open(self.options.argInput, 'r') as f:
-           if self.options.argVerbose:
-              print (f'Reading yaml input file: {self.options.argInput}', file=sys.stdout)
-           self.sizingData = yaml.safe_load(f)
-        # NOTE: What about yaml error handling?  if error, return False
+        if self.options.argVerbose:
+           print (f'Reading yaml input file: {self.options.argInput}', file=sys.stdout)
+        try:
+           # JSON input and --input-cache hits skip the yaml parser altogether
+           self.sizingData = readInputFile(self.options.argInput, self.options.argInputCache)
+        except (OSError, ValueError) as e:
+           print (f'Error: Cannot parse yaml input: {self.options.argInput}: {e}', file=sys.stderr)
+           return False
         return True
 
+    def loadSizingRecord(self, record):
+        """take one already-parsed input record (eg: one document of a stream) in place of readYAMLInput"""
+        self.resetInputs()
+        self.sizingData = record
+        return isinstance(record, dict)
+
     def printSizingData(self):
         """print the sizing data we read from the yaml file - NOTE: Remove. Only used for debugging"""
         ## NOTE: Debug only
@@ -255,93 +322,12 @@ class SizingData:
             print(f'Value: sdc_ComputationalErrors = {self.sdc_ComputationalErrors}')
             return True
 
-    ##
-    ## These are all the vTable functions for parsing the passed input
-    ##
-
-    def v_Colocation(self, val):
-        """store sizing data by name from a vTable"""
-        self.sdi_Colo = val
-        return True
-
-    def v_ArchiveUseCase(self, val):
-        """store sizing data by name from a vTable"""
-        ## BUG: The else portion is actually not accurate. It assumes Mixed if not Archive
-        lowerval = val.lower()
-        self.sdi_ArchiveUseCase = (True if lowerval == 'archive' else False)
-        return True
-
-    def v_StorageCapacity(self, val):
-        """store sizing data by name from a vTable"""
-        self.sdi_StorageCapacity = val
-        return True
-
-    def v_MetaDataCapacity(self, val):
-        """store sizing data by name from a vTable"""
-        self.sdi_MetaDataCapacity = val
-        return True
-
-    def v_DriveCapacity(self, val):
-        """store sizing data by name from a vTable"""
-        self.sdi_DriveCapacity = val
-        return True
-
-    def v_DrivesPerChassis(self, val):
-        """store sizing data by name from a vTable"""
-        self.sdi_DrivesPerChassis = val
-        return True
-
-    def v_PopulatedSlotsPerChassis(self, val):
-        """store sizing data by name from a vTable"""
-        self.sdi_PopulatedSlotsPerChassis = val
-        return True
-
-    def v_NVMeSlotsPerChassis(self, val):
-        """store sizing data by name from a vTable"""
-        self.sdi_NVMeSlotsPerChassis = val
-        return True
-
-    def v_DriveTypeSSD(self, val):
-        """store sizing data by name from a vTable"""
-        lowerval = val.lower()
-        self.sdi_DriveTypeSSD = (True if lowerval == 'ssd' else False)
-        return True
-
-    def v_MaxFillCapacityPercent(self, val):
-        """store sizing data by name from a vTable"""
-        self.sdi_MaxFillCapacityPercent = val
-        return True
-
-    def v_NVMeRatio(self, val):
-        """store sizing data by name from a vTable"""
-        self.sdi_NVMeRatio = val
-        return True
-
-    def v_ProtectionType(self, val):
-        """store sizing data by name from a vTable"""
-        self.sdi_ProtectionType = val
-        return True
-
-    def v_ECData(self, val):
-        """store sizing data by name from a vTable"""
-        self.sdi_ECData = val
-        return True
-
-    def v_ECParity(self, val):
-        """store sizing data by name from a vTable"""
-        self.sdi_ECParity = val
-        return True
-
-
     def validateSizingData(self):
         """check that the sizing data has all the values we expect"""
         if self.sizingData is None:
             print (f'Error: No yaml input: {self.options.argInput}', file=sys.stderr)
             return False
-        validated = True;
-        ## NOTE: The goal will be to make sure that each value has been input and is verified as appropriate data
-        ##       For now, this is only partially implemented.  Still need to check the values.
-        # Here's the list of input vars. Validation will require finding each and checking the value passed in
+        # Here's the list of input vars. Validation finds each and checks the value passed in
         # colocation: True
         # useCase: 'Mixed'
         # storageCapacity:  2000
@@ -357,31 +343,15 @@ class SizingData:
         # ecProfileData: 8
         # ecProfileParity: 3
         #
-        # This list is used to search for options - lowercase for flexibility
-        inputLowerCaseNames = ['colocation', 'usecase', 'storagecapacity', 'metadatacapacity', 'drivecapacity', 'drivesperchassis', 'populatedslotsperchassis', 'nvmeslotsperchassis', 'drivetype', 'maxfillcapacity', 'nvmeratio', 'protectiontype', 'ecprofiledata', 'ecprofileparity']
-        #
-        # This dict is used as a vTable, to map options by name to a class method
-        inputVTable = {'colocation': self.v_Colocation, 'usecase': self.v_ArchiveUseCase, 'storagecapacity': self.v_StorageCapacity, 'metadatacapacity': self.v_MetaDataCapacity, 'drivecapacity': self.v_DriveCapacity, 'drivesperchassis': self.v_DrivesPerChassis, 'populatedslotsperchassis': self.v_PopulatedSlotsPerChassis, 'nvmeslotsperchassis': self.v_NVMeSlotsPerChassis, 'drivetype': self.v_DriveTypeSSD, 'maxfillcapacity': self.v_MaxFillCapacityPercent, 'nvmeratio': self.v_NVMeRatio, 'protectiontype': self.v_ProtectionType, 'ecprofiledata': self.v_ECData, 'ecprofileparity': self.v_ECParity}
-        #
-        # Take each passed option, look it up in the tables above and call it's class method, if possible. Else, error
-        for key,value in self.sizingData.items():
-            if self.options.argVerbose:
+        # The types, ranges and required inputs are in sizingschema.INPUT_SCHEMA, compiled once at import
+        if self.options.argVerbose and isinstance(self.sizingData, dict):
+            for key,value in self.sizingData.items():
                 print (f'Validating input: {key}: {value}', file=sys.stdout)
-            # Check each option name exists as a key in the Dictionary
-            lowerName = key.lower()
-            if not lowerName in inputLowerCaseNames:
-                # if any of the values are not found, input is invalid
-                validated = False
-                print (f'Error: Input option not found: {key}: {value}', file=sys.stderr)
-            else:
-                # this key,value pair is found.  Now, need to store the value
-                # NOTE: use a dict to associate the lowercase name with vTable function
-                func = inputVTable[lowerName]
-                # call the vTable function, passing the value portion of the input
-                retval = (func(value) if func else False)
-                if not retval:
-                    # The value portion wasn't validated, so we need to report that
-                    validated = False
-                    print(f'Error: Input value not understood: {key}: {value}', file=sys.stderr)
-        return True
+        values, errors = validateRecord(self.sizingData)
+        # store what is valid, even when something else is not
+        for name, value in values.items():
+            setattr(self, name, value)
+        for error in errors:
+            print(formatError(error), file=sys.stderr)
+        return not errors
 
@@ -0,0 +1,269 @@
+# -*- coding: utf-8 -*-
+__author__      = "Brian Fromme"
+__copyright__   = "Copyright 2020, Gnu Public License - Version 2.0"
+__credits__     = ["Brian Fromme, Bryan Gartner, Darren Soothill"]
+__maintainer__  = "Brian Fromme"
+__status__      = "Prototype"
+"""
+@newfield description: Description
+"""
+__description__ = "Sonar design-space explorer - Pareto-optimal cluster configurations"
+
+import math
+import os.path
+import sys
+import yaml
+
+from sizingdata import SizingData
+from sizinginput import loadYAML
+from sizingreport import openReportWriter
+from sizingschema import COMPILED_SCHEMA, INVALID, formatError, inputError
+
+
+# The explore-able inputs, and the SizingData attribute each one sets
+EXPLORE_INPUTS = {
+    'drivecapacity': 'sdi_DriveCapacity',
+    'drivesperchassis': 'sdi_DrivesPerChassis',
+    'populatedslotsperchassis': 'sdi_PopulatedSlotsPerChassis',
+    'drivetype': 'sdi_DriveTypeSSD',
+    'nvmeratio': 'sdi_NVMeRatio',
+    'protectiontype': 'sdi_ProtectionType',
+    'ecprofiledata': 'sdi_ECData',
+    'ecprofileparity': 'sdi_ECParity',
+}
+
+
+def expandValues(name, spec, errors):
+    """turn a scalar, a list or a {min, max, step} range into a sorted list of distinct values, each checked
+       against the single-scenario input schema and converted as it would be stored; the problems go to errors"""
+    yamlName, attribute, check, expected = COMPILED_SCHEMA[name]
+    if isinstance(spec, dict):
+        low, high, step = spec.get('min'), spec.get('max'), spec.get('step', 1)
+        if (set(spec) - {'min', 'max', 'step'}
+                or not all(type(bound) in (int, float) and math.isfinite(bound) for bound in (low, high, step)) or step <= 0):
+            errors.append(f'Error: Range for {yamlName} needs numbers min, max and a positive step: {spec}')
+            return []
+        values = []
+        value = low
+        while value <= high:
+            values.append(value)
+            value += step
+    elif isinstance(spec, list):
+        values = spec
+    else:
+        values = [spec]
+    checked = []
+    for value in values:
+        stored = check(value)
+        if stored is INVALID:
+            errors.append(formatError(inputError('invalid', yamlName, value, expected)))
+        else:
+            checked.append(stored)
+    if not values:
+        errors.append(f'Error: No values to explore for {yamlName}: {spec}')
+    return sorted(set(checked))
+
+
+class SizingExplorer:
+    """search the design space around a base scenario for the Pareto frontier over
+       (fewest chassis, fewest drives, highest GB/s, lowest raw overhead)"""
+
+    def __init__(self, sizingData, values):
+        'sizingData holds the validated base scenario; values maps explored input names (lowercase) to checked value lists'
+        self.sizingData = sizingData
+        self.values = dict(values)
+        # anything not explored stays at the base scenario value
+        for lowerName, attr in EXPLORE_INPUTS.items():
+            if lowerName not in self.values:
+                self.values[lowerName] = [getattr(sizingData, attr)]
+        self.sdc_GridSize = math.prod(len(values) for values in self.values.values())
+        self.sdc_Evaluated = 0
+        self.frontier = []
+
+    @classmethod
+    def fromSpec(cls, sizingData, spec):
+        """build an explorer from a parsed --explore spec (input name -> value, list or range);
+           returns (explorer, [error message, ...]) - the explorer is None when there are errors"""
+        errors = []
+        values = {}
+        for key, value in spec.items():
+            lowerName = (key.lower() if type(key) is str else None)
+            if lowerName not in EXPLORE_INPUTS:
+                errors.append(f'Error: Input cannot be explored: {key}')
+                continue
+            values[lowerName] = expandValues(lowerName, value, errors)
+        if errors:
+            return None, errors
+        return cls(sizingData, values), []
+
+    def profiles(self):
+        """every protection scheme to explore: (protectionType, EC data, EC parity, raw overhead)"""
+        for protectionType in self.values['protectiontype']:
+            if protectionType == 1:
+                for ecData in self.values['ecprofiledata']:
+                    for ecParity in self.values['ecprofileparity']:
+                        yield (1, ecData, ecParity, (ecData + ecParity) / ecData)
+            else:
+                yield (protectionType, None, None, protectionType)
+
+    def feasibleSlots(self, drivesNeeded, ecWidth):
+        """pick the populated slots count giving the fewest chassis that still pass the EC and co-location checks.
+           Returns (slots, drivesPerChassis, nvmeRatio, chassis), or None when no choice is feasible"""
+        base = self.sizingData
+        # More populated slots never means more chassis, so the first feasible choice from the top is the best one
+        for slots in reversed(self.values['populatedslotsperchassis']):
+            chassis = math.ceil(drivesNeeded / slots)
+            if ecWidth is not None and not ecWidth < chassis:
+                # Number of nodes too low for EC profile - fewer slots spreads the drives wider
+                continue
+            if base.sdi_Colo and chassis > SizingData.SDCONST_COLOMAXNODES:
+                # too many chassis for co-location, and fewer slots only adds chassis
+                return None
+            # populated slots must fit the chassis; the smallest such chassis needs the least memory and CPU
+            drivesPerChassis = next((dpc for dpc in self.values['drivesperchassis'] if dpc >= slots), None)
+            if drivesPerChassis is None:
+                continue
+            # the smallest ratio whose NVMe devices fit the NVMe slots puts the fewest OSDs on each device
+            nvmeRatio = next((ratio for ratio in self.values['nvmeratio']
+                              if math.ceil(drivesPerChassis / ratio) <= base.sdi_NVMeSlotsPerChassis), None)
+            if nvmeRatio is None:
+                continue
+            return (slots, drivesPerChassis, nvmeRatio, chassis)
+        return None
+
+    def explore(self):
+        """build the Pareto frontier; infeasible and dominated branches are cut before they are sized"""
+        base = self.sizingData
+        rawCapacity = base.sdi_StorageCapacity / (base.sdi_MaxFillCapacityPercent*100)
+        # The drive type only changes GB/s, so the faster type dominates: no need to size the other
+        driveTypeSSD = max(self.values['drivetype'])
+        candidates = []
+        for protectionType, ecData, ecParity, overhead in self.profiles():
+            ecWidth = (ecData + ecParity if protectionType == 1 else None)
+            # same expressions as calculateResults, so the pruning agrees with the sized result
+            totalCapacity = ((rawCapacity / ecData) * (ecData + ecParity) if protectionType == 1 else rawCapacity * protectionType)
+            for driveCapacity in self.values['drivecapacity']:
+                drivesNeeded = math.ceil(totalCapacity / driveCapacity)
+                if ecWidth is not None and not ecWidth < math.ceil(drivesNeeded / self.values['populatedslotsperchassis'][0]):
+                    # even the fewest slots cannot spread the drives wide enough - and bigger drives only need fewer
+                    break
+                choice = self.feasibleSlots(drivesNeeded, ecWidth)
+                if choice is None:
+                    continue
+                slots, drivesPerChassis, nvmeRatio, chassis = choice
+                candidates.append({'protectionType': protectionType, 'ecProfileData': ecData, 'ecProfileParity': ecParity,
+                                   'driveCapacity': driveCapacity, 'populatedSlotsPerChassis': slots,
+                                   'drivesPerChassis': drivesPerChassis, 'driveTypeSSD': driveTypeSSD, 'nvmeRatio': nvmeRatio,
+                                   'overhead': overhead})
+        self.frontier = self.paretoFrontier([self.sizeCandidate(candidate) for candidate in candidates])
+        return self.frontier
+
+    def sizeCandidate(self, candidate):
+        """run the real calculateResults for one surviving candidate"""
+        sizingData = self.sizingData
+        sizingData.sdi_ProtectionType = candidate['protectionType']
+        if candidate['protectionType'] == 1:
+            sizingData.sdi_ECData = candidate['ecProfileData']
+            sizingData.sdi_ECParity = candidate['ecProfileParity']
+        sizingData.sdi_DriveCapacity = candidate['driveCapacity']
+        sizingData.sdi_PopulatedSlotsPerChassis = candidate['populatedSlotsPerChassis']
+        sizingData.sdi_DrivesPerChassis = candidate['drivesPerChassis']
+        sizingData.sdi_DriveTypeSSD = candidate['driveTypeSSD']
+        sizingData.sdi_NVMeRatio = candidate['nvmeRatio']
+        sizingData.calculateResults()
+        self.sdc_Evaluated += 1
+        candidate['results'] = sizingData.getResults()
+        candidate['objectives'] = (sizingData.sdr_BOM_NumberOfChassis, sizingData.sdr_DrivesNeeded,
+                                   -sizingData.sdr_ExpectedPerfGBs, candidate['overhead'])
+        return candidate
+
+    @staticmethod
+    def paretoFrontier(candidates):
+        """keep the candidates no other candidate beats on every objective (all objectives minimized)"""
+        frontier = []
+        # after sorting, a candidate can only be dominated by one that came before it
+        for candidate in sorted(candidates, key=lambda c: c['objectives']):
+            objectives = candidate['objectives']
+            if not any(all(f <= o for f, o in zip(kept['objectives'], objectives)) for kept in frontier):
+                frontier.append(candidate)
+        return frontier
+
+    @staticmethod
+    def protection(candidate):
+        return (f'EC {candidate["ecProfileData"]}+{candidate["ecProfileParity"]}' if candidate['protectionType'] == 1
+                else f'{candidate["protectionType"]}x replica')
+
+    def getResults(self):
+        """the Pareto frontier, one configuration per row"""
+        return {'evaluated': self.sdc_Evaluated, 'gridSize': self.sdc_GridSize,
+                'frontier': [{'protection': self.protection(candidate),
+                              'chassis': candidate['results']['sdr_BOM_NumberOfChassis'],
+                              'drives': candidate['results']['sdr_DrivesNeeded'],
+                              'expectedPerfGBs': candidate['results']['sdr_ExpectedPerfGBs'],
+                              'rawOverhead': candidate['overhead'],
+                              'driveCapacity': candidate['driveCapacity'],
+                              'driveType': ('SSD' if candidate['driveTypeSSD'] else 'HDD'),
+                              'populatedSlotsPerChassis': candidate['populatedSlotsPerChassis'],
+                              'drivesPerChassis': candidate['drivesPerChassis'],
+                              'nvmeRatio': candidate['nvmeRatio'],
+                              'memoryPerChassis': candidate['results']['sdr_BOM_MemoryPerChassis'],
+                              'cpuPerChassis': candidate['results']['sdr_BOM_CPUPerChassis']}
+                             for candidate in self.frontier]}
+
+    def reportLines(self):
+        """the text report: one configuration per line"""
+        lines = [f'Design-Space Exploration: sized {self.sdc_Evaluated} of {self.sdc_GridSize} grid points',
+                 f'Pareto-Optimal Configurations = {len(self.frontier)}']
+        for candidate in self.frontier:
+            results = candidate['results']
+            lines.append(f'{self.protection(candidate)}: '
+                         f'Chassis = {results["sdr_BOM_NumberOfChassis"]}, Drives = {results["sdr_DrivesNeeded"]}, '
+                         f'Expected Performance (GB/s) = {results["sdr_ExpectedPerfGBs"]}, Raw Overhead = {candidate["overhead"]:.3f} | '
+                         f'Drive Size = {candidate["driveCapacity"]} {"SSD" if candidate["driveTypeSSD"] else "HDD"}, '
+                         f'Populated Slots = {candidate["populatedSlotsPerChassis"]}, Drives Per Chassis = {candidate["drivesPerChassis"]}, '
+                         f'NVMe Ratio = {candidate["nvmeRatio"]}, Memory Per Chassis = {results["sdr_BOM_MemoryPerChassis"]}, '
+                         f'CPU Per Chassis = {results["sdr_BOM_CPUPerChassis"]}')
+        return lines
+
+    def reportFrontier(self, options):
+        """write the Pareto frontier, in --format, to --output"""
+        writer = openReportWriter(options)
+        writer.writeReport('explore', self.getResults(), self.reportLines())
+        writer.close()
+
+
+def readExploreSpec(path):
+    """read the yaml explore spec: input name -> value, list or {min, max, step}"""
+    if not os.path.isfile(path):
+        print (f'Error: Cannot find explore input: {path}', file=sys.stderr)
+        return None
+    with open(path, 'r') as f:
+        try:
+            spec = loadYAML(f)
+        except yaml.YAMLError as e:
+            print (f'Error: Cannot parse explore input: {e}', file=sys.stderr)
+            return None
+    if not isinstance(spec, dict):
+        print (f'Error: Explore input is not a set of inputs: {path}', file=sys.stderr)
+        return None
+    return spec
+
+
+def exploreDesignSpace(options):
+    """size the base scenario from --input across the --explore spec and report the Pareto frontier"""
+    sizingData = SizingData(options)
+    if not sizingData.readYAMLInput():
+        return False
+    if not sizingData.validateSizingData():
+        return False
+    spec = readExploreSpec(options.argExplore)
+    if spec is None:
+        return False
+    explorer, errors = SizingExplorer.fromSpec(sizingData, spec)
+    for error in errors:
+        print (error, file=sys.stderr)
+    if errors:
+        return False
+    explorer.explore()
+    explorer.reportFrontier(options)
+    return True
@@ -0,0 +1,177 @@
+# -*- coding: utf-8 -*-
+__author__      = "Brian Fromme"
+__copyright__   = "Copyright 2020, Gnu Public License - Version 2.0"
+__credits__     = ["Brian Fromme, Bryan Gartner, Darren Soothill"]
+__maintainer__  = "Brian Fromme"
+__status__      = "Prototype"
+"""
+@newfield description: Description
+"""
+__description__ = "Sonar failure simulator - Monte Carlo drive and chassis failures, rebuild windows and tolerance"
+
+import sys
+
+import numpy as np
+
+from sizingdata import SizingData
+
+## NOTE: (fictitious) planning rates - annual failure rates, and the share of a surviving drive's throughput
+##       recovery may take before client I/O suffers
+FAILURE_DRIVE_AFR = {False: 0.02, True: 0.01}   # by sdi_DriveTypeSSD
+FAILURE_NODE_AFR = 0.05
+FAILURE_RECOVERY_SHARE = 0.25
+FAILURE_HOURS_PER_YEAR = 8760
+# Trials per batch: the unit of work handed to a process, and what bounds the memory of one step
+FAILURE_BATCH = 10000
+FAILURE_SEED = 2020
+
+
+class FailureModel:
+    """a sized cluster, as far as failures go: where its drives are, how long each kind of failure takes to
+       rebuild on the bandwidth the survivors share, and how many concurrent failure domains it tolerates.
+       The model does not place data: more than tolerance chassis degraded at once counts as exceeding the
+       tolerance whether or not any placement group spans them, so its probability is an upper bound"""
+
+    def __init__(self, hostOSDs, driveCapacity, fillPercent, driveThroughput, tolerance, ioAmplification, driveSSD):
+        'hostOSDs: drives per chassis; driveCapacity in TB; driveThroughput in MB/s per drive'
+        self.hostOSDs = np.asarray(hostOSDs, dtype=np.int64)
+        self.drives = int(self.hostOSDs.sum())
+        self.hosts = len(self.hostOSDs)
+        self.tolerance = tolerance
+        # a failed drive is assumed as full as the cluster may get: the worst case window
+        dataMB = driveCapacity * (fillPercent / 100) * 1e6
+        recoveryMBs = driveThroughput * FAILURE_RECOVERY_SHARE
+        # every byte rebuilt costs ioAmplification bytes of I/O, spread over the drives left
+        self.driveHours = dataMB * ioAmplification / ((self.drives - 1) * recoveryMBs) / 3600
+        survivors = np.maximum(self.drives - self.hostOSDs, 1)
+        self.nodeHours = self.hostOSDs * dataMB * ioAmplification / (survivors * recoveryMBs) / 3600
+        self.driveRate = self.drives * FAILURE_DRIVE_AFR[driveSSD] / FAILURE_HOURS_PER_YEAR
+        self.nodeRate = self.hosts * FAILURE_NODE_AFR / FAILURE_HOURS_PER_YEAR
+        self.hostShare = self.hostOSDs / self.drives
+
+    @classmethod
+    def fromSizingData(cls, sizingData):
+        """the model of a sized scenario (after calculateResults)"""
+        chassis = sizingData.sdr_ChassisNeeded
+        drives = sizingData.sdr_DrivesNeeded
+        if chassis < 1 or drives < 2:
+            raise ValueError('Failure simulation needs a sized cluster of at least two drives: the scenario has computational errors')
+        # the same drives-to-chassis layout the placement simulation uses
+        hostOSDs = [drives // chassis + (1 if host < drives % chassis else 0) for host in range(chassis)]
+        # per-drive throughput, as the expected performance was worked out
+        driveThroughput = sizingData.sdr_ExpectedPerfGBs * SizingData.SDCONST_GBS / drives
+        if sizingData.sdi_ProtectionType == 1:
+            # EC: each lost shard is rebuilt from k others, then written once
+            tolerance, ioAmplification = sizingData.sdi_ECParity, sizingData.sdi_ECData + 1
+        else:
+            tolerance, ioAmplification = sizingData.sdi_ProtectionType - 1, 2
+        return cls(hostOSDs, sizingData.sdi_DriveCapacity, sizingData.sdi_MaxFillCapacityPercent, driveThroughput,
+                   tolerance, ioAmplification, sizingData.sdi_DriveTypeSSD)
+
+    def simulateBatch(self, trials, hours, seed):
+        """trials independent runs of hours each, one array row per trial and one column per failure.
+           Returns (trials that exceeded the tolerance, drive rebuild hours, chassis rebuild hours, failures).
+           A trial exceeds the tolerance when more than tolerance chassis are degraded at once, anywhere"""
+        rng = np.random.default_rng(seed)
+        counts = rng.poisson((self.driveRate + self.nodeRate) * hours, trials)
+        slots = int(counts.max(initial=0))
+        rows = np.arange(trials)
+        # failure times, in order; the slots past a trial's failure count never happen
+        times = rng.uniform(0, hours, (trials, slots))
+        times[np.arange(slots)[None, :] >= counts[:, None]] = np.inf
+        times.sort(axis=1)
+        isNode = rng.random((trials, slots)) < self.nodeRate / (self.driveRate + self.nodeRate)
+        # a drive failure lands on a chassis in proportion to its drives; a chassis failure on any chassis
+        hosts = np.where(isNode, rng.integers(0, self.hosts, (trials, slots)),
+                         rng.choice(self.hosts, (trials, slots), p=self.hostShare))
+        ends = np.full((trials, slots), -np.inf)
+        degradedUntil = np.zeros((trials, self.hosts))
+        durations = np.full((trials, slots), np.nan)
+        exceeded = np.zeros(trials, dtype=bool)
+        # one step per failure slot, every trial at once
+        for slot in range(slots):
+            time = times[:, slot]
+            happens = np.isfinite(time)
+            host = hosts[:, slot]
+            # rebuilds still running share the recovery bandwidth with this one
+            running = (ends[:, :slot] > time[:, None]).sum(axis=1)
+            duration = np.where(isNode[:, slot], self.nodeHours[host], self.driveHours) * (1 + running)
+            # failure domains degraded at once: those still rebuilding, plus this one if it was not already
+            hostUntil = degradedUntil[rows, host]
+            degraded = (degradedUntil > time[:, None]).sum(axis=1) + (hostUntil <= time)
+            exceeded |= happens & (degraded > self.tolerance)
+            end = time + duration
+            ends[:, slot] = np.where(happens, end, -np.inf)
+            degradedUntil[rows, host] = np.where(happens, np.maximum(hostUntil, end), hostUntil)
+            durations[:, slot] = np.where(happens, duration, np.nan)
+        happened = np.isfinite(times)
+        return (int(exceeded.sum()), durations[happened & ~isNode], durations[happened & isNode], int(counts.sum()))
+
+    def simulate(self, trials, years=1.0, jobs=1, seed=FAILURE_SEED):
+        """trials runs of years each, in FAILURE_BATCH batches (on jobs processes).
+           Each batch has its own seed, so the result does not depend on jobs"""
+        hours = years * FAILURE_HOURS_PER_YEAR
+        sizes = [min(FAILURE_BATCH, trials - start) for start in range(0, trials, FAILURE_BATCH)]
+        seeds = [np.random.SeedSequence([seed, batch]) for batch in range(len(sizes))]
+        if jobs > 1 and len(sizes) > 1:
+            import concurrent.futures
+            with concurrent.futures.ProcessPoolExecutor(max_workers=jobs) as pool:
+                batches = list(pool.map(self.simulateBatch, sizes, [hours] * len(sizes), seeds))
+        else:
+            batches = [self.simulateBatch(size, hours, batchSeed) for size, batchSeed in zip(sizes, seeds)]
+        return (sum(batch[0] for batch in batches), np.concatenate([batch[1] for batch in batches]),
+                np.concatenate([batch[2] for batch in batches]), sum(batch[3] for batch in batches))
+
+
+class FailureReport:
+    """a failure simulation of a sized scenario"""
+
+    def __init__(self, sizingData, trials, years=1.0, jobs=1):
+        self.model = FailureModel.fromSizingData(sizingData)
+        self.trials = trials
+        self.years = years
+        exceeded, self.driveHours, self.nodeHours, self.failures = self.model.simulate(trials, years, jobs)
+        # an upper bound: see FailureModel
+        self.sdr_ExceedProbability = exceeded / trials
+
+    @staticmethod
+    def percentiles(hours, percentiles=(50, 90, 99, 100)):
+        if not len(hours):
+            return {}
+        return dict(zip(percentiles, np.percentile(hours, percentiles)))
+
+    def getResults(self):
+        return {'trials': self.trials, 'years': self.years, 'failures': self.failures, 'tolerance': self.model.tolerance,
+                'exceedProbabilityUpperBound': self.sdr_ExceedProbability,
+                'driveRebuildHours': {str(p): float(h) for p, h in self.percentiles(self.driveHours).items()},
+                'chassisRebuildHours': {str(p): float(h) for p, h in self.percentiles(self.nodeHours).items()}}
+
+    def reportLines(self):
+        """the text report"""
+        model = self.model
+        lines = [f'Failure Simulation: {self.trials:,} trials of {self.years:g} year(s), {model.drives} drives on {model.hosts} chassis, '
+                 f'{model.tolerance} concurrent failure domain(s) tolerated',
+                 f'Failures per Trial = {self.failures / self.trials:.3f}']
+        for name, hours in (('Drive', self.driveHours), ('Chassis', self.nodeHours)):
+            values = self.percentiles(hours)
+            if values:
+                lines.append(f'{name} Rebuild Time (hours): p50 = {values[50]:.2f}, p90 = {values[90]:.2f}, '
+                             f'p99 = {values[99]:.2f}, max = {values[100]:.2f} ({len(hours):,} rebuilds)')
+        lines.append(f'Probability of Exceeding the Failure Tolerance, Upper Bound (any {model.tolerance + 1} chassis degraded at once) '
+                     f'= {self.sdr_ExceedProbability:.6f}')
+        return lines
+
+    def writeReport(self, writer):
+        """write the report through a report writer, after the scenario it simulates"""
+        writer.writeReport('failure', self.getResults(), self.reportLines())
+
+
+def simulateFailures(sizingData, options, writer):
+    """run the --failure-trials simulation for a sized scenario and write it with the scenario's report; False when it cannot run"""
+    try:
+        report = FailureReport(sizingData, options.argFailureTrials, options.argFailureYears, options.argSimulationJobs)
+    except ValueError as e:
+        print (f'Error: {e}', file=sys.stderr)
+        return False
+    report.writeReport(writer)
+    return True
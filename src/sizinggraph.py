@@ -0,0 +1,160 @@
+# -*- coding: utf-8 -*-
+__author__      = "Brian Fromme"
+__copyright__   = "Copyright 2020, Gnu Public License - Version 2.0"
+__credits__     = ["Brian Fromme, Bryan Gartner, Darren Soothill"]
+__maintainer__  = "Brian Fromme"
+__status__      = "Prototype"
+"""
+@newfield description: Description
+"""
+__description__ = "Sonar incremental sizing - calculateResults as a dependency graph"
+
+import math
+
+from sizingdata import SizingData
+
+C = SizingData   # the SDCONST_ constants
+
+# The calculation, node by node: (name, the nodes it depends on, how to compute it from the node values v).
+# Each expression is the one in SizingData.calculateResults, so the results match exactly.
+# Nodes are listed in dependency order: every node comes after everything it depends on.
+SIZING_NODES = [
+    ('sdc_ECProfile', ['sdi_ECData', 'sdi_ECParity'],
+        lambda v: v['sdi_ECData'] + v['sdi_ECParity']),
+    ('sdr_RawCapacity', ['sdi_StorageCapacity', 'sdi_MaxFillCapacityPercent'],
+        lambda v: v['sdi_StorageCapacity'] / (v['sdi_MaxFillCapacityPercent']*100)),
+    ('sdr_TotalCapacity', ['sdr_RawCapacity', 'sdi_ProtectionType', 'sdi_ECData', 'sdi_ECParity'],
+        lambda v: ((v['sdr_RawCapacity'] / v['sdi_ECData']) * (v['sdi_ECData'] + v['sdi_ECParity']) if v['sdi_ProtectionType'] == 1
+                   else v['sdr_RawCapacity'] * v['sdi_ProtectionType'])),
+    ('sdr_DrivesNeeded', ['sdr_TotalCapacity', 'sdi_DriveCapacity'],
+        lambda v: math.ceil(v['sdr_TotalCapacity'] / v['sdi_DriveCapacity'])),
+    ('sdc_ChassisEstimate', ['sdr_DrivesNeeded', 'sdi_PopulatedSlotsPerChassis'],
+        lambda v: math.ceil(v['sdr_DrivesNeeded'] / v['sdi_PopulatedSlotsPerChassis'])),
+    # error: Number of nodes too low for EC profile
+    ('sdc_ECError', ['sdi_ProtectionType', 'sdc_ECProfile', 'sdc_ChassisEstimate'],
+        lambda v: v['sdi_ProtectionType'] == 1 and not v['sdc_ECProfile'] < v['sdc_ChassisEstimate']),
+    ('sdr_ChassisNeeded', ['sdc_ChassisEstimate', 'sdc_ECError'],
+        lambda v: (0 if v['sdc_ECError'] else v['sdc_ChassisEstimate'])),
+    ('sdr_ColoMemoryNeeded', ['sdi_Colo'],
+        lambda v: (C.SDCONST_COLOMEMORY if v['sdi_Colo'] else 0)),
+    ('sdr_MinimumMemoryNeeded', ['sdi_DrivesPerChassis', 'sdr_ColoMemoryNeeded'],
+        lambda v: v['sdi_DrivesPerChassis'] * C.SDCONST_MEM2DRIVES + C.SDCONST_MEMEXTRA + v['sdr_ColoMemoryNeeded']),
+    ('sdr_ColoCPUNeeded', ['sdi_Colo'],
+        lambda v: (C.SDCONST_COLOCPUS if v['sdi_Colo'] else 0)),
+    ('sdr_ColoThreadsNeeded', ['sdi_DrivesPerChassis', 'sdi_DriveTypeSSD'],
+        lambda v: (v['sdi_DrivesPerChassis'] * C.SDCONST_SSD2THREAD if v['sdi_DriveTypeSSD'] else v['sdi_DrivesPerChassis'])),
+    ('sdr_SuggestedCPU', ['sdr_ColoCPUNeeded', 'sdr_ColoThreadsNeeded'],
+        lambda v: v['sdc_Catalog'].model('sdr_SuggestedCPU', v['sdc_Catalog'].pickCPU(v['sdr_ColoCPUNeeded'] + v['sdr_ColoThreadsNeeded']))),
+    ('sdr_NVMeNeeded', ['sdi_DrivesPerChassis', 'sdi_NVMeRatio'],
+        lambda v: math.ceil(v['sdi_DrivesPerChassis'] / v['sdi_NVMeRatio'])),
+    ('sdr_MinimumNVMeSize', ['sdi_DrivesPerChassis', 'sdr_NVMeNeeded'],
+        lambda v: math.ceil((v['sdi_DrivesPerChassis'] * C.SDCONST_NVMEFACTOR) / v['sdr_NVMeNeeded'])),
+    ('sdc_DriveCode', ['sdi_DriveTypeSSD', 'sdi_DriveCapacity'],
+        lambda v: v['sdc_Catalog'].pickDrive(v['sdi_DriveTypeSSD'], v['sdi_DriveCapacity'])),
+    ('sdr_ExpectedPerfGBs', ['sdr_DrivesNeeded', 'sdi_DriveTypeSSD', 'sdc_DriveCode'],
+        lambda v: (v['sdr_DrivesNeeded'] * (v['sdc_Catalog'].driveThroughput[v['sdc_DriveCode']] if v['sdc_DriveCode'] else
+                                            (C.SDCONST_SSDFACTOR if v['sdi_DriveTypeSSD'] else C.SDCONST_HDDFACTOR))) / C.SDCONST_GBS),
+    ('sdr_NetworkCards', [], lambda v: 'Not Implemented'),
+    ### BOM
+    # Error - too many chassis for co-location
+    ('sdc_ColoError', ['sdi_Colo', 'sdr_ChassisNeeded'],
+        lambda v: bool(v['sdi_Colo'] and v['sdr_ChassisNeeded'] > C.SDCONST_COLOMAXNODES)),
+    ('sdr_BOM_NumberOfChassis', ['sdc_ColoError', 'sdr_ChassisNeeded'],
+        lambda v: (0 if v['sdc_ColoError'] else v['sdr_ChassisNeeded'])),
+    ('sdr_BOM_ChassisModel', ['sdi_DrivesPerChassis', 'sdr_NVMeNeeded'],
+        lambda v: v['sdc_Catalog'].model('sdr_BOM_ChassisModel', v['sdc_Catalog'].pickChassis(v['sdi_DrivesPerChassis'], v['sdr_NVMeNeeded']))),
+    ('sdr_BOM_DrivesPerChassis', ['sdi_DrivesPerChassis'], lambda v: v['sdi_DrivesPerChassis']),
+    ('sdr_BOM_DriveSize', ['sdi_DriveCapacity'], lambda v: v['sdi_DriveCapacity']),
+    ('sdr_BOM_DriveModel', ['sdc_DriveCode'], lambda v: v['sdc_Catalog'].model('sdr_BOM_DriveModel', v['sdc_DriveCode'])),
+    ('sdr_BOM_MemoryPerChassis', ['sdr_MinimumMemoryNeeded'], lambda v: v['sdr_MinimumMemoryNeeded']),
+    ('sdr_BOM_CPUPerChassis', ['sdr_SuggestedCPU'], lambda v: v['sdr_SuggestedCPU']),
+    ('sdr_BOM_NVMe', ['sdr_NVMeNeeded'], lambda v: v['sdr_NVMeNeeded']),
+    ('sdr_BOM_NVMeSize', ['sdr_MinimumNVMeSize'], lambda v: v['sdr_MinimumNVMeSize']),
+    ('sdr_BOM_NVMeModel', ['sdr_MinimumNVMeSize'],
+        lambda v: v['sdc_Catalog'].model('sdr_BOM_NVMeModel', v['sdc_Catalog'].pickNVMe(v['sdr_MinimumNVMeSize']))),
+    ('sdr_BOM_OSDisk', [], lambda v: 'Not Implemented'),
+    ('sdr_BOM_MetaDataNVMes', [], lambda v: 'Not Implemented'),
+]
+
+
+def sameValue(a, b):
+    """16 and 16.0 compare equal, but are reported differently - so they count as a change"""
+    return type(a) is type(b) and a == b
+
+
+class SizingGraph:
+    """calculateResults as an explicit graph of inputs and derived values:
+       changing an input recomputes only the nodes downstream of it, and reports what changed"""
+
+    def __init__(self, sizingData):
+        'start from the (validated) inputs of a SizingData, and compute everything once'
+        self.sizingData = sizingData
+        self.dependents = {name: [] for name in SizingData.SDINPUTS}
+        for name, deps, func in SIZING_NODES:
+            self.dependents[name] = []
+            for dep in deps:
+                self.dependents[dep].append(name)
+        self.values = dict(zip(SizingData.SDINPUTS, sizingData.getInputs()))
+        # the hardware catalog is fixed for the life of the graph: a constant, not an input
+        self.values['sdc_Catalog'] = sizingData.getCatalog()
+        self.changedInputs = set()
+        self.sdc_Evaluated = 0
+        for name, deps, func in SIZING_NODES:
+            self.values[name] = func(self.values)
+
+    def setInput(self, name, value):
+        """change one sdi_ input; nothing is recomputed until recompute()"""
+        if name not in SizingData.SDINPUTS:
+            raise KeyError(f'Not a sizing input: {name}')
+        if not sameValue(self.values[name], value):
+            self.values[name] = value
+            self.changedInputs.add(name)
+
+    def loadInputs(self, sizingData):
+        """take every input of a SizingData - eg: after it validated a new record - marking only the ones that differ"""
+        for name, value in zip(SizingData.SDINPUTS, sizingData.getInputs()):
+            self.setInput(name, value)
+
+    def recompute(self):
+        """recompute the nodes downstream of the changed inputs; returns {name: (old, new)} of every changed node.
+           A node whose value comes out the same stops the change from spreading further"""
+        changes = {name: None for name in self.changedInputs}
+        # the dirty set grows only from nodes that really changed
+        dirty = set()
+        for name in self.changedInputs:
+            dirty.update(self.dependents[name])
+        self.changedInputs = set()
+        self.sdc_Evaluated = 0
+        for name, deps, func in SIZING_NODES:
+            if name not in dirty:
+                continue
+            old = self.values[name]
+            new = func(self.values)
+            self.sdc_Evaluated += 1
+            if not sameValue(old, new):
+                self.values[name] = new
+                changes[name] = (old, new)
+                dirty.update(self.dependents[name])
+        return {name: change for name, change in changes.items() if change is not None}
+
+    def sweep(self, name, values):
+        """one-axis-at-a-time sweep: yield (value, changes) as input name takes each value in turn"""
+        for value in values:
+            self.setInput(name, value)
+            yield value, self.recompute()
+
+    def getErrorMessages(self):
+        """the error messages calculateResults would have printed for the current values"""
+        messages = []
+        if self.values['sdc_ECError']:
+            messages.append("Number of nodes too low for EC profile")
+        if self.values['sdc_ColoError']:
+            messages.append(f'Number of nodes ({self.values["sdr_ChassisNeeded"]}) is too high for co-location')
+        return messages
+
+    def getResults(self):
+        """the current results, in the SizingData.getResults format"""
+        results = {name: self.values[name] for name in SizingData.SDRESULTS}
+        results['sdc_ComputationalErrors'] = self.values['sdc_ECError'] or self.values['sdc_ColoError']
+        results['sdc_ErrorMessages'] = self.getErrorMessages()
+        return results
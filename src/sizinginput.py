@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+__author__      = "Brian Fromme"
+__copyright__   = "Copyright 2020, Gnu Public License - Version 2.0"
+__credits__     = ["Brian Fromme, Bryan Gartner, Darren Soothill"]
+__maintainer__  = "Brian Fromme"
+__status__      = "Prototype"
+"""
+@newfield description: Description
+"""
+__description__ = "Sonar input loading - libyaml when available, a JSON fast path and a parsed-input cache"
+
+import json
+import os
+import sys
+import zlib
+
+## NOTE: yaml is imported only when something has to be parsed as yaml - a JSON input or a
+##       parsed-input cache hit never pays for it, and neither do --version and --help
+
+
+def yamlLoader():
+    """libyaml's CSafeLoader when pyyaml was built with it, else the pure-Python SafeLoader"""
+    import yaml
+    return getattr(yaml, 'CSafeLoader', yaml.SafeLoader)
+
+
+def loadYAML(stream):
+    """yaml.safe_load, through the fastest safe loader available"""
+    import yaml
+    return yaml.load(stream, Loader=yamlLoader())
+
+
+def loadAllYAML(stream):
+    """yaml.safe_load_all, through the fastest safe loader available - documents are still parsed lazily"""
+    import yaml
+    return yaml.load_all(stream, Loader=yamlLoader())
+
+
+def parseText(text):
+    """parse one input document; JSON (which is also yaml) takes the fast path, anything else is read as yaml.
+       Raises ValueError when it cannot be parsed"""
+    if text.lstrip().startswith('{'):
+        try:
+            return json.loads(text)
+        except json.JSONDecodeError:
+            # a yaml flow mapping ({colocation: true, ...}) is not JSON
+            pass
+    import yaml
+    try:
+        return loadYAML(text)
+    except yaml.YAMLError as e:
+        raise ValueError(str(e)) from e
+
+
+def cacheEntryPath(cacheDir, path):
+    """the cache file for an input file: named by a checksum of its absolute path.
+       The entry also holds the path, so two paths with the same checksum only ever miss"""
+    # zlib, not hashlib: importing hashlib would cost more than the whole cache hit
+    return os.path.join(cacheDir, f'{zlib.crc32(path.encode()):08x}.json')
+
+
+def readCachedInput(cacheDir, path, stat):
+    """the parsed input cached for path, if the file still has the same mtime and size; else None"""
+    try:
+        with open(cacheEntryPath(cacheDir, path), 'r') as f:
+            entry = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if entry.get('path') != path or entry.get('mtime') != stat.st_mtime_ns or entry.get('size') != stat.st_size:
+        return None
+    return entry
+
+
+def writeCachedInput(cacheDir, path, stat, data):
+    """cache the parsed input for path; inputs that JSON cannot hold (eg: yaml dates) are not cached"""
+    try:
+        text = json.dumps({'path': path, 'mtime': stat.st_mtime_ns, 'size': stat.st_size, 'data': data})
+    except (TypeError, ValueError):
+        return
+    entryPath = cacheEntryPath(cacheDir, path)
+    try:
+        os.makedirs(cacheDir, exist_ok=True)
+        # write then rename, so a concurrent run never reads half an entry
+        temporary = f'{entryPath}.{os.getpid()}'
+        with open(temporary, 'w') as f:
+            f.write(text)
+        os.replace(temporary, entryPath)
+    except OSError as e:
+        print (f'Warning: Cannot write input cache {entryPath}: {e}', file=sys.stderr)
+
+
+def readInputFile(path, cacheDir=None):
+    """read and parse one input file (yaml or JSON).
+       With a cacheDir, the parsed input is reused for as long as the file's path, mtime and size are unchanged.
+       Raises OSError when the file cannot be read and ValueError when it cannot be parsed"""
+    if cacheDir:
+        path = os.path.abspath(path)
+        stat = os.stat(path)
+        entry = readCachedInput(cacheDir, path, stat)
+        if entry is not None:
+            return entry['data']
+    with open(path, 'r') as f:
+        text = f.read()
+    data = parseText(text)
+    if cacheDir:
+        writeCachedInput(cacheDir, path, stat, data)
+    return data
@@ -0,0 +1,126 @@
+# -*- coding: utf-8 -*-
+__author__      = "Brian Fromme"
+__copyright__   = "Copyright 2020, Gnu Public License - Version 2.0"
+__credits__     = ["Brian Fromme, Bryan Gartner, Darren Soothill"]
+__maintainer__  = "Brian Fromme"
+__status__      = "Prototype"
+"""
+@newfield description: Description
+"""
+__description__ = "Sonar parallel sizing - a process pool of SizingData workers"
+
+import collections
+import concurrent.futures
+import itertools
+import sys
+
+from cmdline import Options
+from sizingcache import SizingCache
+from sizingcatalog import loadCatalog
+from sizingdata import SizingData
+from sizingreport import openReportWriter
+from sizingstats import STATS
+from sizingstream import openInput, readScenarios, sizeRecord, timedScenarios
+
+# The per-process SizingData and cache, set up once by initWorker
+workerSizingData = None
+workerCache = None
+workerCacheStats = collections.Counter()
+
+
+def initWorker(debug, verbose, cacheSize, cacheFile, catalog, profile):
+    """process pool initializer: each worker builds its own Options, SizingData and cache once"""
+    global workerSizingData, workerCache
+    options = Options()
+    options.argDebug = debug
+    options.argVerbose = verbose
+    options.argCacheSize = cacheSize
+    options.argCacheFile = cacheFile
+    options.argCatalog = catalog
+    options.exiting = True   # workers are torn down by the pool, that is expected
+    workerSizingData = SizingData(options)
+    workerCache = SizingCache.fromOptions(options)
+    if profile:
+        # a forked worker starts with a copy of the parent's timings - only report its own
+        STATS.drain()
+        STATS.enable()
+
+
+def sizeChunk(chunk):
+    """size a list of (index, record) in a worker.
+       Returns a list of results dicts (None where sizing failed), and the cache counters and stage timings added by this chunk"""
+    results = [(workerSizingData.getResults() if sizeRecord(workerSizingData, index, record, workerCache) else None)
+               for index, record in chunk]
+    statsDelta = collections.Counter()
+    if workerCache is not None:
+        # the pool gives no hook at worker exit, so commit the shared cache file per chunk
+        workerCache.flush()
+        stats = collections.Counter({name: value for name, value in workerCache.getStats().items() if name != 'entries'})
+        statsDelta = stats - workerCacheStats
+        workerCacheStats.update(statsDelta)
+    return results, statsDelta, STATS.drain()
+
+
+def emitChunk(writer, reporter, cacheStats, table, chunk, future):
+    """wait for one chunk and report its scenarios in input order; returns the number sized"""
+    sized = 0
+    chunkResults, statsDelta, stageStats = future.result()
+    cacheStats.update(statsDelta)
+    STATS.merge(stageStats)
+    for (index, record), results in zip(chunk, chunkResults):
+        if results is None:
+            continue
+        reporter.loadSizingRecord(record)
+        reporter.setResults(results)
+        with STATS.stage('reportSizingResults'):
+            writer.writeScenario(reporter, index)
+        if table is not None:
+            table.append(results)
+        sized += 1
+    return sized
+
+
+def sizePool(options):
+    """size a multi-scenario input on options.argJobs processes; output stays in input order"""
+    f = openInput(options)
+    if f is None:
+        return 0
+    reporter = SizingData(options)
+    writer = openReportWriter(options, batch=True)
+    scenarios = readScenarios(options, f)
+    if STATS.enabled:
+        scenarios = timedScenarios(scenarios)
+    scenarios = enumerate(scenarios, 1)
+    # chunks in submission order; the oldest is always reported first
+    pending = collections.deque()
+    cacheStats = collections.Counter()
+    table = None
+    if options.argSaveTable:
+        from sizingresults import SizingResultTableBuilder
+        table = SizingResultTableBuilder(categories=loadCatalog(options.argCatalog).categories)
+    sized = 0
+    try:
+        with concurrent.futures.ProcessPoolExecutor(max_workers=options.argJobs, initializer=initWorker,
+                                                    initargs=(options.argDebug, options.argVerbose,
+                                                              options.argCacheSize, options.argCacheFile, options.argCatalog,
+                                                              STATS.enabled)) as pool:
+            while True:
+                chunk = list(itertools.islice(scenarios, options.argChunkSize))
+                if not chunk:
+                    break
+                pending.append((chunk, pool.submit(sizeChunk, chunk)))
+                # back-pressure: no more input is read until the output has caught up
+                if len(pending) >= options.argMaxPending:
+                    sized += emitChunk(writer, reporter, cacheStats, table, *pending.popleft())
+            while pending:
+                sized += emitChunk(writer, reporter, cacheStats, table, *pending.popleft())
+    finally:
+        writer.close()
+        if f is not sys.stdin:
+            f.close()
+    STATS.setCacheStats(cacheStats)
+    if options.argVerbose and cacheStats:
+        print(f'Cache: ' + ', '.join(f'{name} = {value}' for name, value in sorted(cacheStats.items())), file=sys.stdout)
+    if table is not None:
+        table.toTable().save(options.argSaveTable)
+    return sized
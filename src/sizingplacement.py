@@ -0,0 +1,185 @@
+# -*- coding: utf-8 -*-
+__author__      = "Brian Fromme"
+__copyright__   = "Copyright 2020, Gnu Public License - Version 2.0"
+__credits__     = ["Brian Fromme, Bryan Gartner, Darren Soothill"]
+__maintainer__  = "Brian Fromme"
+__status__      = "Prototype"
+"""
+@newfield description: Description
+"""
+__description__ = "Sonar placement simulator - hash synthetic objects onto a sized cluster and measure the OSD fill imbalance"
+
+import math
+import sys
+
+import numpy as np
+
+# Placement groups per OSD that the PG count aims for (the usual Ceph target), rounded to a power of two
+PLACEMENT_PGS_PER_OSD = 100
+# Objects hashed per step: bounds the memory of a 10M object run to a few arrays of this size
+PLACEMENT_CHUNK = 1 << 20
+# Seeds that keep the object, host and OSD hashes independent of each other
+PLACEMENT_OBJECT_SALT = 0x243F6A8885A308D3
+PLACEMENT_HOST_SALT = 0x13198A2E03707344
+PLACEMENT_OSD_SALT = 0xA4093822299F31D0
+
+
+def splitmix64(values):
+    """the splitmix64 finalizer over a uint64 array: a fast, well-mixed hash (numpy's uint64 arithmetic wraps)"""
+    z = values + np.uint64(0x9E3779B97F4A7C15)
+    z = (z ^ (z >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    z = (z ^ (z >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return z ^ (z >> np.uint64(31))
+
+
+def hashPairs(a, b, salt):
+    """one hash per (a, b) pair of uint64 arrays (broadcast)"""
+    return splitmix64(splitmix64(a ^ np.uint64(salt)) ^ b)
+
+
+def straw2(hashes, weights):
+    """straw2 draws: ln(u) / weight for u in (0, 1] from the hash - the longest straw wins,
+       with odds proportional to weight, and a weight change only moves data to or from that item"""
+    u = ((hashes >> np.uint64(11)).astype(np.float64) + 1.0) * (1.0 / (1 << 53))
+    return np.log(u) / weights
+
+
+def placementGroupCount(osds, width):
+    """the power of two nearest PLACEMENT_PGS_PER_OSD PGs per OSD, each PG being on width OSDs"""
+    return 1 << max(0, round(math.log2(max(1.0, osds * PLACEMENT_PGS_PER_OSD / width))))
+
+
+def objectPGCounts(start, stop, pgCount):
+    """how many of the objects numbered start to stop-1 hash to each PG"""
+    counts = np.zeros(pgCount, dtype=np.int64)
+    for chunkStart in range(start, stop, PLACEMENT_CHUNK):
+        objects = np.arange(chunkStart, min(stop, chunkStart + PLACEMENT_CHUNK), dtype=np.uint64)
+        # pgCount is a power of two: the low bits of the hash pick the PG
+        pgs = splitmix64(objects ^ np.uint64(PLACEMENT_OBJECT_SALT)) & np.uint64(pgCount - 1)
+        counts += np.bincount(pgs.astype(np.intp), minlength=pgCount)
+    return counts
+
+
+class PlacementSimulator:
+    """a CRUSH-like placement of a sized cluster: objects hash to PGs, and each PG's width shards
+       go to distinct hosts (the failure domain), then to one OSD within each host - both by straw2"""
+
+    def __init__(self, hostOSDs, osdWeight, width, shardFraction):
+        'hostOSDs is the OSD count of each host, osdWeight an OSD size (TB), shardFraction the share of an object each shard holds'
+        if width > len(hostOSDs):
+            raise ValueError(f'{width} shards per placement group need at least {width} chassis, not {len(hostOSDs)}')
+        self.hostOSDs = np.asarray(hostOSDs, dtype=np.int64)
+        # OSDs are numbered host by host: host h owns firstOSD[h] to firstOSD[h] + hostOSDs[h] - 1
+        self.firstOSD = np.concatenate(([0], np.cumsum(self.hostOSDs)[:-1]))
+        self.osdCount = int(self.hostOSDs.sum())
+        self.osdWeights = np.full(self.osdCount, float(osdWeight))
+        self.width = width
+        self.shardFraction = shardFraction
+        self.pgCount = placementGroupCount(self.osdCount, width)
+        self.actingSets = None
+
+    def mapPlacementGroups(self):
+        """the width OSDs of every PG, as a (PGs x width) array"""
+        pgs = np.arange(self.pgCount, dtype=np.uint64)[:, None]
+        hostWeights = np.add.reduceat(self.osdWeights, self.firstOSD)
+        hostDraws = straw2(hashPairs(pgs, np.arange(len(self.hostOSDs), dtype=np.uint64)[None, :], PLACEMENT_HOST_SALT), hostWeights)
+        # the width longest straws: distinct hosts, as a rule that chooses by host needs
+        hosts = np.argpartition(-hostDraws, self.width - 1, axis=1)[:, :self.width]
+        actingSets = np.empty((self.pgCount, self.width), dtype=np.int64)
+        for host in range(len(self.hostOSDs)):
+            rows, shards = np.nonzero(hosts == host)
+            if not len(rows):
+                continue
+            first, count = self.firstOSD[host], self.hostOSDs[host]
+            osds = np.arange(first, first + count, dtype=np.uint64)[None, :]
+            draws = straw2(hashPairs(rows.astype(np.uint64)[:, None], osds, PLACEMENT_OSD_SALT), self.osdWeights[first:first + count])
+            actingSets[rows, shards] = first + np.argmax(draws, axis=1)
+        self.actingSets = actingSets
+        return actingSets
+
+    def objectCounts(self, objects, jobs=1):
+        """objects per PG, for objects synthetic objects - hashed on jobs processes when there are enough of them"""
+        if jobs <= 1 or objects < jobs * PLACEMENT_CHUNK:
+            return objectPGCounts(0, objects, self.pgCount)
+        import concurrent.futures
+        bounds = [objects * job // jobs for job in range(jobs + 1)]
+        with concurrent.futures.ProcessPoolExecutor(max_workers=jobs) as pool:
+            return sum(pool.map(objectPGCounts, bounds[:-1], bounds[1:], [self.pgCount] * jobs))
+
+    def simulate(self, objects, jobs=1):
+        """place objects equal-sized objects; returns each OSD's load relative to its fair share (1.0 is even)"""
+        if self.actingSets is None:
+            self.mapPlacementGroups()
+        pgObjects = self.objectCounts(objects, jobs)
+        # every shard of a PG holds shardFraction of each of its objects
+        osdLoad = np.bincount(self.actingSets.ravel(), weights=np.repeat(pgObjects * self.shardFraction, self.width),
+                              minlength=self.osdCount)
+        fairShare = osdLoad.sum() / self.osdWeights.sum()
+        return (osdLoad / self.osdWeights) / fairShare
+
+
+class PlacementReport:
+    """what a placement simulation means for a sized scenario"""
+
+    def __init__(self, sizingData, objects, jobs=1):
+        'sizingData has been sized (calculateResults); objects is how many synthetic objects to place'
+        chassis = sizingData.sdr_ChassisNeeded
+        drives = sizingData.sdr_DrivesNeeded
+        if chassis < 1 or drives < 1:
+            raise ValueError('Placement needs a sized cluster: the scenario has computational errors')
+        ecProfile = sizingData.sdi_ProtectionType == 1
+        width = (sizingData.sdi_ECData + sizingData.sdi_ECParity if ecProfile else sizingData.sdi_ProtectionType)
+        # the drives, dealt out to the chassis as evenly as they go
+        hostOSDs = [drives // chassis + (1 if host < drives % chassis else 0) for host in range(chassis)]
+        self.simulator = PlacementSimulator(hostOSDs, sizingData.sdi_DriveCapacity, width,
+                                            (1 / sizingData.sdi_ECData if ecProfile else 1))
+        self.objects = objects
+        self.sdi_MaxFillCapacityPercent = sizingData.sdi_MaxFillCapacityPercent
+        # what the cluster holds if every OSD fills evenly to maxFillCapacity (TB)
+        overhead = (width / sizingData.sdi_ECData if ecProfile else width)
+        self.sdr_EvenUsableCapacity = drives * sizingData.sdi_DriveCapacity * (sizingData.sdi_MaxFillCapacityPercent / 100) / overhead
+        self.relativeFill = self.simulator.simulate(objects, jobs)
+        # the fullest OSD reaches the fill limit first: the rest of the cluster is that much short of it
+        self.sdr_Imbalance = float(self.relativeFill.max())
+        self.sdr_EffectiveUsableCapacity = self.sdr_EvenUsableCapacity / self.sdr_Imbalance
+        self.sdr_EffectiveFillPercent = self.sdi_MaxFillCapacityPercent / self.sdr_Imbalance
+
+    def osdFillPercentiles(self, percentiles=(0, 50, 99, 100)):
+        """OSD fill (%) when the cluster as a whole is at maxFillCapacity"""
+        return dict(zip(percentiles, np.percentile(self.relativeFill * self.sdi_MaxFillCapacityPercent, percentiles)))
+
+    def getResults(self):
+        simulator = self.simulator
+        return {'objects': self.objects, 'placementGroups': simulator.pgCount, 'osds': simulator.osdCount,
+                'hosts': len(simulator.hostOSDs), 'width': simulator.width, 'imbalance': self.sdr_Imbalance,
+                'osdFillPercentiles': {str(p): float(fill) for p, fill in self.osdFillPercentiles().items()},
+                'evenUsableCapacity': self.sdr_EvenUsableCapacity, 'effectiveUsableCapacity': self.sdr_EffectiveUsableCapacity,
+                'effectiveFillPercent': self.sdr_EffectiveFillPercent}
+
+    def reportLines(self):
+        """the text report"""
+        simulator = self.simulator
+        fills = self.osdFillPercentiles()
+        return [f'Placement Simulation: {self.objects:,} objects, {simulator.pgCount} placement groups, '
+                f'{simulator.osdCount} OSDs on {len(simulator.hostOSDs)} chassis, {simulator.width} shards per group',
+                f'OSD Fill at {self.sdi_MaxFillCapacityPercent}% Average (%): min = {fills[0]:.2f}, p50 = {fills[50]:.2f}, '
+                f'p99 = {fills[99]:.2f}, max = {fills[100]:.2f}',
+                f'Fullest OSD / Average = {self.sdr_Imbalance:.4f}',
+                f'Usable Capacity, Even Spread (TB) = {self.sdr_EvenUsableCapacity:.2f}',
+                f'Usable Capacity Before the Fullest OSD Reaches {self.sdi_MaxFillCapacityPercent}% (TB) = {self.sdr_EffectiveUsableCapacity:.2f}',
+                f'Effective Max Fill Capacity (%) = {self.sdr_EffectiveFillPercent:.2f}']
+
+    def writeReport(self, writer):
+        """write the report through a report writer, after the scenario it simulates"""
+        writer.writeReport('placement', self.getResults(), self.reportLines())
+
+
+def simulatePlacement(sizingData, options, writer):
+    """run the --placement simulation for a sized scenario and write it with the scenario's report; False when it cannot run"""
+    try:
+        report = PlacementReport(sizingData, options.argPlacement, options.argSimulationJobs)
+    except ValueError as e:
+        print (f'Error: {e}', file=sys.stderr)
+        return False
+    report.writeReport(writer)
+    return True
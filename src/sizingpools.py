@@ -0,0 +1,258 @@
+# -*- coding: utf-8 -*-
+__author__      = "Brian Fromme"
+__copyright__   = "Copyright 2020, Gnu Public License - Version 2.0"
+__credits__     = ["Brian Fromme, Bryan Gartner, Darren Soothill"]
+__maintainer__  = "Brian Fromme"
+__status__      = "Prototype"
+"""
+@newfield description: Description
+"""
+__description__ = "Sonar multi-pool sizing - many pools packed onto one shared set of chassis"
+
+import heapq
+import math
+import sys
+
+from sizingdata import SizingData
+from sizingreport import openReportWriter
+from sizingschema import COMPILED_SCHEMA, INVALID, formatError, inputError
+
+## A multi-pool input (--pools) is:
+##   chassis:
+##     colocation: False
+##     maxFillCapacity: 80
+##     media:                                   # the drive slots of one chassis, by media type
+##       hdd:  {slots: 24, driveCapacity: 16}
+##       nvme: {slots: 4, driveCapacity: 7.68}
+##   pools:
+##     - {name: rbd, storageCapacity: 500, protectionType: 3, media: ssd}
+##     - {name: rgw, storageCapacity: 20000, protectionType: 1, ecProfileData: 8, ecProfileParity: 3}
+##     - {name: cephfs, storageCapacity: 1000, metaDataCapacity: 50, protectionType: 3}
+## storageCapacity, protectionType and the EC profile mean what they do for a single scenario.
+## A pool's metaDataCapacity becomes a pool of its own, replicated on nvme.
+
+POOL_MEDIA = ['hdd', 'ssd', 'nvme']
+POOL_DEFAULT_MEDIA = {'hdd': {'slots': 24, 'driveCapacity': 16}}
+# The pool inputs that are also single-scenario inputs, checked as those are: yaml name -> default
+POOL_INPUTS = {'storageCapacity': None, 'metaDataCapacity': 0, 'protectionType': None, 'ecProfileData': 8, 'ecProfileParity': 3}
+POOL_METADATA_MEDIA = 'nvme'
+POOL_METADATA_REPLICAS = 3
+# A shard is at most this fraction of a chassis: small enough for pools to pack around each other,
+# as CRUSH spreads every pool over all the chassis it can
+POOL_SHARD_FRACTION = 1 / 32
+
+
+def checkInput(name, value, errors):
+    """one value checked against the single-scenario input schema; INVALID (and an error) when it fails"""
+    checked = COMPILED_SCHEMA[name.lower()][2](value)
+    if checked is INVALID:
+        errors.append(inputError('invalid', name, value, COMPILED_SCHEMA[name.lower()][3]))
+    return checked
+
+
+class Pool:
+    """one pool's raw requirement, and the shards it is packed as"""
+    __slots__ = ('name', 'media', 'protectionType', 'ecData', 'ecParity', 'width', 'totalCapacity', 'shards', 'shardCapacity')
+
+    def __init__(self, name, media, protectionType, ecData, ecParity, totalCapacity, chassisCapacity):
+        'chassisCapacity is the TB of the pool\'s media one chassis holds'
+        self.name = name
+        self.media = media
+        self.protectionType = protectionType
+        self.ecData = ecData
+        self.ecParity = ecParity
+        # a PG puts one shard (or replica) on each of width chassis
+        self.width = (ecData + ecParity if protectionType == 1 else protectionType)
+        self.totalCapacity = totalCapacity
+        # shards in groups of width, each no bigger than POOL_SHARD_FRACTION of a chassis
+        groups = max(1, math.ceil(totalCapacity / (self.width * chassisCapacity * POOL_SHARD_FRACTION)))
+        self.shards = groups * self.width
+        self.shardCapacity = totalCapacity / self.shards
+
+    def minimumChassis(self):
+        """the fewest chassis the pool can live on: as calculateResults has it, EC needs more chassis than k+m"""
+        return (self.width + 1 if self.protectionType == 1 else self.width)
+
+    def protection(self):
+        return (f'EC {self.ecData}+{self.ecParity}' if self.protectionType == 1 else f'{self.protectionType}x replica')
+
+
+class PoolCluster:
+    """size every pool's raw requirement, then pack them all onto one set of chassis"""
+
+    def __init__(self, colo, fillPercent, media):
+        'media maps a media type to {slots, driveCapacity} for one chassis'
+        self.colo = colo
+        self.fillPercent = fillPercent
+        self.media = media
+        self.pools = []
+        self.chassisUsed = []     # per chassis: {media: TB used}
+
+    @classmethod
+    def fromInput(cls, data):
+        """build a cluster from a parsed --pools input; returns (cluster, [error message, ...])"""
+        errors = []
+        if not isinstance(data, dict) or not isinstance(data.get('pools'), list):
+            return None, ['Error: A multi-pool input needs a list of pools']
+        chassis = data.get('chassis', {})
+        if not isinstance(chassis, dict):
+            return None, ['Error: chassis is not a set of inputs']
+        colo = checkInput('colocation', chassis.get('colocation', False), errors)
+        fillPercent = checkInput('maxFillCapacity', chassis.get('maxFillCapacity', 80), errors)
+        media = {}
+        for mediaType, spec in chassis.get('media', POOL_DEFAULT_MEDIA).items():
+            if mediaType not in POOL_MEDIA or not isinstance(spec, dict):
+                errors.append(inputError('invalid', 'media', mediaType, 'one of ' + ', '.join(POOL_MEDIA)))
+                continue
+            media[mediaType] = {'slots': checkInput('populatedSlotsPerChassis', spec.get('slots'), errors),
+                                'driveCapacity': checkInput('driveCapacity', spec.get('driveCapacity'), errors)}
+        cluster = cls(colo, fillPercent, media)
+        for index, record in enumerate(data['pools']):
+            errors.extend(cluster.addPool(index, record))
+        return cluster, [(error if isinstance(error, str) else formatError(error)) for error in errors]
+
+    def addPool(self, index, record):
+        """add one pool input record (plus its metadata pool); returns its errors"""
+        if not isinstance(record, dict):
+            return [inputError('record', None, record)]
+        errors = []
+        name = str(record.get('name', f'pool{index + 1}'))
+        media = record.get('media', 'hdd')
+        if media not in self.media:
+            errors.append(f'Error: no chassis slots for media: {media}')
+        values = {}
+        for key, value in record.items():
+            if key in POOL_INPUTS:
+                values[key] = checkInput(key, value, errors)
+            elif key not in ('name', 'media'):
+                errors.append(inputError('unknown', key, value))
+        for key, default in POOL_INPUTS.items():
+            if key not in values:
+                if default is None:
+                    errors.append(inputError('missing', key))
+                values[key] = default
+        if errors or INVALID in (self.colo, self.fillPercent):
+            # say which pool each error is in
+            return [f'Error: Pool {name}: ' + (error if isinstance(error, str) else formatError(error))[len('Error: '):]
+                    for error in errors]
+        self.pools.append(Pool(name, media, values['protectionType'], values['ecProfileData'], values['ecProfileParity'],
+                               self.totalCapacity(values['storageCapacity'], values['protectionType'],
+                                                  values['ecProfileData'], values['ecProfileParity']),
+                               self.chassisCapacity(media)))
+        if values['metaDataCapacity']:
+            if POOL_METADATA_MEDIA not in self.media:
+                return [f'Error: Pool {name}: metaDataCapacity needs chassis slots for media: {POOL_METADATA_MEDIA}']
+            self.pools.append(Pool(f'{name} metadata', POOL_METADATA_MEDIA, POOL_METADATA_REPLICAS, None, None,
+                                   self.totalCapacity(values['metaDataCapacity'], POOL_METADATA_REPLICAS, None, None),
+                                   self.chassisCapacity(POOL_METADATA_MEDIA)))
+        return []
+
+    def totalCapacity(self, storageCapacity, protectionType, ecData, ecParity):
+        """the capacity a pool takes on its drives - the same expressions as calculateResults"""
+        rawCapacity = storageCapacity / (self.fillPercent*100)
+        return ((rawCapacity / ecData) * (ecData + ecParity) if protectionType == 1 else rawCapacity * protectionType)
+
+    def chassisCapacity(self, media):
+        return self.media[media]['slots'] * self.media[media]['driveCapacity']
+
+    def pack(self):
+        """place every pool's shards on distinct chassis, opening chassis only when the ones there cannot take them.
+           Returns the number of chassis"""
+        self.chassisUsed = []
+        # one max-heap of (-free TB, chassis) per media: the emptiest chassis take the next shards
+        self.heaps = {media: [] for media in self.media}
+        for _ in range(max((pool.minimumChassis() for pool in self.pools), default=0)):
+            self.openChassis()
+        # biggest shards first: they are the hardest to fit
+        for pool in sorted(self.pools, key=lambda pool: pool.shardCapacity, reverse=True):
+            for _ in range(pool.shards // pool.width):
+                self.placeGroup(pool)
+        return len(self.chassisUsed)
+
+    def openChassis(self):
+        chassis = len(self.chassisUsed)
+        self.chassisUsed.append({media: 0.0 for media in self.media})
+        for media, heap in self.heaps.items():
+            heapq.heappush(heap, (-self.chassisCapacity(media), chassis))
+
+    def placeGroup(self, pool):
+        """one shard on each of pool.width distinct chassis"""
+        heap = self.heaps[pool.media]
+        size = pool.shardCapacity
+        picked = []
+        while len(picked) < pool.width:
+            if heap and -heap[0][0] >= size:
+                picked.append(heapq.heappop(heap))
+            else:
+                # the emptiest chassis left is too full (or already holds a shard of this group): add one
+                self.openChassis()
+        for free, chassis in picked:
+            self.chassisUsed[chassis][pool.media] += size
+            heapq.heappush(heap, (free + size, chassis))
+
+    def drivesPerChassis(self):
+        """per chassis: {media: drives that must be populated} - pools share drives, so this is counted per chassis"""
+        return [{media: math.ceil(used / self.media[media]['driveCapacity'] - 1e-9) for media, used in usage.items()}
+                for usage in self.chassisUsed]
+
+    def separateChassis(self):
+        """what sizing each pool on its own hardware takes: the sum of the single-pool chassis counts"""
+        total = 0
+        for pool in self.pools:
+            spec = self.media[pool.media]
+            drives = math.ceil(pool.totalCapacity / spec['driveCapacity'])
+            total += max(math.ceil(drives / spec['slots']), pool.minimumChassis())
+        return total
+
+    def getResults(self):
+        """the pools and, per media, the drives of the shared chassis"""
+        drives = self.drivesPerChassis()
+        media = []
+        for mediaType, spec in self.media.items():
+            counts = [chassis[mediaType] for chassis in drives]
+            if counts:
+                media.append({'media': mediaType, 'drives': sum(counts), 'mostPerChassis': max(counts), 'slots': spec['slots'],
+                              'driveCapacity': spec['driveCapacity'],
+                              'usedCapacity': sum(chassis[mediaType] for chassis in self.chassisUsed)})
+        return {'chassis': len(self.chassisUsed), 'separateChassis': self.separateChassis(),
+                'pools': [{'name': pool.name, 'protection': pool.protection(), 'media': pool.media,
+                           'totalCapacity': pool.totalCapacity, 'shards': pool.shards, 'shardCapacity': pool.shardCapacity}
+                          for pool in self.pools],
+                'mediaDrives': media}
+
+    def reportLines(self, results):
+        """the text report: each pool, then the shared chassis"""
+        lines = [f'Multi-Pool Sizing: {len(self.pools)} pools on {results["chassis"]} shared chassis '
+                 f'(sized separately: {results["separateChassis"]})']
+        for pool in results['pools']:
+            lines.append(f'Pool {pool["name"]}: {pool["protection"]} on {pool["media"]}, Total Capacity = {pool["totalCapacity"]}, '
+                         f'Shards = {pool["shards"]}, Shard Capacity = {pool["shardCapacity"]}')
+        for media in results['mediaDrives']:
+            lines.append(f'{media["media"].upper()} Drives = {media["drives"]} (most per chassis = {media["mostPerChassis"]} '
+                         f'of {media["slots"]} slots, {media["driveCapacity"]} TB each), Used Capacity = {media["usedCapacity"]}')
+        return lines
+
+    def reportPacking(self, options):
+        """write the packing, in --format, to --output; False (reported) when it breaks the co-location limit"""
+        results = self.getResults()
+        writer = openReportWriter(options)
+        writer.writeReport('multiPool', results, self.reportLines(results))
+        writer.close()
+        if self.colo and len(self.chassisUsed) > SizingData.SDCONST_COLOMAXNODES:
+            print (f'Number of nodes ({len(self.chassisUsed)}) is too high for co-location', file=sys.stderr)
+            return False
+        return True
+
+
+def sizePools(options):
+    """size the multi-pool --input: every pool's requirement, packed onto shared chassis"""
+    reader = SizingData(options)
+    if not reader.readYAMLInput():
+        return False
+    cluster, errors = PoolCluster.fromInput(reader.sizingData)
+    for error in errors:
+        print (error, file=sys.stderr)
+    if errors:
+        return False
+    cluster.pack()
+    return cluster.reportPacking(options)
@@ -0,0 +1,233 @@
+# -*- coding: utf-8 -*-
+__author__      = "Brian Fromme"
+__copyright__   = "Copyright 2020, Gnu Public License - Version 2.0"
+__credits__     = ["Brian Fromme, Bryan Gartner, Darren Soothill"]
+__maintainer__  = "Brian Fromme"
+__status__      = "Prototype"
+"""
+@newfield description: Description
+"""
+__description__ = "Sonar report writers - text, JSON, CSV and Markdown, through one buffered output"
+
+import csv
+import json
+import sys
+
+from sizingdata import SizingData
+
+# Output is written in blocks this big, not a syscall per line
+REPORT_BUFFER_SIZE = 1 << 16
+
+# Every reported line as (section key, column name, label, sdr_ attribute)
+REPORT_COLUMNS = [(('sizing' if section == 'Sizing First-Opinion' else 'bom'), name[len('sdr_'):], label, name)
+                  for section, lines in SizingData.SDREPORT for label, name in lines
+                  # the BOM 'Network Cards' line repeats the OS disk value - leave it out of the machine-readable formats
+                  if not (name == 'sdr_BOM_OSDisk' and label == 'Network Cards')]
+
+
+def flattenReport(results, prefix=''):
+    """split a report's results for the tabular formats: ({'name' or 'outer.inner': value}, {table name: [row dict, ...]}).
+       A list of dicts is a table; any other list is joined into one '; ' separated value"""
+    values = {}
+    tables = {}
+    for name, value in results.items():
+        if isinstance(value, dict):
+            nestedValues, nestedTables = flattenReport(value, f'{prefix}{name}.')
+            values.update(nestedValues)
+            tables.update(nestedTables)
+        elif isinstance(value, list) and value and all(isinstance(row, dict) for row in value):
+            tables[prefix + name] = [flattenReport(row)[0] for row in value]
+        elif isinstance(value, list):
+            values[prefix + name] = '; '.join(str(item) for item in value)
+        else:
+            values[prefix + name] = value
+    return values, tables
+
+
+class ReportWriter:
+    """base class for report writers: one buffered output, one writeScenario call per sized scenario"""
+
+    def __init__(self, output, batch=False):
+        'output is a file name, or - for stdout; batch is True when many scenarios are written'
+        self.batch = batch
+        self.rows = 0
+        if output == '-':
+            self.f = sys.stdout
+        else:
+            self.f = open(output, 'w', buffering=REPORT_BUFFER_SIZE, newline='')
+        self.begin()
+
+    def begin(self):
+        """write anything that comes before the first scenario"""
+        pass
+
+    def end(self):
+        """write anything that comes after the last scenario"""
+        pass
+
+    def writeScenario(self, sizingData, index=1):
+        """write the results a SizingData holds (from calculateResults or setResults)"""
+        raise NotImplementedError
+
+    def writeReport(self, name, results, lines):
+        """write a report that is not a scenario's results (eg: a simulation of the scenario just written).
+           results is a dict of JSON values, where a list of dicts is a table; lines is the text report"""
+        raise NotImplementedError
+
+    def close(self):
+        self.end()
+        if self.f is sys.stdout:
+            self.f.flush()
+        else:
+            self.f.close()
+
+
+class TextReportWriter(ReportWriter):
+    """the classic 'Label = value' report"""
+
+    def writeScenario(self, sizingData, index=1):
+        if self.batch:
+            print(file=self.f)
+            print(f'Scenario {index}:', file=self.f)
+        sizingData.reportSizingResults(self.f)
+        self.rows += 1
+
+    def writeReport(self, name, results, lines):
+        print(file=self.f)
+        for line in lines:
+            print(line, file=self.f)
+
+
+class JSONReportWriter(ReportWriter):
+    """one JSON object per scenario, with sizing and bom sections; a batch is streamed as one JSON array.
+       A scenario is written once the next one starts, so the reports that follow it can join its object"""
+
+    def begin(self):
+        self.pending = None
+        self.objects = 0
+        if self.batch:
+            self.f.write('[\n')
+
+    def writeObject(self, report):
+        if self.batch and self.objects:
+            self.f.write(',\n')
+        self.f.write(json.dumps(report))
+        if not self.batch:
+            self.f.write('\n')
+        self.objects += 1
+
+    def writeScenario(self, sizingData, index=1):
+        report = {'scenario': index, 'sizing': {}, 'bom': {}}
+        for section, column, label, name in REPORT_COLUMNS:
+            report[section][column] = getattr(sizingData, name)
+        report['errors'] = sizingData.sdc_ErrorMessages
+        if self.pending is not None:
+            self.writeObject(self.pending)
+        self.pending = report
+        self.rows += 1
+
+    def writeReport(self, name, results, lines):
+        if self.pending is not None:
+            self.pending[name] = results
+        else:
+            # a report of its own (eg: --solve): one object
+            self.writeObject({name: results})
+
+    def end(self):
+        if self.pending is not None:
+            self.writeObject(self.pending)
+            self.pending = None
+        if self.batch:
+            self.f.write('\n]\n')
+
+
+class CSVReportWriter(ReportWriter):
+    """one row per scenario, under a single header row; any other report follows as rows of its own"""
+
+    def begin(self):
+        self.csv = csv.writer(self.f)
+        # the scenario header is written with the first scenario, so a report of its own (eg: --solve) has none
+        self.headerWritten = False
+        self.reports = 0
+
+    def writeHeader(self):
+        self.csv.writerow(['Scenario'] + [column for section, column, label, name in REPORT_COLUMNS] + ['Errors'])
+        self.headerWritten = True
+
+    def writeScenario(self, sizingData, index=1):
+        if not self.headerWritten:
+            self.writeHeader()
+        self.csv.writerow([index] + [getattr(sizingData, name) for section, column, label, name in REPORT_COLUMNS]
+                          + ['; '.join(sizingData.sdc_ErrorMessages)])
+        self.rows += 1
+
+    def writeReport(self, name, results, lines):
+        # the report's values as a header and one row, then each of its tables the same way - a blank row between
+        values, tables = flattenReport(results)
+        sections = ([[['Report'] + list(values), [name] + list(values.values())]] if values else [])
+        sections += [[[table] + list(rows[0])] + [[index] + list(row.values()) for index, row in enumerate(rows, 1)]
+                     for table, rows in tables.items()]
+        for rows in sections:
+            if self.rows or self.reports:
+                self.csv.writerow([])
+            self.csv.writerows(rows)
+            self.reports += 1
+
+    def end(self):
+        if not self.rows and not self.reports:
+            # no scenarios: still a (header-only) table
+            self.writeHeader()
+
+
+class MarkdownReportWriter(ReportWriter):
+    """a Markdown table: one header, then one row per scenario; any other report is a heading and tables of its own"""
+
+    def begin(self):
+        # the scenario header is written with the first scenario, so a report of its own (eg: --solve) has none
+        self.headerWritten = False
+        self.reports = 0
+
+    def writeRow(self, values):
+        self.f.write('| ' + ' | '.join(str(value).replace('|', '\\|') for value in values) + ' |\n')
+
+    def writeHeader(self, labels):
+        self.writeRow(labels)
+        self.f.write('|' + '---|' * len(labels) + '\n')
+
+    def writeScenario(self, sizingData, index=1):
+        if not self.headerWritten:
+            self.writeHeader(['Scenario'] + [('BOM ' if section == 'bom' else '') + label for section, column, label, name in REPORT_COLUMNS] + ['Errors'])
+            self.headerWritten = True
+        self.writeRow([index] + [getattr(sizingData, name) for section, column, label, name in REPORT_COLUMNS] + ['; '.join(sizingData.sdc_ErrorMessages)])
+        self.rows += 1
+
+    def writeReport(self, name, results, lines):
+        # the first text line is the heading; then the values as one table, and each table of the report
+        values, tables = flattenReport(results)
+        if self.rows or self.reports:
+            self.f.write('\n')
+        self.f.write(f'### {lines[0]}\n')
+        if values:
+            self.f.write('\n')
+            self.writeHeader(['Result', 'Value'])
+            for column, value in values.items():
+                self.writeRow([column, value])
+        for table, rows in tables.items():
+            self.f.write('\n')
+            self.writeHeader([table] + list(rows[0]))
+            for index, row in enumerate(rows, 1):
+                self.writeRow([index] + list(row.values()))
+        self.reports += 1
+
+    def end(self):
+        if not self.rows and not self.reports:
+            # no scenarios: still a (header-only) table
+            self.writeHeader(['Scenario'] + [('BOM ' if section == 'bom' else '') + label for section, column, label, name in REPORT_COLUMNS] + ['Errors'])
+
+
+REPORT_WRITERS = {'text': TextReportWriter, 'json': JSONReportWriter, 'csv': CSVReportWriter, 'markdown': MarkdownReportWriter}
+
+
+def openReportWriter(options, batch=False):
+    """the writer for --format, writing to --output"""
+    return REPORT_WRITERS[options.argFormat](options.argOutput, batch)
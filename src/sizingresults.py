@@ -0,0 +1,243 @@
+# -*- coding: utf-8 -*-
+__author__      = "Brian Fromme"
+__copyright__   = "Copyright 2020, Gnu Public License - Version 2.0"
+__credits__     = ["Brian Fromme, Bryan Gartner, Darren Soothill"]
+__maintainer__  = "Brian Fromme"
+__status__      = "Prototype"
+"""
+@newfield description: Description
+"""
+__description__ = "Sonar result storage - compact records and a columnar, memory-mappable result table"
+
+import json
+
+import numpy as np
+
+from sizingcatalog import CATALOG_RESULTS, loadCatalog
+from sizingdata import SizingData
+
+
+# The stored result fields and their column types. Part models (CATALOG_RESULTS) are stored as category codes.
+RESULT_FIELDS = {
+    'sdr_RawCapacity': np.float64,
+    'sdr_TotalCapacity': np.float64,
+    'sdr_DrivesNeeded': np.int64,
+    'sdr_ChassisNeeded': np.int64,
+    'sdr_ColoMemoryNeeded': np.int32,
+    'sdr_MinimumMemoryNeeded': np.int32,
+    'sdr_ColoCPUNeeded': np.int32,
+    'sdr_ColoThreadsNeeded': np.int32,
+    'sdr_SuggestedCPU': np.int32,
+    'sdr_NVMeNeeded': np.int32,
+    'sdr_MinimumNVMeSize': np.int32,
+    'sdr_ExpectedPerfGBs': np.float64,
+    'sdr_BOM_NumberOfChassis': np.int64,
+    'sdr_BOM_ChassisModel': np.int32,
+    'sdr_BOM_DrivesPerChassis': np.int32,
+    'sdr_BOM_DriveSize': np.float64,
+    'sdr_BOM_DriveModel': np.int32,
+    'sdr_BOM_NVMeModel': np.int32,
+    'sdc_ComputationalErrors': np.bool_,
+}
+# Float columns that hold an input value: the type it came in (16, not 16.0) is kept in the table header
+RESULT_INPUT_FIELDS = ['sdr_BOM_DriveSize']
+# BOM lines that repeat another result are not stored twice
+RESULT_ALIASES = {
+    'sdr_BOM_MemoryPerChassis': 'sdr_MinimumMemoryNeeded',
+    'sdr_BOM_CPUPerChassis': 'sdr_SuggestedCPU',
+    'sdr_BOM_NVMe': 'sdr_NVMeNeeded',
+    'sdr_BOM_NVMeSize': 'sdr_MinimumNVMeSize',
+}
+# ...and neither are the lines that are not implemented yet
+RESULT_CONSTANTS = {
+    'sdr_NetworkCards': 'Not Implemented',
+    'sdr_BOM_OSDisk': 'Not Implemented',
+    'sdr_BOM_MetaDataNVMes': 'Not Implemented',
+}
+
+TABLE_MAGIC = b'SONARTBL'
+TABLE_ALIGN = 64
+
+
+class SizingResult:
+    """one scenario's results, without a per-instance __dict__"""
+    __slots__ = tuple(RESULT_FIELDS)
+
+    def __init__(self, results):
+        'results is a dict in the SizingData.getResults format'
+        for name in RESULT_FIELDS:
+            setattr(self, name, results[name])
+
+    @classmethod
+    def fromSizingData(cls, sizingData):
+        return cls(sizingData.getResults())
+
+    def __getattr__(self, name):
+        # only reached for names that are not slots
+        if name in RESULT_ALIASES:
+            return getattr(self, RESULT_ALIASES[name])
+        if name in RESULT_CONSTANTS:
+            return RESULT_CONSTANTS[name]
+        raise AttributeError(name)
+
+    def getResults(self):
+        """back to the SizingData.getResults format, eg: for SizingData.setResults"""
+        results = {name: getattr(self, name) for name in SizingData.SDRESULTS}
+        results['sdc_ComputationalErrors'] = self.sdc_ComputationalErrors
+        results['sdc_ErrorMessages'] = []
+        return results
+
+
+class SizingResultTable:
+    """a columnar result set: one typed numpy array per result field.
+       Slices are views; filter and sort only build an index - the columns are never copied"""
+
+    def __init__(self, columns, index=None, categories=None, integers=()):
+        'columns maps every RESULT_FIELDS name to an array; index selects and orders rows of them'
+        ## categories holds the model names behind the codes of each CATALOG_RESULTS column (default: the default catalog's)
+        ## integers names the RESULT_INPUT_FIELDS columns whose every value was an int (they read back as ints)
+        self.columns = columns
+        self.index = index
+        self.categories = (categories if categories is not None else loadCatalog().categories)
+        self.integers = list(integers)
+
+    def __len__(self):
+        if self.index is not None:
+            return len(self.index)
+        return len(self.columns['sdc_ComputationalErrors'])
+
+    def column(self, name):
+        """one result column, for the rows of this table; part models come back as category codes (see categories)"""
+        name = RESULT_ALIASES.get(name, name)
+        values = self.columns[name]
+        return (values if self.index is None else values[self.index])
+
+    def __getitem__(self, key):
+        """table[i] is a SizingResult; table[start:stop:step] is a table of views"""
+        if isinstance(key, slice):
+            if self.index is not None:
+                return SizingResultTable(self.columns, self.index[key], self.categories, self.integers)
+            return SizingResultTable({name: values[key] for name, values in self.columns.items()},
+                                     categories=self.categories, integers=self.integers)
+        row = (key if self.index is None else self.index[key])
+        results = {name: values[row].item() for name, values in self.columns.items()}
+        for name in CATALOG_RESULTS:
+            results[name] = self.categories[name][results[name]]
+        for name in self.integers:
+            results[name] = int(results[name])
+        return SizingResult(results)
+
+    def __iter__(self):
+        for row in range(len(self)):
+            yield self[row]
+
+    def rows(self):
+        """the row numbers this table selects from its columns"""
+        return (np.arange(len(self)) if self.index is None else self.index)
+
+    def filter(self, mask):
+        """keep the rows where mask (a bool array as long as this table) is True"""
+        return SizingResultTable(self.columns, self.rows()[np.asarray(mask, dtype=bool)], self.categories, self.integers)
+
+    def sort(self, name, descending=False):
+        """order the rows by one column; stable, so equal rows keep their order"""
+        values = self.column(name)
+        if descending:
+            # sort the reversed column and reverse the result, so equal rows still keep their order
+            order = (len(values) - 1) - np.argsort(values[::-1], kind='stable')[::-1]
+        else:
+            order = np.argsort(values, kind='stable')
+        return SizingResultTable(self.columns, self.rows()[order], self.categories, self.integers)
+
+    @classmethod
+    def fromResults(cls, results):
+        """build a table from SizingResult records or getResults dicts (the scalar path)"""
+        builder = SizingResultTableBuilder()
+        for result in results:
+            builder.append(result if isinstance(result, dict) else result.getResults())
+        return builder.toTable()
+
+    def save(self, path):
+        """write the table to a single binary file that load() can memory-map"""
+        fields = []
+        arrays = []
+        offset = 0
+        for name, dtype in RESULT_FIELDS.items():
+            values = np.ascontiguousarray(self.column(name), dtype=dtype)
+            fields.append({'name': name, 'dtype': values.dtype.str, 'offset': offset})
+            arrays.append(values)
+            offset += -(-values.nbytes // TABLE_ALIGN) * TABLE_ALIGN
+        # the model names go with the codes, so a table reads back the same whatever catalog is in use then
+        header = json.dumps({'rows': len(self), 'fields': fields, 'categories': self.categories, 'integers': self.integers}).encode()
+        dataStart = -(-(len(TABLE_MAGIC) + 8 + len(header)) // TABLE_ALIGN) * TABLE_ALIGN
+        with open(path, 'wb') as f:
+            f.write(TABLE_MAGIC)
+            f.write(len(header).to_bytes(8, 'little'))
+            f.write(header)
+            for field, values in zip(fields, arrays):
+                f.seek(dataStart + field['offset'])
+                f.write(values.tobytes())
+            # make sure the file covers the last (possibly empty) column
+            f.truncate(dataStart + offset)
+
+    @classmethod
+    def load(cls, path):
+        """open a saved table; the columns are memory-mapped, so nothing is read until it is used"""
+        with open(path, 'rb') as f:
+            if f.read(len(TABLE_MAGIC)) != TABLE_MAGIC:
+                raise ValueError(f'Not a sonar result table: {path}')
+            headerLength = int.from_bytes(f.read(8), 'little')
+            header = json.loads(f.read(headerLength))
+        if 'categories' not in header:
+            raise ValueError(f'Result table was saved without its part models: {path}')
+        dataStart = -(-(len(TABLE_MAGIC) + 8 + headerLength) // TABLE_ALIGN) * TABLE_ALIGN
+        rows = header['rows']
+        columns = {}
+        for field in header['fields']:
+            dtype = np.dtype(field['dtype'])
+            if rows == 0:
+                columns[field['name']] = np.empty(0, dtype=dtype)
+            else:
+                columns[field['name']] = np.memmap(path, dtype=dtype, mode='r', offset=dataStart + field['offset'], shape=(rows,))
+        # tables saved before the input types were kept read back as floats
+        return cls(columns, categories=header['categories'], integers=header.get('integers', []))
+
+
+class SizingResultTableBuilder:
+    """collect results one scenario at a time (eg: from a stream) into growing typed columns"""
+
+    def __init__(self, capacity=1024, categories=None):
+        self.size = 0
+        self.columns = {name: np.empty(capacity, dtype=dtype) for name, dtype in RESULT_FIELDS.items()}
+        # copies: a model that is not in the catalog (eg: a result cached under another one) is added to them
+        categories = (categories if categories is not None else loadCatalog().categories)
+        self.categories = {name: list(categories[name]) for name in CATALOG_RESULTS}
+        self.codes = {name: {model: code for code, model in enumerate(models)} for name, models in self.categories.items()}
+        # the RESULT_INPUT_FIELDS that have only been given ints so far
+        self.integers = set(RESULT_INPUT_FIELDS)
+
+    def append(self, results):
+        """add one scenario, in the SizingData.getResults format"""
+        if self.size == len(self.columns['sdc_ComputationalErrors']):
+            # double the columns, so appending stays cheap on average
+            for name, values in self.columns.items():
+                grown = np.empty(2 * len(values), dtype=values.dtype)
+                grown[:self.size] = values[:self.size]
+                self.columns[name] = grown
+        for name, values in self.columns.items():
+            values[self.size] = (self.categoryCode(name, results[name]) if name in self.codes else results[name])
+        if self.integers:
+            self.integers.difference_update([name for name in self.integers if type(results[name]) is not int])
+        self.size += 1
+
+    def categoryCode(self, name, model):
+        """the code for a part model in a CATALOG_RESULTS column"""
+        code = self.codes[name].get(model)
+        if code is None:
+            code = self.codes[name][model] = len(self.categories[name])
+            self.categories[name].append(model)
+        return code
+
+    def toTable(self):
+        return SizingResultTable({name: values[:self.size] for name, values in self.columns.items()}, categories=self.categories,
+                                 integers=[name for name in RESULT_INPUT_FIELDS if name in self.integers])
@@ -0,0 +1,237 @@
+# -*- coding: utf-8 -*-
+__author__      = "Brian Fromme"
+__copyright__   = "Copyright 2020, Gnu Public License - Version 2.0"
+__credits__     = ["Brian Fromme, Bryan Gartner, Darren Soothill"]
+__maintainer__  = "Brian Fromme"
+__status__      = "Prototype"
+"""
+@newfield description: Description
+"""
+__description__ = "Sonar input schema - compiled once, validates single records, record batches and batch columns"
+
+import math
+import re
+
+## NOTE: numpy is imported by the column checks only - validating single records must not pay for it
+
+# Every input, keyed by its yaml name: (sdi_ attribute, type, allowed range, required)
+##   type is 'bool', 'int', 'number', or a dict of the allowed (lowercase) strings -> the value stored for each
+##   range is an interval: '[1, 100]' includes both ends, '(0, )' is anything above 0
+INPUT_SCHEMA = {
+    'colocation':               ('sdi_Colo', 'bool', None, False),
+    'useCase':                  ('sdi_ArchiveUseCase', {'archive': True, 'mixed': False}, None, False),
+    'storageCapacity':          ('sdi_StorageCapacity', 'number', '(0, )', True),
+    'metaDataCapacity':         ('sdi_MetaDataCapacity', 'number', '[0, )', False),
+    'driveCapacity':            ('sdi_DriveCapacity', 'number', '(0, )', True),
+    'drivesPerChassis':         ('sdi_DrivesPerChassis', 'int', '[1, )', False),
+    'populatedSlotsPerChassis': ('sdi_PopulatedSlotsPerChassis', 'int', '[1, )', False),
+    'nvmeSlotsPerChassis':      ('sdi_NVMeSlotsPerChassis', 'int', '[0, )', False),
+    'driveType':                ('sdi_DriveTypeSSD', {'hdd': False, 'ssd': True}, None, False),
+    'maxFillCapacity':          ('sdi_MaxFillCapacityPercent', 'number', '[1, 100]', False),
+    'nvmeRatio':                ('sdi_NVMeRatio', 'int', '[1, )', False),
+    # 1 = EC, otherwise the number of replicas
+    'protectionType':           ('sdi_ProtectionType', 'int', '[1, 6]', True),
+    'ecProfileData':            ('sdi_ECData', 'int', '[1, )', False),
+    'ecProfileParity':          ('sdi_ECParity', 'int', '[1, )', False),
+}
+
+REQUIRED_INPUTS = [name for name, (attribute, kind, limits, required) in INPUT_SCHEMA.items() if required]
+
+# what a check returns for a value it rejects (None could be a stored value)
+INVALID = object()
+
+INTERVAL = re.compile(r'^([\[(])\s*([^,]*),\s*([^\])]*)([\])])$')
+
+
+def parseInterval(limits):
+    """'[1, 100]' -> (1, 100, True, True): the bounds (None when open) and whether each end is included"""
+    match = INTERVAL.match(limits)
+    if match is None:
+        raise ValueError(f'Not an interval: {limits}')
+    opening, low, high, closing = match.groups()
+    low = (float(low) if low.strip() else None)
+    high = (float(high) if high.strip() else None)
+    return low, high, opening == '[', closing == ']'
+
+
+def describeField(kind, limits):
+    """what a field expects, for error messages"""
+    if isinstance(kind, dict):
+        return 'one of ' + ', '.join(kind)
+    expected = {'bool': 'True or False', 'int': 'an integer', 'number': 'a number'}[kind]
+    if limits is None:
+        return expected
+    low, high, lowIncluded, highIncluded = parseInterval(limits)
+    if low is not None and high is not None and lowIncluded and highIncluded:
+        return f'{expected} from {low:g} to {high:g}'
+    bounds = []
+    if low is not None:
+        bounds.append(('>= ' if lowIncluded else '> ') + f'{low:g}')
+    if high is not None:
+        bounds.append(('<= ' if highIncluded else '< ') + f'{high:g}')
+    return f'{expected} ' + ' and '.join(bounds)
+
+
+def compileRange(limits):
+    """a function testing a number against the interval (None for no limits)"""
+    if limits is None:
+        return None
+    low, high, lowIncluded, highIncluded = parseInterval(limits)
+    if high is None:
+        if lowIncluded:
+            return lambda value: value >= low
+        return lambda value: value > low
+    if lowIncluded and highIncluded:
+        return lambda value: low <= value <= high
+    return lambda value: ((low is None or (value >= low if lowIncluded else value > low))
+                          and (value <= high if highIncluded else value < high))
+
+
+def compileCheck(kind, limits):
+    """a function taking one input value and returning the value to store, or INVALID"""
+    if isinstance(kind, dict):
+        def check(value):
+            return (kind.get(value.lower(), INVALID) if type(value) is str else INVALID)
+        return check
+    if kind == 'bool':
+        return lambda value: (value if type(value) is bool else INVALID)
+    inRange = compileRange(limits)
+    if kind == 'int':
+        def check(value):
+            # 24.0 is accepted, and stored, as 24 - batch columns cannot tell them apart either
+            if not (type(value) is int or (type(value) is float and value.is_integer())):
+                return INVALID
+            return (int(value) if inRange is None or inRange(value) else INVALID)
+        return check
+
+    def check(value):
+        if not (type(value) is int or (type(value) is float and math.isfinite(value))):
+            return INVALID
+        return (value if inRange is None or inRange(value) else INVALID)
+    return check
+
+
+def compileSchema(schema):
+    """lowercase input name -> (yaml name, sdi_ attribute, check, what it expects)"""
+    compiled = {}
+    for name, (attribute, kind, limits, required) in schema.items():
+        compiled[name.lower()] = (name, attribute, compileCheck(kind, limits), describeField(kind, limits))
+    return compiled
+
+
+# Built once, at import - validating a record is then one dict lookup and one call per key
+COMPILED_SCHEMA = compileSchema(INPUT_SCHEMA)
+REQUIRED_ATTRIBUTES = [(INPUT_SCHEMA[name][0], name) for name in REQUIRED_INPUTS]
+
+
+def inputError(error, name, value=None, expected=None):
+    """one validation problem: error is 'unknown', 'invalid', 'missing' or 'record'"""
+    return {'error': error, 'input': name, 'value': value, 'expected': expected}
+
+
+def formatError(error):
+    """the message for an inputError, as validateSizingData prints it"""
+    if error['error'] == 'unknown':
+        return f'Error: Input option not found: {error["input"]}: {error["value"]}'
+    if error['error'] == 'invalid':
+        return f'Error: Input value not understood: {error["input"]}: {error["value"]} (expected {error["expected"]})'
+    if error['error'] == 'missing':
+        return f'Error: Required input missing: {error["input"]}'
+    return f'Error: Input is not a set of sizing inputs: {error["value"]}'
+
+
+def validateRecord(record):
+    """check one input record (a dict of yaml name -> value; names are matched case-insensitively).
+       Returns ({sdi_ attribute: value to store}, [inputError, ...]) - the record is valid when the list is empty"""
+    if not isinstance(record, dict):
+        return {}, [inputError('record', None, record)]
+    values = {}
+    errors = []
+    for key, value in record.items():
+        field = (COMPILED_SCHEMA.get(key.lower()) if type(key) is str else None)
+        if field is None:
+            errors.append(inputError('unknown', key, value))
+            continue
+        name, attribute, check, expected = field
+        stored = check(value)
+        if stored is INVALID:
+            errors.append(inputError('invalid', key, value, expected))
+            # an invalid value is still a value: do not also report it as missing
+            values[attribute] = INVALID
+        else:
+            values[attribute] = stored
+    for attribute, name in REQUIRED_ATTRIBUTES:
+        if attribute not in values:
+            errors.append(inputError('missing', name))
+    if errors:
+        values = {attribute: value for attribute, value in values.items() if value is not INVALID}
+    return values, errors
+
+
+def validateRecords(records):
+    """check a batch of input records in one pass; returns one error list per record (empty when valid)"""
+    return [validateRecord(record)[1] for record in records]
+
+
+def validateColumns(columns, size):
+    """check batch input columns (yaml name -> array, as SizingBatch takes them) with whole-array operations.
+       Returns (a bool array, True where the row is valid, {row: [inputError, ...]} for the invalid rows)"""
+    import numpy as np
+    valid = np.ones(size, dtype=bool)
+    rowErrors = {}
+    for name, (attribute, kind, limits, required) in INPUT_SCHEMA.items():
+        if name not in columns:
+            if required:
+                valid[:] = False
+                for row in range(size):
+                    rowErrors.setdefault(row, []).append(inputError('missing', name))
+            continue
+        values = np.asarray(columns[name])
+        ok = validColumnValues(values, kind, limits)
+        if ok.all():
+            continue
+        valid &= ok
+        expected = COMPILED_SCHEMA[name.lower()][3]
+        for row in np.flatnonzero(~ok):
+            value = values[row]
+            rowErrors.setdefault(int(row), []).append(inputError('invalid', name, (value.item() if hasattr(value, 'item') else value), expected))
+    return valid, rowErrors
+
+
+def validColumnValues(values, kind, limits):
+    """the rows of one column holding acceptable values"""
+    import numpy as np
+    if values.dtype.kind == 'O':
+        # mixed python values: check them one by one
+        check = compileCheck(kind, limits)
+        return np.fromiter((check(value) is not INVALID for value in values), dtype=bool, count=len(values))
+    if isinstance(kind, dict):
+        if values.dtype.kind not in 'US':
+            return np.zeros(len(values), dtype=bool)
+        values = values.astype(str, copy=False)
+        # lowercasing a whole string column is slow: match the usual spellings first, lowercase only the rest
+        spellings = [spelling for choice in kind for spelling in {choice, choice.upper(), choice.capitalize()}]
+        ok = np.isin(values, spellings)
+        odd = np.flatnonzero(~ok)
+        if len(odd):
+            ok[odd] = np.isin(np.char.lower(values[odd]), list(kind))
+        return ok
+    if kind == 'bool':
+        return np.full(len(values), values.dtype.kind == 'b')
+    if values.dtype.kind in 'iu':
+        ok = np.ones(len(values), dtype=bool)
+    elif values.dtype.kind == 'f':
+        with np.errstate(invalid='ignore'):
+            ok = np.isfinite(values)
+            if kind == 'int':
+                ok &= (np.floor(values) == values)
+    else:
+        return np.zeros(len(values), dtype=bool)
+    if limits is not None:
+        low, high, lowIncluded, highIncluded = parseInterval(limits)
+        with np.errstate(invalid='ignore'):
+            if low is not None:
+                ok &= (values >= low if lowIncluded else values > low)
+            if high is not None:
+                ok &= (values <= high if highIncluded else values < high)
+    return ok
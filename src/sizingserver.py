@@ -0,0 +1,202 @@
+# -*- coding: utf-8 -*-
+__author__      = "Brian Fromme"
+__copyright__   = "Copyright 2020, Gnu Public License - Version 2.0"
+__credits__     = ["Brian Fromme, Bryan Gartner, Darren Soothill"]
+__maintainer__  = "Brian Fromme"
+__status__      = "Prototype"
+"""
+@newfield description: Description
+"""
+__description__ = "Sonar sizing daemon - serve sizing requests over a local socket"
+
+import asyncio
+import collections
+import contextlib
+import io
+import json
+import os
+import signal
+import sys
+import time
+
+from sizingbatch import SizingBatch
+from sizingcache import SizingCache
+from sizingdata import SizingData
+from sizinginput import parseText
+from sizingstats import STATS
+from sizingstream import loadRecord
+from sonarprotocol import END_OF_REQUEST, METRICS_REQUEST, defaultSocketPath
+
+## The protocol is in sonarprotocol
+MAX_BATCH = 256
+# latency percentiles are taken over this many most recent requests
+LATENCY_WINDOW = 10000
+
+
+def parseRequest(text):
+    """parse one request document; JSON takes the fast path, anything else is read as yaml"""
+    return parseText(text)
+
+
+class SizingServer:
+    """asyncio sizing daemon: concurrent requests are coalesced into batches and sized together"""
+
+    def __init__(self, options):
+        self.options = options
+        self.sizingData = SizingData(options)
+        self.cache = SizingCache.fromOptions(options)
+        self.queue = None
+        self.requests = 0
+        self.batches = 0
+        self.latencies = collections.deque(maxlen=LATENCY_WINDOW)
+        # a daemon always keeps its stage timings, for the metrics request
+        STATS.enable()
+
+    def sizeBatch(self, batch):
+        """size the queued (request id, record, future) entries of a batch together: each is validated (and looked up
+           in the cache) on its own, then all the others are sized by one SizingBatch call.
+           Each gets its own results and error messages"""
+        sizingData = self.sizingData
+        replies = []
+        # the requests left to size: their replies, cache keys, records and validated drive sizes
+        unsized = []
+        for request, record, future in batch:
+            errors = io.StringIO()
+            # the sizing code reports problems on stderr - send them back to the client instead
+            with contextlib.redirect_stderr(errors):
+                try:
+                    valid = loadRecord(sizingData, request, record)
+                except (AttributeError, TypeError, ValueError) as e:
+                    print (f'Error: Scenario {request} cannot be sized: {e}', file=sys.stderr)
+                    valid = False
+            reply = {'ok': False, 'results': None, 'errors': errors.getvalue().splitlines()}
+            replies.append((reply, future))
+            if not valid:
+                continue
+            key, reply['results'] = (self.cache.lookup(sizingData) if self.cache is not None else (None, None))
+            if reply['results'] is None:
+                unsized.append((reply, key, record, sizingData.sdi_DriveCapacity))
+        if unsized:
+            with STATS.stage('calculateResults'):
+                sized = SizingBatch.fromRecords([record for reply, key, record, driveCapacity in unsized],
+                                                sizingData.getCatalog())
+                sized.calculateResults()
+            for row, (reply, key, record, driveCapacity) in enumerate(unsized):
+                results = sized.getResults(row)
+                # the BOM repeats the drive size as it was given: 16, not the 16.0 of a column shared with 7.68
+                results['sdr_BOM_DriveSize'] = driveCapacity
+                if key is not None:
+                    self.cache.put(key, results)
+                reply['results'] = results
+        for reply, future in replies:
+            if reply['results'] is not None:
+                reply['ok'] = not reply['results']['sdc_ComputationalErrors']
+                reply['errors'].extend(reply['results']['sdc_ErrorMessages'])
+            if not future.done():
+                future.set_result(reply)
+        self.batches += 1
+
+    async def batcher(self):
+        """take whatever requests are waiting, up to MAX_BATCH, and size them in one go"""
+        window = self.options.argBatchWindow / 1000
+        while True:
+            batch = [await self.queue.get()]
+            if window:
+                # give concurrent clients a moment to join this batch
+                await asyncio.sleep(window)
+            while len(batch) < MAX_BATCH and not self.queue.empty():
+                batch.append(self.queue.get_nowait())
+            self.sizeBatch(batch)
+
+    async def handleConnection(self, reader, writer):
+        """answer requests on one connection until the client closes it"""
+        try:
+            while True:
+                lines = []
+                while True:
+                    line = await reader.readline()
+                    if not line:
+                        return
+                    line = line.decode()
+                    if line.rstrip('\r\n') == END_OF_REQUEST:
+                        break
+                    lines.append(line)
+                started = time.perf_counter()
+                startedCPU = time.process_time()
+                text = ''.join(lines)
+                if text.strip() == METRICS_REQUEST:
+                    if self.cache is not None:
+                        STATS.setCacheStats(self.cache.getStats())
+                    writer.write((json.dumps({'ok': True, 'metrics': STATS.toPrometheus()}) + '\n').encode())
+                    await writer.drain()
+                    continue
+                # numbered as they arrive: a request that cannot be parsed is still a request served
+                self.requests += 1
+                request = self.requests
+                try:
+                    record = parseRequest(text)
+                except ValueError as e:
+                    reply = {'ok': False, 'results': None, 'errors': [f'Error: Cannot parse request: {e}']}
+                else:
+                    future = asyncio.get_running_loop().create_future()
+                    await self.queue.put((request, record, future))
+                    reply = await future
+                latency = (time.perf_counter() - started) * 1000
+                STATS.observe('request', latency / 1000, time.process_time() - startedCPU)
+                reply['latencyMs'] = round(latency, 3)
+                self.latencies.append(latency)
+                if self.options.argVerbose:
+                    print(f'Request {request}: ok = {reply["ok"]}, latency = {latency:.3f} ms', file=sys.stdout)
+                writer.write((json.dumps(reply) + '\n').encode())
+                await writer.drain()
+        except ConnectionError:
+            return
+        finally:
+            writer.close()
+
+    def reportStats(self):
+        """summarize the requests served and their latency"""
+        print(f'Requests Served = {self.requests} in {self.batches} batches', file=sys.stdout)
+        if self.latencies:
+            latencies = sorted(self.latencies)
+            p50 = latencies[len(latencies) // 2]
+            p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+            print(f'Request Latency (ms, last {len(latencies)}): p50 = {p50:.3f}, p99 = {p99:.3f}, max = {latencies[-1]:.3f}', file=sys.stdout)
+        if self.cache is not None:
+            self.cache.reportStats()
+
+    async def serve(self):
+        """listen on --port (localhost) or a unix socket until SIGINT/SIGTERM"""
+        self.queue = asyncio.Queue()
+        if self.options.argPort:
+            server = await asyncio.start_server(self.handleConnection, '127.0.0.1', self.options.argPort)
+            where = f'127.0.0.1:{self.options.argPort}'
+        else:
+            path = self.options.argSocket or defaultSocketPath()
+            if os.path.exists(path):
+                # a stale socket from an earlier run
+                os.unlink(path)
+            server = await asyncio.start_unix_server(self.handleConnection, path)
+            where = path
+        print(f'Sonar serving on {where}', file=sys.stdout, flush=True)
+        stop = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(signum, stop.set)
+        batcher = asyncio.create_task(self.batcher())
+        async with server:
+            await stop.wait()
+        batcher.cancel()
+        if not self.options.argPort:
+            os.unlink(where)
+        if self.cache is not None:
+            self.cache.close()
+            STATS.setCacheStats(self.cache.getStats())
+        self.reportStats()
+        if self.options.argProfile:
+            STATS.report(self.options)
+
+
+def serve(options):
+    """run the sizing daemon"""
+    asyncio.run(SizingServer(options).serve())
@@ -0,0 +1,216 @@
+# -*- coding: utf-8 -*-
+__author__      = "Brian Fromme"
+__copyright__   = "Copyright 2020, Gnu Public License - Version 2.0"
+__credits__     = ["Brian Fromme, Bryan Gartner, Darren Soothill"]
+__maintainer__  = "Brian Fromme"
+__status__      = "Prototype"
+"""
+@newfield description: Description
+"""
+__description__ = "Sonar inverse sizing - the most capacity or performance a chassis, drive or co-location budget can deliver"
+
+import math
+import sys
+
+from sizingdata import SizingData
+from sizingreport import openReportWriter
+from sizingstats import STATS
+
+
+# The protection schemes solved for every query: (protectionType, EC data, EC parity) - the input's own is added
+SOLVE_PROFILES = [
+    (1, 2, 1), (1, 2, 2), (1, 4, 2), (1, 6, 2), (1, 6, 3), (1, 8, 2), (1, 8, 3), (1, 8, 4), (1, 10, 4), (1, 12, 4),
+    (2, None, None), (3, None, None),
+]
+
+# How far either side of the closed-form answer the search starts: float rounding is only ever a few ulps off
+SOLVE_BRACKET = 2.0 ** -40
+
+
+def drivesNeeded(storageCapacity, fillPercent, protectionType, ecData, ecParity, driveCapacity):
+    """the drive count calculateResults arrives at - the same expressions, so the solver and the sizing agree"""
+    rawCapacity = storageCapacity / (fillPercent*100)
+    totalCapacity = ((rawCapacity / ecData) * (ecData + ecParity) if protectionType == 1 else rawCapacity * protectionType)
+    return math.ceil(totalCapacity / driveCapacity)
+
+
+def writeAmplification(protectionType, ecData, ecParity):
+    """the bytes written to the drives for each byte a client writes: k+m shards of k data, or p replicas"""
+    return ((ecData + ecParity) / ecData if protectionType == 1 else protectionType)
+
+
+def profileName(protectionType, ecData, ecParity):
+    return (f'EC {ecData}+{ecParity}' if protectionType == 1 else f'{protectionType}x replica')
+
+
+class SizingSolver:
+    """calculateResults run backwards: drives, chassis and GB/s only ever grow with storageCapacity,
+       so the largest capacity within a budget is a closed-form bound, made exact by a binary search"""
+
+    def __init__(self, sizingData, maxChassis=None, maxDrives=None):
+        'sizingData holds the validated base scenario: drive size and type, populated slots, fill and co-location'
+        self.sizingData = sizingData
+        self.maxChassis = maxChassis
+        self.maxDrives = maxDrives
+        if sizingData.sdi_Colo:
+            # co-location caps the chassis however many the budget allows
+            self.maxChassis = min(maxChassis or SizingData.SDCONST_COLOMAXNODES, SizingData.SDCONST_COLOMAXNODES)
+        if self.maxChassis is None and self.maxDrives is None:
+            raise ValueError('Inverse sizing needs a budget: --max-chassis, --max-drives or a colocation input')
+        self.solutions = []
+        self.infeasible = []
+        self.sdc_Searches = 0
+
+    def driveBudget(self, ecWidth):
+        """the most drives the budget holds, or None when the EC width does not fit in the chassis they take"""
+        slots = self.sizingData.sdi_PopulatedSlotsPerChassis
+        drives = (self.maxChassis * slots if self.maxChassis is not None else self.maxDrives)
+        if self.maxDrives is not None:
+            drives = min(drives, self.maxDrives)
+        if drives < 1:
+            return None
+        if ecWidth is not None and not ecWidth < math.ceil(drives / slots):
+            # Number of nodes too low for EC profile - and fewer drives only need fewer nodes
+            return None
+        return drives
+
+    def maxStorageCapacity(self, protectionType, ecData, ecParity, drives):
+        """the largest storageCapacity that needs no more than drives drives"""
+        base = self.sizingData
+        args = (base.sdi_MaxFillCapacityPercent, protectionType, ecData, ecParity, base.sdi_DriveCapacity)
+        overhead = writeAmplification(protectionType, ecData, ecParity)
+        # the closed form: drives * driveCapacity of total capacity, less the protection overhead
+        estimate = drives * base.sdi_DriveCapacity * (base.sdi_MaxFillCapacityPercent*100) / overhead
+        low, high = estimate * (1 - SOLVE_BRACKET), estimate * (1 + SOLVE_BRACKET)
+        while drivesNeeded(low, *args) > drives:
+            low, high = low * (1 - SOLVE_BRACKET), low
+        while drivesNeeded(high, *args) <= drives:
+            low, high = high, high * (1 + SOLVE_BRACKET)
+        # low fits and high does not: halve the gap until they are adjacent floats
+        while True:
+            middle = (low + high) / 2
+            if middle <= low or middle >= high:
+                return low
+            self.sdc_Searches += 1
+            if drivesNeeded(middle, *args) <= drives:
+                low = middle
+            else:
+                high = middle
+
+    def solveProfile(self, protectionType, ecData, ecParity):
+        """the best one protection scheme can do within the budget, sized by calculateResults; None when infeasible"""
+        drives = self.driveBudget(ecData + ecParity if protectionType == 1 else None)
+        if drives is None:
+            return None
+        storageCapacity = self.maxStorageCapacity(protectionType, ecData, ecParity, drives)
+        sizingData = self.sizingData
+        sizingData.sdi_ProtectionType = protectionType
+        if protectionType == 1:
+            sizingData.sdi_ECData = ecData
+            sizingData.sdi_ECParity = ecParity
+        sizingData.sdi_StorageCapacity = storageCapacity
+        # the answer is checked by the forward calculation, not just trusted
+        if not sizingData.calculateResults() or not self.withinBudget(sizingData):
+            return None
+        # every profile fills the budget's drives, so the raw GB/s are all alike: what a client can write is not
+        clientWriteGBs = sizingData.sdr_ExpectedPerfGBs / writeAmplification(protectionType, ecData, ecParity)
+        return {'protectionType': protectionType, 'ecProfileData': ecData, 'ecProfileParity': ecParity,
+                'storageCapacity': storageCapacity, 'clientWriteGBs': clientWriteGBs, 'results': sizingData.getResults()}
+
+    def withinBudget(self, sizingData):
+        return ((self.maxChassis is None or sizingData.sdr_BOM_NumberOfChassis <= self.maxChassis)
+                and (self.maxDrives is None or sizingData.sdr_DrivesNeeded <= self.maxDrives))
+
+    def profiles(self):
+        """SOLVE_PROFILES, plus the input's own protection scheme"""
+        base = self.sizingData
+        own = ((1, base.sdi_ECData, base.sdi_ECParity) if base.sdi_ProtectionType == 1 else (base.sdi_ProtectionType, None, None))
+        return SOLVE_PROFILES + ([own] if own not in SOLVE_PROFILES else [])
+
+    def solve(self, objective='capacity'):
+        """solve every profile; returns the feasible solutions, best first for the objective:
+           'capacity' (storageCapacity) or 'performance' (client write GB/s, after the protection's write amplification)"""
+        base = self.sizingData
+        saved = (base.sdi_ProtectionType, base.sdi_ECData, base.sdi_ECParity, base.sdi_StorageCapacity)
+        self.sdc_Searches = 0
+        self.infeasible = []
+        solutions = []
+        for profile in self.profiles():
+            solution = self.solveProfile(*profile)
+            if solution is None:
+                self.infeasible.append(profile)
+            else:
+                solutions.append(solution)
+        base.sdi_ProtectionType, base.sdi_ECData, base.sdi_ECParity, base.sdi_StorageCapacity = saved
+        # ties are broken by the other objective
+        if objective == 'performance':
+            key = lambda s: (s['clientWriteGBs'], s['storageCapacity'])
+        else:
+            key = lambda s: (s['storageCapacity'], s['clientWriteGBs'])
+        self.solutions = sorted(solutions, key=key, reverse=True)
+        return self.solutions
+
+    def budgetDescription(self):
+        limits = []
+        if self.maxChassis is not None:
+            limits.append(f'{self.maxChassis} chassis')
+        if self.maxDrives is not None:
+            limits.append(f'{self.maxDrives} drives')
+        return ' and '.join(limits)
+
+    def getResults(self, objective):
+        """the solutions, best first, and the infeasible protection schemes"""
+        base = self.sizingData
+        return {'objective': objective, 'maxChassis': self.maxChassis, 'maxDrives': self.maxDrives,
+                'driveCapacity': base.sdi_DriveCapacity, 'driveType': ('SSD' if base.sdi_DriveTypeSSD else 'HDD'),
+                'populatedSlotsPerChassis': base.sdi_PopulatedSlotsPerChassis, 'maxFillCapacity': base.sdi_MaxFillCapacityPercent,
+                'solutions': [{'profile': profileName(solution['protectionType'], solution['ecProfileData'], solution['ecProfileParity']),
+                               'storageCapacity': solution['storageCapacity'], 'clientWriteGBs': solution['clientWriteGBs'],
+                               'expectedPerfGBs': solution['results']['sdr_ExpectedPerfGBs'],
+                               'chassis': solution['results']['sdr_BOM_NumberOfChassis'],
+                               'drives': solution['results']['sdr_DrivesNeeded'],
+                               'rawCapacity': solution['results']['sdr_RawCapacity']}
+                              for solution in self.solutions],
+                'infeasible': [profileName(*profile) for profile in self.infeasible]}
+
+    def reportLines(self, objective):
+        """the text report: one protection scheme per line, best first"""
+        base = self.sizingData
+        lines = [f'Inverse Sizing: maximum {objective} within {self.budgetDescription()} '
+                 f'({base.sdi_DriveCapacity} TB {"SSD" if base.sdi_DriveTypeSSD else "HDD"}, '
+                 f'{base.sdi_PopulatedSlotsPerChassis} Populated Slots, {base.sdi_MaxFillCapacityPercent}% Fill)']
+        for solution in self.solutions:
+            results = solution['results']
+            lines.append(f'{profileName(solution["protectionType"], solution["ecProfileData"], solution["ecProfileParity"])}: '
+                         f'Storage Capacity = {solution["storageCapacity"]}, '
+                         f'Client Write Performance (GB/s) = {solution["clientWriteGBs"]:.3f}, '
+                         f'Expected Performance (GB/s) = {results["sdr_ExpectedPerfGBs"]}, '
+                         f'Chassis = {results["sdr_BOM_NumberOfChassis"]}, Drives = {results["sdr_DrivesNeeded"]}, '
+                         f'Raw Capacity = {results["sdr_RawCapacity"]}')
+        for profile in self.infeasible:
+            lines.append(f'{profileName(*profile)}: Not feasible within {self.budgetDescription()}')
+        return lines
+
+    def reportSolutions(self, options):
+        """write the solutions, in --format, to --output"""
+        writer = openReportWriter(options)
+        writer.writeReport('solve', self.getResults(options.argSolve), self.reportLines(options.argSolve))
+        writer.close()
+
+
+def solveSizing(options):
+    """size the base scenario from --input backwards: the most each protection scheme delivers within the budget"""
+    sizingData = SizingData(options)
+    if not sizingData.readYAMLInput():
+        return False
+    if not sizingData.validateSizingData():
+        return False
+    try:
+        solver = SizingSolver(sizingData, options.argMaxChassis, options.argMaxDrives)
+    except ValueError as e:
+        print (f'Error: {e}', file=sys.stderr)
+        return False
+    with STATS.stage('solve'):
+        solver.solve(options.argSolve)
+    solver.reportSolutions(options)
+    return True
@@ -0,0 +1,192 @@
+# -*- coding: utf-8 -*-
+__author__      = "Brian Fromme"
+__copyright__   = "Copyright 2020, Gnu Public License - Version 2.0"
+__credits__     = ["Brian Fromme, Bryan Gartner, Darren Soothill"]
+__maintainer__  = "Brian Fromme"
+__status__      = "Prototype"
+"""
+@newfield description: Description
+"""
+__description__ = "Sonar instrumentation - stage timings, histograms and their export"
+
+import sys
+import time
+
+# Histogram bucket upper bounds, in seconds (Prometheus 'le' buckets; +Inf is implied)
+HISTOGRAM_BUCKETS = [1e-6, 2.5e-6, 5e-6, 1e-5, 2.5e-5, 5e-5, 1e-4, 2.5e-4, 5e-4,
+                     1e-3, 2.5e-3, 5e-3, 1e-2, 2.5e-2, 5e-2, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0]
+
+
+class StageStats:
+    """what one stage has done: calls, records, wall and CPU time, and a wall-time histogram"""
+    __slots__ = ('count', 'records', 'wall', 'cpu', 'buckets')
+
+    def __init__(self):
+        self.count = 0
+        self.records = 0
+        self.wall = 0.0
+        self.cpu = 0.0
+        self.buckets = [0] * (len(HISTOGRAM_BUCKETS) + 1)
+
+    def observe(self, wall, cpu, records):
+        self.count += 1
+        self.records += records
+        self.wall += wall
+        self.cpu += cpu
+        for bucket, bound in enumerate(HISTOGRAM_BUCKETS):
+            if wall <= bound:
+                break
+        else:
+            bucket = len(HISTOGRAM_BUCKETS)
+        self.buckets[bucket] += 1
+
+    def merge(self, state):
+        """add in the state of another StageStats (see getState), eg: from a pool worker"""
+        count, records, wall, cpu, buckets = state
+        self.count += count
+        self.records += records
+        self.wall += wall
+        self.cpu += cpu
+        self.buckets = [mine + theirs for mine, theirs in zip(self.buckets, buckets)]
+
+    def getState(self):
+        return (self.count, self.records, self.wall, self.cpu, list(self.buckets))
+
+    def quantile(self, q):
+        """estimate a wall-time quantile as the upper bound of the bucket it falls in"""
+        target = q * self.count
+        seen = 0
+        for bucket, hits in enumerate(self.buckets):
+            seen += hits
+            if hits and seen >= target:
+                return (HISTOGRAM_BUCKETS[bucket] if bucket < len(HISTOGRAM_BUCKETS) else float('inf'))
+        return 0.0
+
+
+class StageTimer:
+    """context manager timing one pass through a stage"""
+    __slots__ = ('stats', 'name', 'records', 'wall', 'cpu')
+
+    def __init__(self, stats, name, records):
+        self.stats = stats
+        self.name = name
+        self.records = records
+
+    def __enter__(self):
+        self.wall = time.perf_counter()
+        self.cpu = time.process_time()
+        return self
+
+    def __exit__(self, excType, excValue, traceback):
+        self.stats.observe(self.name, time.perf_counter() - self.wall, time.process_time() - self.cpu, self.records)
+        return False
+
+
+class NullTimer:
+    """what stage() hands out when instrumentation is off: costs next to nothing"""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, excType, excValue, traceback):
+        return False
+
+
+NULL_TIMER = NullTimer()
+
+
+class SizingStats:
+    """per-stage timings for a run; off (and nearly free) unless enabled by --profile"""
+
+    def __init__(self):
+        self.enabled = False
+        self.stages = {}
+        self.cacheStats = {}
+        self.started = time.perf_counter()
+
+    def enable(self):
+        self.enabled = True
+
+    def stage(self, name, records=1):
+        """with STATS.stage('calculateResults'): ... times the block as one pass through the stage"""
+        if not self.enabled:
+            return NULL_TIMER
+        return StageTimer(self, name, records)
+
+    def observe(self, name, wall, cpu, records=1):
+        """record one pass through a stage that was timed elsewhere"""
+        stage = self.stages.get(name)
+        if stage is None:
+            stage = self.stages[name] = StageStats()
+        stage.observe(wall, cpu, records)
+
+    def setCacheStats(self, cacheStats):
+        self.cacheStats = dict(cacheStats)
+
+    def drain(self):
+        """hand over (and forget) everything recorded so far - workers send this back with their results"""
+        state = {name: stage.getState() for name, stage in self.stages.items()}
+        self.stages = {}
+        return state
+
+    def merge(self, state):
+        """add in what another process recorded (from drain)"""
+        for name, stageState in state.items():
+            stage = self.stages.get(name)
+            if stage is None:
+                stage = self.stages[name] = StageStats()
+            stage.merge(stageState)
+
+    def toJSON(self):
+        """the summary as a JSON document"""
+        import json
+        stages = {}
+        for name, stage in self.stages.items():
+            stages[name] = {'count': stage.count, 'records': stage.records,
+                            'wallSeconds': stage.wall, 'cpuSeconds': stage.cpu,
+                            'meanSeconds': (stage.wall / stage.count if stage.count else 0.0),
+                            'p50Seconds': stage.quantile(0.5), 'p99Seconds': stage.quantile(0.99),
+                            'buckets': dict(zip([str(bound) for bound in HISTOGRAM_BUCKETS] + ['+Inf'], stage.buckets))}
+        return json.dumps({'elapsedSeconds': time.perf_counter() - self.started, 'stages': stages,
+                           'cache': self.cacheStats}, indent=2)
+
+    def toPrometheus(self):
+        """the summary in the Prometheus text exposition format"""
+        lines = ['# HELP sonar_stage_seconds Wall time spent in each sizing stage.',
+                 '# TYPE sonar_stage_seconds histogram']
+        for name, stage in self.stages.items():
+            cumulative = 0
+            for bound, hits in zip(HISTOGRAM_BUCKETS, stage.buckets):
+                cumulative += hits
+                lines.append(f'sonar_stage_seconds_bucket{{stage="{name}",le="{bound}"}} {cumulative}')
+            lines.append(f'sonar_stage_seconds_bucket{{stage="{name}",le="+Inf"}} {stage.count}')
+            lines.append(f'sonar_stage_seconds_sum{{stage="{name}"}} {stage.wall}')
+            lines.append(f'sonar_stage_seconds_count{{stage="{name}"}} {stage.count}')
+        lines += ['# HELP sonar_stage_cpu_seconds_total CPU time spent in each sizing stage.',
+                  '# TYPE sonar_stage_cpu_seconds_total counter']
+        lines += [f'sonar_stage_cpu_seconds_total{{stage="{name}"}} {stage.cpu}' for name, stage in self.stages.items()]
+        lines += ['# HELP sonar_stage_records_total Scenarios handled by each sizing stage.',
+                  '# TYPE sonar_stage_records_total counter']
+        lines += [f'sonar_stage_records_total{{stage="{name}"}} {stage.records}' for name, stage in self.stages.items()]
+        if self.cacheStats:
+            lines += ['# HELP sonar_cache_events_total Result cache counters.',
+                      '# TYPE sonar_cache_events_total counter']
+            lines += [f'sonar_cache_events_total{{event="{name}"}} {value}' for name, value in self.cacheStats.items() if name != 'entries']
+            if 'entries' in self.cacheStats:
+                lines += ['# HELP sonar_cache_entries Results held in the in-memory cache.',
+                          '# TYPE sonar_cache_entries gauge',
+                          f'sonar_cache_entries {self.cacheStats["entries"]}']
+        return '\n'.join(lines) + '\n'
+
+    def report(self, options):
+        """write the summary in the --profile format to --profile-output (default: stderr)"""
+        text = (self.toPrometheus() if options.argProfile == 'prometheus' else self.toJSON() + '\n')
+        if options.argProfileOutput == '-':
+            sys.stderr.write(text)
+        else:
+            with open(options.argProfileOutput, 'w') as f:
+                f.write(text)
+
+
+# The one instance every module records into
+STATS = SizingStats()
@@ -0,0 +1,153 @@
+# -*- coding: utf-8 -*-
+__author__      = "Brian Fromme"
+__copyright__   = "Copyright 2020, Gnu Public License - Version 2.0"
+__credits__     = ["Brian Fromme, Bryan Gartner, Darren Soothill"]
+__maintainer__  = "Brian Fromme"
+__status__      = "Prototype"
+"""
+@newfield description: Description
+"""
+__description__ = "Sonar streaming input - size many scenarios from one multi-document input"
+
+import json
+import os.path
+import sys
+import time
+
+from sizingcache import SizingCache
+from sizingcatalog import loadCatalog
+from sizingdata import SizingData
+from sizinginput import loadAllYAML
+from sizingreport import openReportWriter
+from sizingstats import STATS
+
+
+def inputFormat(options):
+    """work out the stream format: an explicit --input-format wins, else go by the file extension"""
+    if options.argInputFormat != 'auto':
+        return options.argInputFormat
+    extension = os.path.splitext(options.argInput)[1].lower()
+    return ('jsonl' if extension in ('.jsonl', '.ndjson') else 'yaml')
+
+
+def readJSONLines(f):
+    """yield one record per non-blank line; a bad line is reported and skipped"""
+    for lineNumber, line in enumerate(f, 1):
+        if not line.strip():
+            continue
+        try:
+            yield json.loads(line)
+        except json.JSONDecodeError as e:
+            print (f'Error: Cannot parse JSON on line {lineNumber}: {e}', file=sys.stderr)
+
+
+def readScenarios(options, f):
+    """yield the input records of a stream one at a time - nothing is read ahead"""
+    if inputFormat(options) == 'jsonl':
+        yield from readJSONLines(f)
+    else:
+        # loadAllYAML parses lazily, one '---' document per iteration; yaml is only imported for a yaml stream
+        import yaml
+        try:
+            yield from loadAllYAML(f)
+        except yaml.YAMLError as e:
+            # a yaml syntax error leaves the parser without a safe place to resume
+            print (f'Error: Cannot parse yaml input: {e}', file=sys.stderr)
+
+
+def timedScenarios(scenarios):
+    """time the parsing of each record as the readInput stage"""
+    iterator = iter(scenarios)
+    finished = object()
+    while True:
+        wall = time.perf_counter()
+        cpu = time.process_time()
+        record = next(iterator, finished)
+        # the last pass only finds the end of the input - it is timed, but is not a record
+        STATS.observe('readInput', time.perf_counter() - wall, time.process_time() - cpu, int(record is not finished))
+        if record is finished:
+            return
+        yield record
+
+
+def openInput(options):
+    """open the stream input - '-' means stdin"""
+    if options.argInput == '-':
+        return sys.stdin
+    if not os.path.isfile(options.argInput):
+        print (f'Error: Cannot find input: {options.argInput}', file=sys.stderr)
+        return None
+    return open(options.argInput, 'r')
+
+
+def loadRecord(sizingData, index, record):
+    """load and validate one scenario; errors are reported and False returned"""
+    if not sizingData.loadSizingRecord(record):
+        print (f'Error: Scenario {index} is not a set of sizing inputs: {record}', file=sys.stderr)
+        return False
+    with STATS.stage('validateSizingData'):
+        validated = sizingData.validateSizingData()
+    if not validated:
+        print (f'Error: Scenario {index} failed validation', file=sys.stderr)
+        return False
+    if sizingData.options.argDebug:
+        sizingData.printSizingData()
+    return True
+
+
+def sizeRecord(sizingData, index, record, cache=None):
+    """validate and size one scenario (through the cache, if any); errors are reported and False returned"""
+    try:
+        if not loadRecord(sizingData, index, record):
+            return False
+        with STATS.stage('calculateResults'):
+            if cache is not None:
+                cache.calculateResults(sizingData)
+            else:
+                sizingData.calculateResults()
+    except (AttributeError, TypeError, ValueError, ZeroDivisionError) as e:
+        # one malformed scenario must not end a long stream
+        print (f'Error: Scenario {index} cannot be sized: {e}', file=sys.stderr)
+        return False
+    return True
+
+
+def sizeStream(options):
+    """validate, size and report each scenario as it is read; returns the number of scenarios sized"""
+    f = openInput(options)
+    if f is None:
+        return 0
+    # one SizingData is reused for every record, so memory stays flat however long the stream is
+    sizingData = SizingData(options)
+    cache = SizingCache.fromOptions(options)
+    table = None
+    if options.argSaveTable:
+        from sizingresults import SizingResultTableBuilder
+        table = SizingResultTableBuilder(categories=loadCatalog(options.argCatalog).categories)
+    writer = openReportWriter(options, batch=True)
+    sized = 0
+    try:
+        scenarios = readScenarios(options, f)
+        if STATS.enabled:
+            scenarios = timedScenarios(scenarios)
+        for index, record in enumerate(scenarios, 1):
+            if options.argVerbose:
+                print (f'Sizing scenario {index}', file=sys.stdout)
+            if sizeRecord(sizingData, index, record, cache):
+                with STATS.stage('reportSizingResults'):
+                    writer.writeScenario(sizingData, index)
+                if table is not None:
+                    table.append(sizingData.getResults())
+                sized += 1
+    finally:
+        writer.close()
+        if f is not sys.stdin:
+            f.close()
+        if cache is not None:
+            cache.close()
+            STATS.setCacheStats(cache.getStats())
+            if options.argVerbose:
+                cache.reportStats()
+    if table is not None:
+        table.toTable().save(options.argSaveTable)
+    return sized
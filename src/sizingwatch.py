@@ -0,0 +1,299 @@
+# -*- coding: utf-8 -*-
+__author__      = "Brian Fromme"
+__copyright__   = "Copyright 2020, Gnu Public License - Version 2.0"
+__credits__     = ["Brian Fromme, Bryan Gartner, Darren Soothill"]
+__maintainer__  = "Brian Fromme"
+__status__      = "Prototype"
+"""
+@newfield description: Description
+"""
+__description__ = "Sonar watch mode - re-size the input each time it is saved, and print what changed"
+
+import os
+import re
+import select
+import struct
+import sys
+import time
+
+from sizingdata import SizingData
+from sizinggraph import SizingGraph
+from sizinginput import parseText
+from sizingreport import openReportWriter
+from sizingstats import STATS
+
+# inotify flags (linux/inotify.h): a finished write, and a file renamed or created in the directory -
+# editors that save by writing a new file and renaming it over the old one only ever show the last two
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_Q_OVERFLOW = 0x00004000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+INOTIFY_EVENT = struct.Struct('iIII')
+# Events closer together than this are one save (seconds): a save is often a create, writes and a close
+WATCH_SETTLE = 0.02
+# How often the polling fallback looks at the file (seconds)
+WATCH_POLL_INTERVAL = 0.25
+# A yaml document starts at a '---' line
+DOCUMENT_START = re.compile(r'^---(?=\s|$)', re.MULTILINE)
+
+
+class InotifyWatcher:
+    """wait for the input file to change, by inotify on its directory (linux only: raises OSError elsewhere)"""
+    method = 'inotify'
+
+    def __init__(self, path):
+        import ctypes
+        try:
+            libc = ctypes.CDLL(None, use_errno=True)
+            init, addWatch = libc.inotify_init1, libc.inotify_add_watch
+        except (OSError, AttributeError) as e:
+            raise OSError(f'inotify is not available: {e}') from e
+        self.name = os.path.basename(path).encode()
+        self.fd = init(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), 'inotify_init1 failed')
+        if addWatch(self.fd, os.path.dirname(os.path.abspath(path)).encode(), IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE) < 0:
+            errno = ctypes.get_errno()
+            os.close(self.fd)
+            raise OSError(errno, 'inotify_add_watch failed')
+
+    def readEvents(self, timeout):
+        """True when an event for the input arrives within timeout seconds (None waits for ever)"""
+        if not select.select([self.fd], [], [], timeout)[0]:
+            return False
+        try:
+            buffer = os.read(self.fd, 1 << 16)
+        except BlockingIOError:
+            return False
+        changed = False
+        offset = 0
+        while offset < len(buffer):
+            wd, mask, cookie, length = INOTIFY_EVENT.unpack_from(buffer, offset)
+            name = buffer[offset + INOTIFY_EVENT.size:offset + INOTIFY_EVENT.size + length].rstrip(b'\0')
+            # an overflowed queue may have lost the input's own event
+            changed |= (name == self.name or bool(mask & IN_Q_OVERFLOW))
+            offset += INOTIFY_EVENT.size + length
+        return changed
+
+    def wait(self):
+        """return once the input has changed, and its events have settled"""
+        while not self.readEvents(None):
+            pass
+        while self.readEvents(WATCH_SETTLE):
+            pass
+
+    def close(self):
+        os.close(self.fd)
+
+
+class PollingWatcher:
+    """wait for the input file to change, by looking at its mtime and size every WATCH_POLL_INTERVAL"""
+    method = 'polling'
+
+    def __init__(self, path):
+        self.path = path
+        self.signature = self.stat()
+
+    def stat(self):
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return None
+        return (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+
+    def wait(self):
+        while True:
+            time.sleep(WATCH_POLL_INTERVAL)
+            signature = self.stat()
+            if signature != self.signature:
+                self.signature = signature
+                return
+
+    def close(self):
+        pass
+
+
+def openWatcher(path):
+    """inotify when the platform has it, else polling"""
+    try:
+        return InotifyWatcher(path)
+    except OSError:
+        return PollingWatcher(path)
+
+
+def splitDocuments(text):
+    """the yaml documents of an input, as text: a single-document input is one document"""
+    starts = [match.start() for match in DOCUMENT_START.finditer(text)]
+    bounds = [0] + starts + [len(text)]
+    return [text[start:end] for start, end in zip(bounds[:-1], bounds[1:])]
+
+
+class InputWatch:
+    """the sized scenarios of one input, kept up to date as it changes: only the documents whose text changed
+       are parsed again, and each scenario's SizingGraph recomputes only what its changed inputs reach"""
+
+    def __init__(self, options):
+        self.options = options
+        self.sizingData = SizingData(options)
+        self.documents = {}       # document text -> parsed record, for the input as last read
+        self.records = []         # the input records (documents that are not empty), in order
+        self.graphs = []          # a SizingGraph per record; None while the record has never validated
+        self.text = None
+        self.sdc_Parsed = 0
+
+    def readInput(self):
+        """the input file's text, or None (reported) when it cannot be read"""
+        try:
+            with open(self.options.argInput, 'r') as f:
+                return f.read()
+        except OSError as e:
+            print (f'Error: Cannot read input: {self.options.argInput}: {e}', file=sys.stderr)
+            return None
+
+    def parseRecords(self, text):
+        """the records of the input text, parsing only documents not seen last time; None (reported) on a parse error"""
+        documents = {}
+        records = []
+        for document in splitDocuments(text):
+            if document in documents:
+                record = documents[document]
+            elif document in self.documents:
+                record = documents[document] = self.documents[document]
+            else:
+                try:
+                    record = documents[document] = parseText(document)
+                except ValueError as e:
+                    print (f'Error: Cannot parse yaml input: {self.options.argInput}: {e}', file=sys.stderr)
+                    return None
+                self.sdc_Parsed += 1
+            # a document of only comments parses to nothing
+            if record is not None:
+                records.append(record)
+        self.documents = documents
+        return records
+
+    def sizeRecord(self, index, record):
+        """validate one record and bring its graph up to date; returns (graph, changes), changes None for a new graph.
+           A record that does not validate keeps its previous results: (None, None)"""
+        sizingData = self.sizingData
+        if not sizingData.loadSizingRecord(record):
+            print (f'Error: Scenario {index + 1} is not a set of sizing inputs: {record}', file=sys.stderr)
+            return None, None
+        if not sizingData.validateSizingData():
+            print (f'Error: Scenario {index + 1} failed validation - its previous results are kept', file=sys.stderr)
+            return None, None
+        graph = (self.graphs[index] if index < len(self.graphs) else None)
+        try:
+            if graph is None:
+                graph = SizingGraph(sizingData)
+                # as calculateResults reports them
+                for message in graph.getErrorMessages():
+                    print(message, file=sys.stderr)
+                return graph, None
+            graph.loadInputs(sizingData)
+            return graph, graph.recompute()
+        except (AttributeError, TypeError, ValueError, ZeroDivisionError) as e:
+            print (f'Error: Scenario {index + 1} cannot be sized: {e}', file=sys.stderr)
+            return None, None
+
+    def update(self):
+        """read the input again and re-size what changed; returns {scenario index: changes} (None: a new scenario),
+           or None when the input is unchanged or cannot be used"""
+        text = self.readInput()
+        if text is None or text == self.text:
+            return None
+        records = self.parseRecords(text)
+        if records is None:
+            return None
+        self.text = text
+        updates = {}
+        for index, record in enumerate(records):
+            if index < len(self.records) and record == self.records[index] and self.graphs[index] is not None:
+                continue
+            graph, changes = self.sizeRecord(index, record)
+            if graph is None:
+                if index >= len(self.graphs):
+                    self.graphs.append(None)
+                continue
+            if index < len(self.graphs):
+                self.graphs[index] = graph
+            else:
+                self.graphs.append(graph)
+            updates[index] = changes
+        del self.graphs[len(records):]
+        self.records = records
+        return updates
+
+    def writeReport(self):
+        """the full report of every sized scenario, to --output"""
+        writer = openReportWriter(self.options, batch=len(self.graphs) > 1)
+        reporter = SizingData(self.options)
+        for index, graph in enumerate(self.graphs, 1):
+            if graph is not None:
+                reporter.sizingData = self.records[index - 1]
+                reporter.setResults(graph.getResults())
+                writer.writeScenario(reporter, index)
+        writer.close()
+
+    def reportChanges(self, updates, removed, elapsed):
+        """print the report lines each update changed, as 'Label = old -> new' under their section"""
+        print(f'[{time.strftime("%H:%M:%S")}] {self.options.argInput} changed ({elapsed * 1000:.1f} ms)')
+        several = len(self.graphs) > 1
+        for index, changes in sorted(updates.items()):
+            prefix = (f'Scenario {index + 1}: ' if several else '')
+            if changes is None:
+                print(f'{prefix}New scenario, Number of Chassis = {self.graphs[index].values["sdr_BOM_NumberOfChassis"]}')
+                continue
+            lines = 0
+            for section, sectionLines in SizingData.SDREPORT:
+                changed = [(label, changes[name]) for label, name in sectionLines if name in changes]
+                if changed:
+                    print(f'{prefix}{section}:')
+                    for label, (old, new) in changed:
+                        print(f'  {label} = {old} -> {new}')
+                    lines += len(changed)
+            if 'sdc_ECError' in changes or 'sdc_ColoError' in changes:
+                for message in (self.graphs[index].getErrorMessages() or ['No computational errors']):
+                    print(f'{prefix}{message}')
+            elif not lines:
+                print(f'{prefix}No change to the results')
+        for index in removed:
+            print(f'Scenario {index + 1}: Removed')
+        if not updates and not removed:
+            print('No change to the results')
+        sys.stdout.flush()
+
+
+def watchInput(options):
+    """size --input, then keep re-sizing it each time it is saved, printing only what changed; ends on Ctrl-C"""
+    if options.argInput == '-' or not os.path.isfile(options.argInput):
+        print (f'Error: Cannot watch input: {options.argInput}', file=sys.stderr)
+        return False
+    watch = InputWatch(options)
+    with STATS.stage('watchStart'):
+        watch.update()
+        watch.writeReport()
+    watcher = openWatcher(options.argInput)
+    if options.argOutput != '-' or options.argVerbose:
+        print(f'Watching {options.argInput} ({watcher.method}), {len(watch.graphs)} scenario(s) sized into {options.argOutput}')
+    sys.stdout.flush()
+    try:
+        while True:
+            watcher.wait()
+            started = time.perf_counter()
+            scenarios = len(watch.graphs)
+            with STATS.stage('watchUpdate'):
+                updates = watch.update()
+                if updates is None:
+                    continue
+                # the output file stays the full report; stdout gets the changes
+                if options.argOutput != '-':
+                    watch.writeReport()
+            watch.reportChanges(updates, range(len(watch.graphs), scenarios), time.perf_counter() - started)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        watcher.close()
+    return True
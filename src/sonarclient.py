@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+__author__      = "Brian Fromme"
+__copyright__   = "Copyright 2020, Gnu Public License - Version 2.0"
+__credits__     = ["Brian Fromme, Bryan Gartner, Darren Soothill"]
+__maintainer__  = "Brian Fromme"
+__status__      = "Prototype"
+"""
+@newfield description: Description
+"""
+__description__ = "Sonar thin client - size through a running 'main.py serve' daemon"
+
+import json
+import os.path
+import socket
+import sys
+
+from cmdline import Options
+from sonarprotocol import END_OF_REQUEST, METRICS_REQUEST, defaultSocketPath
+
+## NOTE: the sizing modules are imported only where they are used - the client must start faster than main.py
+
+
+def connect(options):
+    """connect to the daemon, or return None when it is not running"""
+    try:
+        if options.argPort:
+            return socket.create_connection(('127.0.0.1', options.argPort))
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.connect(options.argSocket or defaultSocketPath())
+        return sock
+    except OSError:
+        return None
+
+
+def requestSizing(sock, text):
+    """send one sizing document and return the decoded reply"""
+    sock.sendall((text.rstrip('\n') + f'\n{END_OF_REQUEST}\n').encode())
+    reply = b''
+    while not reply.endswith(b'\n'):
+        data = sock.recv(65536)
+        if not data:
+            raise ConnectionError('sonar daemon closed the connection')
+        reply += data
+    return json.loads(reply)
+
+
+def requestMetrics(sock):
+    """the daemon's stage timings, in Prometheus text format"""
+    return requestSizing(sock, METRICS_REQUEST)['metrics']
+
+
+def main():
+    """same command line and report as main.py, but the sizing is done by the daemon"""
+    opts = Options()
+    opts.parseCommandLine()
+    sock = connect(opts)
+    if sock is None:
+        # no daemon: size locally, so scripts keep working either way
+        if opts.argVerbose:
+            print (f'No sonar daemon, sizing locally', file=sys.stdout)
+        import main as localMain
+        opts.exiting = True
+        localMain.main()
+        return
+    opts.displayFiles()
+    if not os.path.isfile(opts.argInput):
+        print (f'Error: Cannot find yaml input: {opts.argInput}', file=sys.stderr)
+    else:
+        with open(opts.argInput, 'r') as f, sock:
+            reply = requestSizing(sock, f.read())
+        for message in reply['errors']:
+            print(message, file=sys.stderr)
+        if opts.argVerbose:
+            print (f'Daemon latency: {reply["latencyMs"]} ms', file=sys.stdout)
+        if reply['results'] is not None:
+            from sizingdata import SizingData
+            from sizingreport import openReportWriter
+            sizingData = SizingData(opts)
+            # the daemon parsed the input; the report only needs to know there was some
+            sizingData.sizingData = {}
+            sizingData.setResults(reply['results'])
+            writer = openReportWriter(opts)
+            writer.writeScenario(sizingData)
+            writer.close()
+    opts.exiting = True
+
+
+if __name__ == "__main__":
+    main()
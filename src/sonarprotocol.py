@@ -0,0 +1,29 @@
+# -*- coding: utf-8 -*-
+__author__      = "Brian Fromme"
+__copyright__   = "Copyright 2020, Gnu Public License - Version 2.0"
+__credits__     = ["Brian Fromme, Bryan Gartner, Darren Soothill"]
+__maintainer__  = "Brian Fromme"
+__status__      = "Prototype"
+"""
+@newfield description: Description
+"""
+__description__ = "Sonar daemon protocol - what 'main.py serve' and the thin client share"
+
+import os
+
+## NOTE: the thin client imports this module on every run - it must not import anything slow (not even tempfile)
+
+## Protocol: a request is one sizing document, in the sonar-input.yaml schema (yaml or JSON),
+## followed by a line holding only '...' (the yaml end-of-document marker).
+## The reply is one line of JSON: {"ok", "results", "errors", "latencyMs"}.
+## A connection may carry any number of requests, answered in order.
+## The request 'metrics' instead replies {"ok", "metrics"}, with the stage timings in Prometheus text format.
+END_OF_REQUEST = '...'
+METRICS_REQUEST = 'metrics'
+
+
+def defaultSocketPath():
+    """the unix socket both 'serve' and the client use when neither --socket nor --port is given:
+       in the first of $TMPDIR, $TEMP and $TMP that is set, else /tmp"""
+    directory = next((os.environ[name] for name in ('TMPDIR', 'TEMP', 'TMP') if os.environ.get(name)), '/tmp')
+    return os.path.join(directory, f'sonar-{os.getuid()}.sock')
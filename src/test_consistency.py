@@ -0,0 +1,109 @@
+# -*- coding: utf-8 -*-
+__author__      = "Brian Fromme"
+__copyright__   = "Copyright 2020, Gnu Public License - Version 2.0"
+__credits__     = ["Brian Fromme, Bryan Gartner, Darren Soothill"]
+__maintainer__  = "Brian Fromme"
+__status__      = "Prototype"
+"""
+@newfield description: Description
+"""
+__description__ = "Sonar consistency tests - the scalar, batch and graph sizing agree on randomized inputs (run: python -m pytest)"
+
+import contextlib
+import io
+import random
+
+from cmdline import Options
+from sizingbatch import SizingBatch
+from sizingdata import SizingData
+from sizinggraph import SizingGraph
+
+## NOTE: calculateResults, SizingBatch and SIZING_NODES each hold the sizing formulas -
+##       a change to one that is not made to the others fails here
+
+CONSISTENCY_RECORDS = 2000
+CONSISTENCY_SEED = 2020
+
+
+def randomRecords(count, seed):
+    """count valid input records, spread wide enough to reach the EC and co-location errors"""
+    rng = random.Random(seed)
+    records = []
+    for _ in range(count):
+        slots = rng.choice([12, 16, 24, 36, 60])
+        record = {'colocation': rng.random() < 0.5,
+                  'useCase': rng.choice(['mixed', 'archive', 'Mixed', 'ARCHIVE']),
+                  'storageCapacity': rng.choice([rng.uniform(1, 1e5), rng.uniform(1e5, 1e8), rng.randint(1, 10 ** 8)]),
+                  'metaDataCapacity': rng.choice([0, rng.uniform(0, 1000)]),
+                  'driveCapacity': rng.choice([1, 2.4, 4, 7.68, 8, 12, 15.36, 16, 18, 20, rng.uniform(0.5, 30)]),
+                  'drivesPerChassis': slots,
+                  'populatedSlotsPerChassis': rng.randint(1, slots),
+                  'nvmeSlotsPerChassis': rng.randint(0, 8),
+                  'driveType': rng.choice(['HDD', 'SSD', 'hdd', 'ssd']),
+                  'maxFillCapacity': rng.choice([rng.randint(1, 100), rng.uniform(1, 100)]),
+                  'nvmeRatio': rng.randint(1, 16),
+                  'protectionType': rng.randint(1, 6),
+                  'ecProfileData': rng.randint(1, 16),
+                  'ecProfileParity': rng.randint(1, 6)}
+        # leave some optional inputs to their defaults
+        for name in rng.sample(['useCase', 'metaDataCapacity', 'nvmeSlotsPerChassis', 'nvmeRatio', 'ecProfileData'], rng.randint(0, 2)):
+            del record[name]
+        records.append(record)
+    return records
+
+
+@contextlib.contextmanager
+def quiet():
+    """keep the error messages the sizing prints out of the test output"""
+    with contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(io.StringIO()):
+        yield
+
+
+def scalarResults(sizingData, record):
+    """calculateResults of one record, or None when it does not validate"""
+    if not sizingData.loadSizingRecord(record) or not sizingData.validateSizingData():
+        return None
+    sizingData.calculateResults()
+    return sizingData.getResults()
+
+
+def mismatches(expected, actual):
+    return {name: (value, actual.get(name)) for name, value in expected.items() if actual.get(name) != value}
+
+
+def test_scalar_batch_graph_agree():
+    records = randomRecords(CONSISTENCY_RECORDS, CONSISTENCY_SEED)
+    sizingData = SizingData(Options())
+    with quiet():
+        batch = SizingBatch.fromRecords(records)
+        batch.calculateResults()
+        sized = 0
+        for index, record in enumerate(records):
+            expected = scalarResults(sizingData, record)
+            assert (expected is not None) == bool(batch.sdc_Valid[index]), f'record {index} validates differently: {record}'
+            if expected is None:
+                continue
+            sized += 1
+            assert not mismatches(expected, batch.getResults(index)), f'batch, record {index}: {record}'
+            assert not mismatches(expected, SizingGraph(sizingData).getResults()), f'graph, record {index}: {record}'
+    assert sized > CONSISTENCY_RECORDS // 2
+    # the randomized inputs reach every outcome
+    assert (batch.sdc_ECError & batch.sdc_Valid).any() and (batch.sdc_ColoError & batch.sdc_Valid).any()
+
+
+def test_graph_recompute_agrees():
+    # one graph, updated record by record: only what each change reaches is recomputed
+    records = randomRecords(CONSISTENCY_RECORDS // 4, CONSISTENCY_SEED + 1)
+    sizingData = SizingData(Options())
+    graph = None
+    with quiet():
+        for index, record in enumerate(records):
+            expected = scalarResults(sizingData, record)
+            if expected is None:
+                continue
+            if graph is None:
+                graph = SizingGraph(sizingData)
+            else:
+                graph.loadInputs(sizingData)
+                graph.recompute()
+            assert not mismatches(expected, graph.getResults()), f'graph recompute, record {index}: {record}'
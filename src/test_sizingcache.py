@@ -0,0 +1,54 @@
+# -*- coding: utf-8 -*-
+__author__      = "Brian Fromme"
+__copyright__   = "Copyright 2020, Gnu Public License - Version 2.0"
+__credits__     = ["Brian Fromme, Bryan Gartner, Darren Soothill"]
+__maintainer__  = "Brian Fromme"
+__status__      = "Prototype"
+"""
+@newfield description: Description
+"""
+__description__ = "Sonar result cache tests - the sqlite file only keeps results of the same sizing rules (run: python -m pytest)"
+
+import cmdline
+from sizingcache import SizingCache
+from sizingdata import SizingData
+
+CACHE_KEY = '[2000, 16]'
+CACHE_RESULTS = {'sdr_RawCapacity': 0.25, 'sdc_ErrorMessages': []}
+
+
+def fillCache(path, catalogFingerprint=''):
+    cache = SizingCache(16, str(path), catalogFingerprint)
+    cache.put(CACHE_KEY, CACHE_RESULTS)
+    cache.close()
+
+
+def readCache(path, catalogFingerprint=''):
+    # an empty LRU: whatever comes back was read from the file
+    cache = SizingCache(16, str(path), catalogFingerprint)
+    try:
+        return cache.get(CACHE_KEY)
+    finally:
+        cache.close()
+
+
+def test_file_cache_kept(tmp_path):
+    fillCache(tmp_path / 'cache.db')
+    assert readCache(tmp_path / 'cache.db') == CACHE_RESULTS
+
+
+def test_changed_constant_drops_results(tmp_path, monkeypatch):
+    fillCache(tmp_path / 'cache.db')
+    monkeypatch.setattr(SizingData, 'SDCONST_COLOMAXNODES', SizingData.SDCONST_COLOMAXNODES + 1)
+    assert readCache(tmp_path / 'cache.db') is None
+
+
+def test_changed_version_drops_results(tmp_path, monkeypatch):
+    fillCache(tmp_path / 'cache.db')
+    monkeypatch.setattr(cmdline, '__version__', cmdline.__version__ + '.1')
+    assert readCache(tmp_path / 'cache.db') is None
+
+
+def test_changed_catalog_drops_results(tmp_path):
+    fillCache(tmp_path / 'cache.db', 'catalog-a')
+    assert readCache(tmp_path / 'cache.db', 'catalog-b') is None
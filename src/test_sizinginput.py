@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+__author__      = "Brian Fromme"
+__copyright__   = "Copyright 2020, Gnu Public License - Version 2.0"
+__credits__     = ["Brian Fromme, Bryan Gartner, Darren Soothill"]
+__maintainer__  = "Brian Fromme"
+__status__      = "Prototype"
+"""
+@newfield description: Description
+"""
+__description__ = "Sonar input loading tests - JSON and yaml parsing, and the parsed-input cache (run: python -m pytest)"
+
+import json
+import os
+
+import pytest
+
+from sizinginput import cacheEntryPath, parseText, readInputFile
+
+INPUT_RECORD = {'colocation': True, 'storageCapacity': 2000, 'driveCapacity': 16, 'driveType': 'HDD', 'protectionType': 1}
+
+
+def test_parse_json():
+    assert parseText('{"colocation": true, "storageCapacity": 2000, "driveCapacity": 16, '
+                     '"driveType": "HDD", "protectionType": 1}\n') == INPUT_RECORD
+
+
+def test_parse_yaml_flow_mapping():
+    # starts like JSON, but is only yaml
+    assert parseText('{colocation: true, storageCapacity: 2000, driveCapacity: 16, driveType: HDD, protectionType: 1}\n') == INPUT_RECORD
+
+
+def test_parse_yaml_block():
+    assert parseText('---\n# a comment\ncolocation: True\nstorageCapacity:  2000\ndriveCapacity: 16\n'
+                     "driveType: 'HDD'\nprotectionType: 1\n") == INPUT_RECORD
+
+
+def test_parse_error():
+    with pytest.raises(ValueError):
+        parseText('{colocation: [true\n')
+
+
+def writeInput(path, text, mtime):
+    path.write_text(text)
+    os.utime(path, ns=(mtime, mtime))
+
+
+def tamperCache(cacheDir, path):
+    """change the cached data, so a read that still comes from the cache can be told apart"""
+    entryPath = cacheEntryPath(str(cacheDir), os.path.abspath(path))
+    with open(entryPath) as f:
+        entry = json.load(f)
+    entry['data'] = {'cached': True}
+    with open(entryPath, 'w') as f:
+        json.dump(entry, f)
+
+
+def test_input_cache_hit(tmp_path):
+    path = tmp_path / 'input.yaml'
+    writeInput(path, 'storageCapacity: 2000\n', 10 ** 18)
+    assert readInputFile(str(path), str(tmp_path / 'cache')) == {'storageCapacity': 2000}
+    tamperCache(tmp_path / 'cache', path)
+    assert readInputFile(str(path), str(tmp_path / 'cache')) == {'cached': True}
+
+
+def test_input_cache_mtime_change(tmp_path):
+    path = tmp_path / 'input.yaml'
+    writeInput(path, 'storageCapacity: 2000\n', 10 ** 18)
+    readInputFile(str(path), str(tmp_path / 'cache'))
+    tamperCache(tmp_path / 'cache', path)
+    # the same size, a new mtime
+    writeInput(path, 'storageCapacity: 3000\n', 10 ** 18 + 1)
+    assert readInputFile(str(path), str(tmp_path / 'cache')) == {'storageCapacity': 3000}
+
+
+def test_input_cache_size_change(tmp_path):
+    path = tmp_path / 'input.yaml'
+    writeInput(path, 'storageCapacity: 2000\n', 10 ** 18)
+    readInputFile(str(path), str(tmp_path / 'cache'))
+    tamperCache(tmp_path / 'cache', path)
+    # the same mtime, a new size
+    writeInput(path, 'storageCapacity: 20000\n', 10 ** 18)
+    assert readInputFile(str(path), str(tmp_path / 'cache')) == {'storageCapacity': 20000}
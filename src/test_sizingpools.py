@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+__author__      = "Brian Fromme"
+__copyright__   = "Copyright 2020, Gnu Public License - Version 2.0"
+__credits__     = ["Brian Fromme, Bryan Gartner, Darren Soothill"]
+__maintainer__  = "Brian Fromme"
+__status__      = "Prototype"
+"""
+@newfield description: Description
+"""
+__description__ = "Sonar multi-pool tests - every shard group lands on distinct chassis (run: python -m pytest)"
+
+import random
+
+import pytest
+
+from sizingpools import PoolCluster
+
+POOLS_INPUT = {
+    'chassis': {'colocation': False, 'maxFillCapacity': 80,
+                'media': {'hdd': {'slots': 24, 'driveCapacity': 16}, 'nvme': {'slots': 4, 'driveCapacity': 7.68}}},
+    'pools': [{'name': 'rbd', 'storageCapacity': 5000000, 'protectionType': 3, 'media': 'nvme'},
+              {'name': 'rgw', 'storageCapacity': 20000000, 'protectionType': 1, 'ecProfileData': 8, 'ecProfileParity': 3},
+              {'name': 'cephfs', 'storageCapacity': 1000000, 'metaDataCapacity': 50000, 'protectionType': 3}],
+}
+
+
+class RecordingCluster(PoolCluster):
+    """a PoolCluster that notes the chassis each shard group went to"""
+
+    def pack(self):
+        self.groups = []
+        return super().pack()
+
+    def placeGroup(self, pool):
+        before = [dict(usage) for usage in self.chassisUsed]
+        super().placeGroup(pool)
+        before += [{media: 0.0 for media in self.media}] * (len(self.chassisUsed) - len(before))
+        self.groups.append((pool, [chassis for chassis, usage in enumerate(self.chassisUsed)
+                                   if usage[pool.media] != before[chassis][pool.media]]))
+
+
+def randomInput(seed):
+    rng = random.Random(seed)
+    pools = []
+    for index in range(rng.randint(1, 6)):
+        pool = {'storageCapacity': rng.uniform(1e4, 1e7), 'media': rng.choice(['hdd', 'nvme']),
+                'protectionType': rng.randint(1, 4)}
+        if pool['protectionType'] == 1:
+            pool.update(ecProfileData=rng.randint(2, 12), ecProfileParity=rng.randint(1, 4))
+        if rng.random() < 0.3:
+            pool['metaDataCapacity'] = rng.uniform(100, 1e5)
+        pools.append(pool)
+    return dict(POOLS_INPUT, pools=pools)
+
+
+def packed(data):
+    cluster, errors = RecordingCluster.fromInput(data)
+    assert errors == []
+    cluster.pack()
+    return cluster
+
+
+@pytest.mark.parametrize('data', [POOLS_INPUT] + [randomInput(seed) for seed in range(20)])
+def test_groups_on_distinct_chassis(data):
+    cluster = packed(data)
+    for pool, chassis in cluster.groups:
+        assert len(chassis) == pool.width
+    # every shard of every pool was placed
+    for pool in cluster.pools:
+        assert sum(1 for groupPool, chassis in cluster.groups if groupPool is pool) * pool.width == pool.shards
+
+
+@pytest.mark.parametrize('data', [POOLS_INPUT] + [randomInput(seed) for seed in range(20)])
+def test_chassis_not_overfilled(data):
+    cluster = packed(data)
+    for usage in cluster.chassisUsed:
+        for media, used in usage.items():
+            assert used <= cluster.chassisCapacity(media) * (1 + 1e-9)
+    assert len(cluster.chassisUsed) >= max(pool.minimumChassis() for pool in cluster.pools)
@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+__author__      = "Brian Fromme"
+__copyright__   = "Copyright 2020, Gnu Public License - Version 2.0"
+__credits__     = ["Brian Fromme, Bryan Gartner, Darren Soothill"]
+__maintainer__  = "Brian Fromme"
+__status__      = "Prototype"
+"""
+@newfield description: Description
+"""
+__description__ = "Sonar result table tests - save/load, filter and sort keep every result and its type (run: python -m pytest)"
+
+from cmdline import Options
+from sizingbatch import SizingBatch
+from sizingdata import SizingData
+from sizingresults import SizingResultTable
+from test_consistency import quiet, randomRecords, scalarResults
+
+
+def sizedResults(count, seed, **inputs):
+    """the scalar results of count random records (with inputs overriding theirs) that validate"""
+    sizingData = SizingData(Options())
+    with quiet():
+        results = [scalarResults(sizingData, dict(record, **inputs)) for record in randomRecords(count, seed)]
+    return [result for result in results if result is not None]
+
+
+def tableResults(table):
+    return [row.getResults() for row in table]
+
+
+def test_save_load(tmp_path):
+    results = sizedResults(200, 1)
+    table = SizingResultTable.fromResults(results)
+    table.save(tmp_path / 'results.tbl')
+    loaded = SizingResultTable.load(tmp_path / 'results.tbl')
+    assert len(loaded) == len(results)
+    # a table keeps whether a scenario had errors, not their messages
+    for expected, actual in zip(results, tableResults(loaded)):
+        assert {name: actual[name] for name in expected if name != 'sdc_ErrorMessages'} == \
+               {name: value for name, value in expected.items() if name != 'sdc_ErrorMessages'}
+
+
+def test_filter_sort(tmp_path):
+    results = sizedResults(200, 2)
+    SizingResultTable.fromResults(results).save(tmp_path / 'results.tbl')
+    table = SizingResultTable.load(tmp_path / 'results.tbl')
+    chassis = [result['sdr_BOM_NumberOfChassis'] for result in results]
+    kept = table.filter(table.column('sdr_BOM_NumberOfChassis') > 0)
+    assert len(kept) == sum(1 for count in chassis if count > 0)
+    ordered = kept.sort('sdr_DrivesNeeded', descending=True)
+    drives = list(ordered.column('sdr_DrivesNeeded'))
+    assert drives == sorted(drives, reverse=True)
+    # a sorted, filtered table still reads back whole results, in the new order
+    assert [row['sdr_DrivesNeeded'] for row in tableResults(ordered)] == drives
+    assert tableResults(ordered[:3]) == tableResults(ordered)[:3]
+
+
+def test_int_inputs_load_as_ints(tmp_path):
+    results = sizedResults(50, 3, driveCapacity=16)
+    SizingResultTable.fromResults(results).save(tmp_path / 'results.tbl')
+    loaded = SizingResultTable.load(tmp_path / 'results.tbl')
+    assert all(type(row['sdr_BOM_DriveSize']) is int and row['sdr_BOM_DriveSize'] == 16 for row in tableResults(loaded))
+    assert all(type(row['sdr_DrivesNeeded']) is int for row in tableResults(loaded))
+
+
+def test_batch_table_int_inputs(tmp_path):
+    with quiet():
+        batch = SizingBatch.fromRecords([dict(record, driveCapacity=16) for record in randomRecords(50, 4)])
+        batch.calculateResults()
+    batch.toTable().save(tmp_path / 'results.tbl')
+    loaded = SizingResultTable.load(tmp_path / 'results.tbl')
+    assert {type(row.sdr_BOM_DriveSize) for row in loaded} == {int}
+
+
+def test_float_inputs_stay_floats(tmp_path):
+    results = sizedResults(50, 5, driveCapacity=7.68)
+    SizingResultTable.fromResults(results).save(tmp_path / 'results.tbl')
+    assert {row.sdr_BOM_DriveSize for row in SizingResultTable.load(tmp_path / 'results.tbl')} == {7.68}
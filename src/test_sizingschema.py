@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+__author__      = "Brian Fromme"
+__copyright__   = "Copyright 2020, Gnu Public License - Version 2.0"
+__credits__     = ["Brian Fromme, Bryan Gartner, Darren Soothill"]
+__maintainer__  = "Brian Fromme"
+__status__      = "Prototype"
+"""
+@newfield description: Description
+"""
+__description__ = "Sonar input schema tests - records and columns get the same error lists (run: python -m pytest)"
+
+import numpy as np
+
+from sizingschema import validateColumns, validateRecord
+
+VALID_RECORD = {'colocation': True, 'storageCapacity': 2000, 'driveCapacity': 16, 'drivesPerChassis': 24.0,
+                'driveType': 'SSD', 'protectionType': 1}
+
+
+def errorKinds(errors):
+    return sorted((error['error'], error['input']) for error in errors)
+
+
+def test_valid_record():
+    values, errors = validateRecord(VALID_RECORD)
+    assert errors == []
+    assert values['sdi_DriveTypeSSD'] is True
+    # an integral float is stored as an int
+    assert type(values['sdi_DrivesPerChassis']) is int
+
+
+def test_record_errors():
+    record = dict(VALID_RECORD, drivetype='tape', maxFillCapacity=101, bogus=1)
+    del record['driveType'], record['storageCapacity']
+    values, errors = validateRecord(record)
+    assert errorKinds(errors) == [('invalid', 'drivetype'), ('invalid', 'maxFillCapacity'),
+                                  ('missing', 'storageCapacity'), ('unknown', 'bogus')]
+    invalid = next(error for error in errors if error['input'] == 'maxFillCapacity')
+    assert invalid['value'] == 101 and invalid['expected'] == 'a number from 1 to 100'
+    # only the values that passed are returned
+    assert 'sdi_MaxFillCapacityPercent' not in values and 'sdi_DriveTypeSSD' not in values
+
+
+def test_record_not_a_dict():
+    assert errorKinds(validateRecord(['storageCapacity', 2000])[1]) == [('record', None)]
+
+
+def test_columns():
+    columns = {'colocation': np.array([True, False, True]),
+               'storageCapacity': np.array([2000.0, -1.0, 10.0]),
+               'driveCapacity': np.array([16, 16, 0]),
+               'protectionType': np.array([1, 3, 7])}
+    valid, rowErrors = validateColumns(columns, 3)
+    assert list(valid) == [True, False, False]
+    assert set(rowErrors) == {1, 2}
+    assert errorKinds(rowErrors[1]) == [('invalid', 'storageCapacity')]
+    assert errorKinds(rowErrors[2]) == [('invalid', 'driveCapacity'), ('invalid', 'protectionType')]
+    assert rowErrors[2][0]['value'] == 0
+
+
+def test_columns_missing_required():
+    valid, rowErrors = validateColumns({'storageCapacity': np.array([2000.0, 3000.0])}, 2)
+    assert not valid.any()
+    assert errorKinds(rowErrors[0]) == [('missing', 'driveCapacity'), ('missing', 'protectionType')]
+
+
+def test_columns_match_records():
+    records = [VALID_RECORD, dict(VALID_RECORD, storageCapacity=0), dict(VALID_RECORD, protectionType=2.5)]
+    columns = {name: np.array([record[name] for record in records]) for name in VALID_RECORD}
+    valid, rowErrors = validateColumns(columns, len(records))
+    for row, record in enumerate(records):
+        errors = validateRecord(record)[1]
+        assert bool(valid[row]) == (not errors)
+        assert errorKinds(rowErrors.get(row, [])) == errorKinds(errors)
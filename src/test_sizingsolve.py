@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+__author__      = "Brian Fromme"
+__copyright__   = "Copyright 2020, Gnu Public License - Version 2.0"
+__credits__     = ["Brian Fromme, Bryan Gartner, Darren Soothill"]
+__maintainer__  = "Brian Fromme"
+__status__      = "Prototype"
+"""
+@newfield description: Description
+"""
+__description__ = "Sonar inverse sizing tests - every answer, sized forward, fits its budget (run: python -m pytest)"
+
+import pytest
+
+from cmdline import Options
+from sizingdata import SizingData
+from sizingsolve import SizingSolver
+from test_consistency import quiet, randomRecords
+
+SOLVE_BUDGETS = [(12, None), (None, 100), (40, 500), (3, None), (None, 7), (1000, 20000)]
+
+
+def baseScenarios(count, seed):
+    """validated base scenarios, each in its own SizingData"""
+    scenarios = []
+    with quiet():
+        for record in randomRecords(count, seed):
+            sizingData = SizingData(Options())
+            if sizingData.loadSizingRecord(record) and sizingData.validateSizingData():
+                scenarios.append(sizingData)
+    return scenarios
+
+
+def sizeForward(base, solution):
+    """size a solution from scratch, as a scenario of its own"""
+    sizingData = SizingData(Options())
+    sizingData.loadSizingRecord({})
+    for name in SizingData.SDINPUTS:
+        setattr(sizingData, name, getattr(base, name))
+    sizingData.sdi_ProtectionType = solution['protectionType']
+    if solution['protectionType'] == 1:
+        sizingData.sdi_ECData = solution['ecProfileData']
+        sizingData.sdi_ECParity = solution['ecProfileParity']
+    sizingData.sdi_StorageCapacity = solution['storageCapacity']
+    with quiet():
+        calculated = sizingData.calculateResults()
+    return calculated, sizingData
+
+
+@pytest.mark.parametrize('maxChassis,maxDrives', SOLVE_BUDGETS)
+def test_solutions_within_budget(maxChassis, maxDrives):
+    solved = 0
+    for base in baseScenarios(40, 7):
+        solver = SizingSolver(base, maxChassis, maxDrives)
+        with quiet():
+            solutions = solver.solve('capacity')
+        for solution in solutions:
+            calculated, sizingData = sizeForward(base, solution)
+            assert calculated and not sizingData.sdc_ComputationalErrors
+            assert solver.maxChassis is None or sizingData.sdr_BOM_NumberOfChassis <= solver.maxChassis
+            assert maxDrives is None or sizingData.sdr_DrivesNeeded <= maxDrives
+            assert sizingData.getResults() == solution['results']
+            solved += 1
+    assert solved
+
+
+def test_solutions_ordered():
+    for base in baseScenarios(10, 8):
+        solver = SizingSolver(base, 40, None)
+        with quiet():
+            capacity = [solution['storageCapacity'] for solution in solver.solve('capacity')]
+            performance = [solution['clientWriteGBs'] for solution in solver.solve('performance')]
+        assert capacity == sorted(capacity, reverse=True)
+        assert performance == sorted(performance, reverse=True)
@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+__author__      = "Brian Fromme"
+__copyright__   = "Copyright 2020, Gnu Public License - Version 2.0"
+__credits__     = ["Brian Fromme, Bryan Gartner, Darren Soothill"]
+__maintainer__  = "Brian Fromme"
+__status__      = "Prototype"
+"""
+@newfield description: Description
+"""
+__description__ = "Sonar watch mode tests - an update reports only the lines that changed (run: python -m pytest)"
+
+from cmdline import Options
+from sizingdata import SizingData
+from sizingwatch import InputWatch
+
+WATCH_INPUT = '''colocation: False
+storageCapacity: 30000000
+driveCapacity: 16
+driveType: HDD
+protectionType: 3
+'''
+
+
+def startWatch(tmp_path, text):
+    options = Options()
+    options.argInput = str(tmp_path / 'input.yaml')
+    (tmp_path / 'input.yaml').write_text(text)
+    watch = InputWatch(options)
+    assert watch.update() == {0: None}
+    return watch
+
+
+def changedLines(watch, capsys, text):
+    """save a new input, and the report lines of the update (without the timestamp line)"""
+    with open(watch.options.argInput, 'w') as f:
+        f.write(text)
+    capsys.readouterr()
+    updates = watch.update()
+    watch.reportChanges(updates, [], 0.0)
+    return capsys.readouterr().out.splitlines()[1:]
+
+
+def labels(lines):
+    return [line.strip().split(' = ')[0] for line in lines if ' = ' in line]
+
+
+def test_only_changed_labels(tmp_path, capsys):
+    watch = startWatch(tmp_path, WATCH_INPUT)
+    old = dict(watch.graphs[0].values)
+    lines = changedLines(watch, capsys, WATCH_INPUT.replace('driveCapacity: 16', 'driveCapacity: 18'))
+    new = watch.graphs[0].values
+    changed = [label for section, sectionLines in SizingData.SDREPORT for label, name in sectionLines if old[name] != new[name]]
+    assert 'Drive Size' in changed and 'Number of Drives' in changed
+    assert labels(lines) == changed
+    # and each shows its old and new value
+    assert '  Drive Size = 16 -> 18' in lines
+    # unchanged lines are left out
+    assert 'Suggested CPU Model' not in labels(lines) and 'Colocated Memory Needed' not in labels(lines)
+
+
+def test_no_change(tmp_path, capsys):
+    watch = startWatch(tmp_path, WATCH_INPUT)
+    # a comment changes the text, not the inputs
+    assert changedLines(watch, capsys, WATCH_INPUT + '# a note\n') == ['No change to the results']
+
+
+def test_new_scenario(tmp_path, capsys):
+    watch = startWatch(tmp_path, WATCH_INPUT)
+    lines = changedLines(watch, capsys, '---\n' + WATCH_INPUT + '---\n' + WATCH_INPUT.replace('HDD', 'SSD'))
+    # the first document is unchanged, so only the second is reported
+    assert len(lines) == 1 and lines[0].startswith('Scenario 2: New scenario, Number of Chassis = ')